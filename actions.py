@@ -1,43 +1,38 @@
 import base64
 import asyncio
 from typing import Tuple, List, Dict, Optional, Any
-from datetime import datetime
 
 from maibot_sdk.compat.base import BaseAction, ActionActivationType
 import logging
 
-from .draw_logic import get_drawing_endpoints, process_drawing_api_request, extract_source_image
+from .draw_logic import get_drawing_endpoints, process_drawing_api_request, extract_source_image, normalize_segments
 from .utils import download_image, convert_if_gif, get_image_mime_type
-from .managers import key_manager
+from .managers import PLUGIN_DIR, get_key_manager
 
 logger = logging.getLogger("plugin.gemini_drawer.action")
 
+# 绘图指令前缀，str.startswith 接受元组，一次调用即可完成全部前缀的匹配
+_COMMAND_PREFIXES = ("/绘图", "＃绘图", "/多图", "/bnn", "/文生视频", "/图生视频", "/+")
+
 def is_command_message(message: Any) -> bool:
     """检查消息是否是特定绘图指令 (/绘图, /多图, /bnn)，忽略 @mention"""
     if not message:
         return False
-        
-    target_commands = ["/绘图", "＃绘图", "/多图", "/bnn", "/文生视频","/图生视频","/+"]
-    
+
     def check_text(text: str) -> bool:
         if not text: return False
-        t = text.strip()
-        return any(t.startswith(cmd) for cmd in target_commands)
+        return text.lstrip().startswith(_COMMAND_PREFIXES)
 
     try:
         # 1. 尝试基于 Segments 判断 (忽略 At 后的第一个文本段)
         if hasattr(message, 'message_segment'):
             segments = message.message_segment
             # 处理 SegList 包装
-            if hasattr(segments, 'type') and segments.type == 'seglist':
-                segments = segments.data
-            if not isinstance(segments, list):
-                segments = [segments]
-            
-            for seg in segments:
-                if hasattr(seg, 'type') and seg.type == 'at':
+            for seg in normalize_segments(segments):
+                seg_type = getattr(seg, 'type', None)
+                if seg_type == 'at':
                     continue
-                if hasattr(seg, 'type') and seg.type == 'text':
+                if seg_type == 'text':
                     data = getattr(seg, 'data', '')
                     if isinstance(data, str) and data.strip():
                         # 找到第一个非空文本段
@@ -173,7 +168,7 @@ class ImageGenerateAction(BaseAction):
                             image_to_send_b64 = base64.b64encode(image_bytes).decode('utf-8')
                     elif 'base64,' in single_img_data:
                         # 提取 Base64 并清理空白字符
-                        image_to_send_b64 = single_img_data.split('base64,')[1].replace('\n', '').replace('\r', '').replace(' ', '')
+                        image_to_send_b64 = single_img_data.partition('base64,')[2].replace('\n', '').replace('\r', '').replace(' ', '')
                     else:
                         # 假定是纯 Base64
                         image_to_send_b64 = single_img_data
@@ -280,29 +275,26 @@ class SelfieGenerateAction(BaseAction):
 
         image_filename = self.get_config("selfie.reference_image_path")
         # 自动定位到插件目录下的 images 文件夹
-        from pathlib import Path
-        plugin_dir = Path(__file__).parent
-        ref_image_path = plugin_dir / "images" / image_filename
+        ref_image_path = PLUGIN_DIR / "images" / image_filename
         
-        if not ref_image_path.exists():
+        # 在线程中读取底图，避免阻塞事件循环；文件缺失、是目录或无权读取都由 OSError 判断，不再额外 stat
+        try:
+            image_bytes = await asyncio.to_thread(ref_image_path.read_bytes)
+        except OSError as e:
             await self.send_text("糟糕，我找不到我的底图了，可能被管理员删掉了。")
-            logger.warning(f"Selfie reference image not found at: {ref_image_path}")
+            logger.warning(f"Selfie reference image not readable at: {ref_image_path} ({type(e).__name__}: {e})")
             return False, "未找到人设底图"
 
         try:
-            import asyncio
             user_action = self.action_data.get("requested_action", "").strip()
-            asyncio.create_task(self._do_selfie_background(ref_image_path, user_action))
+            asyncio.create_task(self._do_selfie_background(image_bytes, user_action))
             return True, "我已经收到啦，这就去后台拍一张发给你，请耐心等待哦！"
         except Exception as e:
             logger.error(f"Selfie Action Start Error: {e}")
             return False, str(e)
 
-    async def _do_selfie_background(self, ref_image_path, user_action: str):
+    async def _do_selfie_background(self, image_bytes: bytes, user_action: str):
         try:
-            with open(ref_image_path, "rb") as f:
-                image_bytes = f.read()
-
             base_prompt = self.get_config("selfie.base_prompt")
             random_actions = self.get_config("selfie.random_actions")
             
@@ -380,7 +372,7 @@ class SelfieGenerateAction(BaseAction):
                             image_to_send_b64 = base64.b64encode(image_bytes).decode('utf-8')
                     elif single_img_data.startswith('data:image') and 'base64,' in single_img_data:
                         # 提取 data URL 中的 Base64 部分并清理空白字符
-                        image_to_send_b64 = single_img_data.split('base64,')[1].replace('\n', '').replace('\r', '').replace(' ', '')
+                        image_to_send_b64 = single_img_data.partition('base64,')[2].replace('\n', '').replace('\r', '').replace(' ', '')
                     else:
                         image_to_send_b64 = single_img_data
                     
@@ -483,29 +475,26 @@ class SelfieVideoAction(BaseAction):
             return True, "功能未启用"
 
         image_filename = self.get_config("selfie.reference_image_path")
-        from pathlib import Path
-        plugin_dir = Path(__file__).parent
-        ref_image_path = plugin_dir / "images" / image_filename
+        ref_image_path = PLUGIN_DIR / "images" / image_filename
         
-        if not ref_image_path.exists():
+        # 在线程中读取底图，避免阻塞事件循环；文件缺失、是目录或无权读取都由 OSError 判断，不再额外 stat
+        try:
+            image_bytes = await asyncio.to_thread(ref_image_path.read_bytes)
+        except OSError as e:
             await self.send_text("糟糕，我找不到我的底图了，可能被管理员删掉了。")
-            logger.warning(f"Selfie reference image not found at: {ref_image_path}")
+            logger.warning(f"Selfie reference image not readable at: {ref_image_path} ({type(e).__name__}: {e})")
             return False, "未找到人设底图"
 
         try:
-            import asyncio
             user_action = self.action_data.get("requested_action", "").strip()
-            asyncio.create_task(self._do_video_background(ref_image_path, user_action))
+            asyncio.create_task(self._do_video_background(image_bytes, user_action))
             return True, "我已经收到啦，这就去后台录一段视频发给你，请耐心等待哦！"
         except Exception as e:
             logger.error(f"Selfie Video Action Start Error: {e}")
             return False, str(e)
 
-    async def _do_video_background(self, ref_image_path, user_action: str):
+    async def _do_video_background(self, image_bytes: bytes, user_action: str):
         try:
-            with open(ref_image_path, "rb") as f:
-                image_bytes = f.read()
-
             if user_action:
                 action = user_action
                 logger.info(f"使用用户指定的视频动作: {action}")
@@ -22,13 +22,20 @@ Gemini Drawer 管理员命令模块
 
 所有命令均继承自 BaseAdminCommand，自动进行管理员权限验证。
 """
+import asyncio
 import re
 from typing import Tuple, Optional
-from pathlib import Path
 from maibot_sdk.compat.base import ReplyContentType
 from .base_commands import BaseAdminCommand
-from .managers import key_manager, data_manager
-from .utils import logger, save_config_file
+from .managers import CONFIG_PATH, get_key_manager, get_data_manager
+from .utils import logger, save_config_file, load_toml
+
+# 添加 Key 时的分隔符（空白、中英文逗号和分号）
+_KEY_SPLIT_RE = re.compile(r"[\s,;，；\n\r]+")
+# 提示词 "名称:内容" 的中英文冒号分隔
+_COLON_RE = re.compile(r"[:：]")
+# Gemini 原生接口 URL 中的模型名
+_GEMINI_MODEL_IN_URL_RE = re.compile(r"(/models/)([^:]+)(:generateContent)")
 
 class ChannelAddKeyCommand(BaseAdminCommand):
     command_name: str = "gemini_channel_add_key"
@@ -38,7 +45,7 @@ class ChannelAddKeyCommand(BaseAdminCommand):
     async def handle_admin_command(self) -> Tuple[bool, Optional[str], bool]:
         command_prefix = "/渠道添加key"
         content = self.message.raw_message.replace(command_prefix, "", 1).strip()
-        parts = re.split(r"[\s,;，；\n\r]+", content)
+        parts = _KEY_SPLIT_RE.split(content)
         parts = [p for p in parts if p.strip()]
 
         if len(parts) < 2:
@@ -48,11 +55,11 @@ class ChannelAddKeyCommand(BaseAdminCommand):
         channel_name = parts[0]
         new_keys = parts[1:]
 
-        custom_channels = data_manager.get_channels()
-        valid_channels = list(custom_channels.keys())
+        custom_channels = get_data_manager().get_channels()
 
-        if channel_name not in valid_channels:
-             available = ", ".join(valid_channels) if valid_channels else "暂无"
+        # 直接在渠道字典上判断（哈希查找），渠道名列表只在报错时拼接
+        if channel_name not in custom_channels:
+             available = ", ".join(custom_channels) if custom_channels else "暂无"
              await self.send_text(
                  f"❌ 未知的渠道名称：`{channel_name}`\n"
                  f"可用渠道：{available}\n"
@@ -60,7 +67,7 @@ class ChannelAddKeyCommand(BaseAdminCommand):
              )
              return True, "未知渠道", True
 
-        added, duplicates = key_manager.add_keys(new_keys, channel_name)
+        added, duplicates = get_key_manager().add_keys(new_keys, channel_name)
         msg = f"✅ 操作完成 (渠道: {channel_name})：\n- 成功添加: {added} 个\n"
         if duplicates > 0:
             msg += f"- 重复忽略: {duplicates} 个"
@@ -73,7 +80,7 @@ class ChannelListKeysCommand(BaseAdminCommand):
     command_pattern: str = r"^/渠道key列表"
 
     async def handle_admin_command(self) -> Tuple[bool, Optional[str], bool]:
-        all_keys = key_manager.get_all_keys()
+        all_keys = get_key_manager().get_all_keys()
         if not all_keys:
             await self.send_text("ℹ️ 当前未配置任何 API Key。")
             return True, "无Key", True
@@ -117,7 +124,7 @@ class ChannelResetKeyCommand(BaseAdminCommand):
         parts = content.split()
         
         if not parts:
-            count = key_manager.manual_reset_keys(None)
+            count = get_key_manager().manual_reset_keys(None)
             await self.send_text(f"✅ 已成功重置所有渠道的 {count} 个失效 Key。")
             return True, "重置所有成功", True
             
@@ -125,14 +132,14 @@ class ChannelResetKeyCommand(BaseAdminCommand):
         if len(parts) >= 2:
             try:
                 index = int(parts[1])
-                if key_manager.reset_specific_key(channel_name, index):
+                if get_key_manager().reset_specific_key(channel_name, index):
                     await self.send_text(f"✅ 已成功重置渠道 `{channel_name}` 的第 {index} 个 Key。")
                 else:
                     await self.send_text(f"❌ 重置失败：渠道 `{channel_name}` 不存在第 {index} 个 Key。")
             except ValueError:
                 await self.send_text("❌ 序号必须是数字！")
         else:
-            count = key_manager.manual_reset_keys(channel_name)
+            count = get_key_manager().manual_reset_keys(channel_name)
             await self.send_text(f"✅ 已成功重置渠道 `{channel_name}` 的 {count} 个失效 Key。")
         return True, "操作完成", True
 
@@ -157,7 +164,7 @@ class ChannelDeleteKeyCommand(BaseAdminCommand):
             await self.send_text("❌ 序号必须是数字！")
             return True, "参数类型错误", True
         
-        if key_manager.delete_key(channel_name, index):
+        if get_key_manager().delete_key(channel_name, index):
             await self.send_text(f"✅ 已成功删除渠道 `{channel_name}` 的第 {index} 个 Key。")
         else:
             await self.send_text(f"❌ 删除失败：渠道 `{channel_name}` 不存在第 {index} 个 Key。")
@@ -185,16 +192,13 @@ class ChannelSetKeyErrorLimitCommand(BaseAdminCommand):
             await self.send_text("❌ 序号和次数必须是数字！")
             return True, "参数类型错误", True
 
-        keys_list = key_manager.config.get('keys', [])
-        target_keys_indices = [i for i, key in enumerate(keys_list) if key.get('type') == channel_name]
-
-        if index < 1 or index > len(target_keys_indices):
+        key_obj = get_key_manager().get_key_by_index(channel_name, index)
+        if key_obj is None:
             await self.send_text(f"❌ 渠道 `{channel_name}` 不存在第 `{index}` 个 Key。")
             return True, "序号无效", True
         
-        real_index = target_keys_indices[index - 1]
-        keys_list[real_index]['max_errors'] = limit
-        key_manager.save_config(key_manager.config)
+        key_obj['max_errors'] = limit
+        get_key_manager().save_config(get_key_manager().config)
 
         limit_text = "永不禁用" if limit == -1 else f"{limit}次"
         await self.send_text(f"✅ 设置成功！\n渠道 `{channel_name}` Key {index} 错误上限: **{limit_text}**。")
@@ -212,18 +216,18 @@ class AddPromptCommand(BaseAdminCommand):
             await self.send_text("❌ 格式错误！\n正确格式：`/添加提示词 功能名称:具体提示词`")
             return True, "格式错误", True
 
-        parts = re.split(r"[:：]", content, 1)
+        parts = _COLON_RE.split(content, 1)
         name, prompt = parts[0].strip(), parts[1].strip()
 
         if not name or not prompt:
             await self.send_text("❌ 内容不能为空！")
             return True, "参数不全", True
 
-        if name in data_manager.get_prompts():
+        if name in get_data_manager().get_prompts():
             await self.send_text(f"❌ 名称 `{name}` 已存在。")
             return True, "名称重复", True
 
-        data_manager.add_prompt(name, prompt)
+        get_data_manager().add_prompt(name, prompt)
         await self.send_text(f"✅ 提示词 `{name}` 添加成功！")
         return True, "添加成功", True
 
@@ -238,7 +242,7 @@ class DeletePromptCommand(BaseAdminCommand):
             await self.send_text("❌ 请提供名称！")
             return True, "缺少参数", True
 
-        if data_manager.delete_prompt(name):
+        if get_data_manager().delete_prompt(name):
             await self.send_text(f"✅ 提示词 `{name}` 删除成功！")
         else:
             await self.send_text(f"❌ 未找到提示词 `{name}`。")
@@ -255,7 +259,7 @@ class ViewPromptCommand(BaseAdminCommand):
             await self.send_text("❌ 请提供名称！")
             return True, "缺少参数", True
 
-        prompts = data_manager.get_prompts()
+        prompts = get_data_manager().get_prompts()
         if name in prompts:
             bot_name = self.get_config("general.bot_name", "Gemini绘图助手")
             nodes_to_send = [
@@ -279,18 +283,18 @@ class ModifyPromptCommand(BaseAdminCommand):
             await self.send_text("❌ 格式错误！\n正确格式：`/修改提示词 功能名称:新提示词`")
             return True, "格式错误", True
 
-        parts = re.split(r"[:：]", content, 1)
+        parts = _COLON_RE.split(content, 1)
         name, prompt = parts[0].strip(), parts[1].strip()
 
         if not name or not prompt:
             await self.send_text("❌ 内容不能为空！")
             return True, "参数不全", True
 
-        if name not in data_manager.get_prompts():
+        if name not in get_data_manager().get_prompts():
             await self.send_text(f"❌ 未找到提示词 `{name}`。\n如需添加新提示词，请使用 `/添加提示词` 命令。")
             return True, "提示词不存在", True
 
-        data_manager.update_prompt(name, prompt)
+        get_data_manager().update_prompt(name, prompt)
         await self.send_text(f"✅ 提示词 `{name}` 修改成功！")
         return True, "修改成功", True
 
@@ -391,7 +395,7 @@ class AddChannelCommand(BaseAdminCommand):
             # 自动标记视频渠道
             if is_doubao_video or is_tsai_video:
                 channel_info["is_video"] = True
-            data_manager.add_channel(name, channel_info)
+            get_data_manager().add_channel(name, channel_info)
 
             api_type = "豆包视频" if is_doubao_video else ("豆包图片" if is_doubao_image else ("OpenAI" if is_openai else ("Gemini" if is_gemini else "TS-AI")))
             msg = f"✅ 自定义渠道 `{name}` 添加成功！\n类型: {api_type}\n请使用 `/渠道添加key {name} <your-api-key>` 添加密钥。"
@@ -417,7 +421,7 @@ class ChannelUpdateModelCommand(BaseAdminCommand):
             return True, "参数不足", True
 
         channel_name, new_model = parts[0], parts[1]
-        channels = data_manager.get_channels()
+        channels = get_data_manager().get_channels()
         if channel_name not in channels:
             await self.send_text(f"❌ 未找到渠道 `{channel_name}`！")
             return True, "渠道不存在", True
@@ -427,12 +431,11 @@ class ChannelUpdateModelCommand(BaseAdminCommand):
         channel_info["model"] = new_model
         
         if "generateContent" in url and "/models/" in url:
-            pattern = r"(/models/)([^:]+)(:generateContent)"
-            if re.search(pattern, url):
-                new_url = re.sub(pattern, f"\\g<1>{new_model}\\g<3>", url)
+            if _GEMINI_MODEL_IN_URL_RE.search(url):
+                new_url = _GEMINI_MODEL_IN_URL_RE.sub(f"\\g<1>{new_model}\\g<3>", url)
                 if new_url != url: channel_info["url"] = new_url
 
-        data_manager.update_channel(channel_name, channel_info)
+        get_data_manager().update_channel(channel_name, channel_info)
         await self.send_text(f"✅ 渠道 `{channel_name}` 模型已更新！请重启Bot。")
         return True, "更新成功", True
 
@@ -446,8 +449,8 @@ class DeleteChannelCommand(BaseAdminCommand):
         if not name:
             await self.send_text("❌ 请提供名称！")
             return True, "缺少参数", True
-        if data_manager.delete_channel(name):
-            deleted_keys_count = key_manager.delete_keys_by_type(name)
+        if get_data_manager().delete_channel(name):
+            deleted_keys_count = get_key_manager().delete_keys_by_type(name)
             if deleted_keys_count > 0:
                 await self.send_text(f"✅ 渠道 `{name}` 删除成功！\n已同时清理该渠道下的 {deleted_keys_count} 个 Key。")
             else:
@@ -470,7 +473,7 @@ class ToggleChannelCommand(BaseAdminCommand):
             await self.send_text("❌ 请指定渠道名称！")
             return True, "缺少参数", True
 
-        channels = data_manager.get_channels()
+        channels = get_data_manager().get_channels()
         target_found = False
         
         if name in channels:
@@ -479,7 +482,7 @@ class ToggleChannelCommand(BaseAdminCommand):
                 url, key = channel_info.rsplit(":", 1)
                 channel_info = {"url": url, "key": key}
             channel_info["enabled"] = is_enable
-            data_manager.update_channel(name, channel_info)
+            get_data_manager().update_channel(name, channel_info)
             target_found = True
         else:
             await self.send_text(f"❌ 未找到渠道 `{name}`。")
@@ -495,7 +498,7 @@ class ListChannelsCommand(BaseAdminCommand):
     command_pattern: str = "/渠道列表"
 
     async def handle_admin_command(self) -> Tuple[bool, Optional[str], bool]:
-        channels_config = data_manager.get_channels()
+        channels_config = get_data_manager().get_channels()
         
         bot_name = "Gemini Drawer"
         header_text = "📋 **当前渠道状态列表**\n--------------------"
@@ -536,7 +539,7 @@ class ChannelSetStreamCommand(BaseAdminCommand):
         channel_name, stream_str = parts
         stream_value = stream_str.lower() in ['true', '1', 'yes', '是', '开启', '启用']
         
-        channels = data_manager.get_channels()
+        channels = get_data_manager().get_channels()
         if channel_name not in channels:
             await self.send_text(f"❌ 未找到渠道 `{channel_name}`。")
             return True, "渠道不存在", True
@@ -547,7 +550,7 @@ class ChannelSetStreamCommand(BaseAdminCommand):
             channel_info = {"url": url, "key": key}
         
         channel_info["stream"] = stream_value
-        data_manager.update_channel(channel_name, channel_info)
+        get_data_manager().update_channel(channel_name, channel_info)
         await self.send_text(f"✅ 渠道 `{channel_name}` 流式请求已{'启用' if stream_value else '禁用'}！")
         return True, "设置成功", True
 
@@ -566,7 +569,7 @@ class ChannelSetVideoCommand(BaseAdminCommand):
         channel_name, video_str = parts
         video_value = video_str.lower() in ['true', '1', 'yes', '是', '开启', '启用']
         
-        channels = data_manager.get_channels()
+        channels = get_data_manager().get_channels()
         if channel_name not in channels:
             await self.send_text(f"❌ 未找到渠道 `{channel_name}`。")
             return True, "渠道不存在", True
@@ -577,7 +580,7 @@ class ChannelSetVideoCommand(BaseAdminCommand):
             channel_info = {"url": url, "key": key}
         
         channel_info["is_video"] = video_value
-        data_manager.update_channel(channel_name, channel_info)
+        get_data_manager().update_channel(channel_name, channel_info)
         await self.send_text(f"✅ 渠道 `{channel_name}` 视频模式已{'启用' if video_value else '禁用'}！")
         return True, "设置成功", True
 
@@ -615,20 +618,21 @@ class ToggleBananaRestrictedCommand(BaseAdminCommand):
                 action = match.group("action")
 
         enabled = action == "开启"
-        config_path = Path(__file__).parent / "config.toml"
+        config_path = CONFIG_PATH
 
         try:
-            import toml
             if config_path.exists():
-                with open(config_path, 'r', encoding='utf-8') as f:
-                    config_data = toml.load(f)
+                config_data = load_toml(config_path)
             else:
                 config_data = {}
 
             if "behavior" not in config_data:
                 config_data["behavior"] = {}
-            config_data["behavior"]["show_restricted"] = enabled
-            save_config_file(config_path, config_data)
+            # 值未变化时不重写 config.toml
+            if config_data["behavior"].get("show_restricted") != enabled:
+                config_data["behavior"]["show_restricted"] = enabled
+                # 在线程中写入 config.toml，避免文件写入和 fsync 阻塞事件循环
+                await asyncio.to_thread(save_config_file, config_path, config_data)
 
             plugin = getattr(self, "plugin", None)
             if plugin is not None:
@@ -671,7 +675,7 @@ class BananaPromptSearchCommand(BaseAdminCommand):
             return True, "缺少关键词", True
 
         show_restricted = bool(self.get_config("behavior.show_restricted", False))
-        entries = data_manager.get_banana_prompt_entries(show_restricted=show_restricted)
+        entries = get_data_manager().get_banana_prompt_entries(show_restricted=show_restricted)
         keyword_lower = keyword.lower()
         matches = []
 
@@ -23,6 +23,7 @@ BaseDrawCommand:
 - get_prompt(): 抽象方法，获取绘图提示词，由子类实现
 - execute(): 主执行流程，处理所有绘图逻辑
 - _recall_status_messages(): 撤回状态消息
+- _recall_after_failure(): 失败后在后台依次撤回状态消息与失败提示
 - _notify_success(): 发送成功通知
 """
 import asyncio
@@ -30,7 +31,6 @@ import json
 import re
 import time
 import base64
-from datetime import datetime
 from abc import ABC, abstractmethod
 from typing import Tuple, Optional, List, Dict, Any
 
@@ -40,15 +40,20 @@ import logging
 
 from .utils import (
     download_image, convert_if_gif, get_image_mime_type,
-    safe_json_dumps, extract_image_data, extract_all_image_data, extract_video_data,
-    extract_text_failure_reason
+    safe_json_dumps, dumps_json_bytes, loads_json, extract_image_data, extract_all_image_data, extract_video_data,
+    extract_text_failure_reason, iter_sse_data, error_body_text, read_error_body, shared_http_client,
+    decode_base64_image, redact_url
 )
 
-from .managers import key_manager
-from .draw_logic import build_drawing_endpoints, extract_source_image
+from .managers import get_key_manager
+from .draw_logic import build_drawing_endpoints, classify_endpoint, extract_source_image, fetch_avatar, fetch_avatars, normalize_segments
 
 logger = logging.getLogger("plugin.gemini_drawer")
 
+# 多图命令收集 @ 用户时使用的正则：@QQ号 与 @<昵称:QQ号>
+_MULTI_AT_QQ_RE = re.compile(r'@(\d{5,11})\b', re.ASCII)
+_MULTI_AT_MENTION_RE = re.compile(r'@<[^>]+:(\d+)>', re.ASCII)
+
 class BaseAdminCommand(BaseCommand, ABC):
     permission: str = "owner"
 
@@ -126,7 +131,6 @@ class BaseAdminCommand(BaseCommand, ABC):
 class BaseDrawCommand(BaseCommand, ABC):
     permission: str = "user"
     allow_text_only: bool = False
-
     def _get_current_chat_id(self) -> Optional[str]:
         """获取当前聊天的 chat_id（优先使用框架注入的 stream_id）"""
         # 优先使用框架注入的 _stream_id
@@ -173,25 +177,29 @@ class BaseDrawCommand(BaseCommand, ABC):
         """安全地撤回消息列表，返回成功撤回的数量
 
         使用 NapCat 适配器的跨插件 API: adapter.napcat.message.delete_msg
+        多条消息并发撤回，避免逐条等待往返。
         """
-        recalled_count = 0
-        for mid in message_ids:
+        if not (hasattr(self, 'ctx') and self.ctx):
+            for mid in message_ids:
+                logger.debug(f"跳过撤回消息 {mid}（ctx 不可用）")
+            return 0
+
+        async def _recall_one(mid) -> bool:
             try:
-                if hasattr(self, 'ctx') and self.ctx:
-                    resp = await self.ctx.api.call(
-                        "adapter.napcat.message.delete_msg",
-                        message_id=str(mid)
-                    )
-                    if resp is not None and not (isinstance(resp, dict) and resp.get("success") is False):
-                        recalled_count += 1
-                        logger.debug(f"成功撤回消息: {mid}")
-                    else:
-                        logger.debug(f"撤回消息未成功: {mid}")
-                else:
-                    logger.debug(f"跳过撤回消息 {mid}（ctx 不可用）")
+                resp = await self.ctx.api.call(
+                    "adapter.napcat.message.delete_msg",
+                    message_id=str(mid)
+                )
+                if resp is not None and not (isinstance(resp, dict) and resp.get("success") is False):
+                    logger.debug(f"成功撤回消息: {mid}")
+                    return True
+                logger.debug(f"撤回消息未成功: {mid}")
             except Exception as e:
                 logger.warning(f"撤回消息失败 {mid}: {e}")
-        return recalled_count
+            return False
+
+        results = await asyncio.gather(*(_recall_one(mid) for mid in message_ids))
+        return sum(results)
 
     async def _notify_success(self, elapsed: float) -> None:
         """成功生成后通知用户"""
@@ -282,7 +290,7 @@ class BaseDrawCommand(BaseCommand, ABC):
         # 如果以上都没找到图片，使用发送者头像
         logger.info("未找到图片、Emoji或@提及，回退到发送者头像。")
         user_id = self.message.message_info.user_info.user_id
-        return await download_image(f"https://q1.qlogo.cn/g?b=qq&nk={user_id}&s=640", proxy)
+        return await fetch_avatar(user_id, proxy)
 
     async def get_multiple_source_images(self, min_count: int = 2) -> List[bytes]:
         """
@@ -296,32 +304,29 @@ class BaseDrawCommand(BaseCommand, ABC):
         async def _extract_images_from_segments(segments) -> List[bytes]:
             """从消息段中提取所有图片"""
             extracted = []
-            if hasattr(segments, 'type') and segments.type == 'seglist':
-                segments = segments.data
-            if not isinstance(segments, list):
-                segments = [segments]
-
-            for seg in segments:
-                if seg.type == 'image' or seg.type == 'emoji':
-                    if isinstance(seg.data, dict) and seg.data.get('url'):
-                        logger.info(f"[多图] 在消息段中找到URL图片 (类型: {seg.type})。")
-                        img_bytes = await download_image(seg.data.get('url'), proxy)
+            for seg in normalize_segments(segments):
+                seg_type = seg.type
+                if seg_type == 'image' or seg_type == 'emoji':
+                    seg_data = seg.data
+                    if isinstance(seg_data, dict) and seg_data.get('url'):
+                        logger.info(f"[多图] 在消息段中找到URL图片 (类型: {seg_type})。")
+                        img_bytes = await download_image(seg_data.get('url'), proxy)
                         if img_bytes:
                             extracted.append(img_bytes)
-                    elif isinstance(seg.data, str) and len(seg.data) > 200:
-                        try:
-                            logger.info(f"[多图] 在消息段中找到Base64图片 (类型: {seg.type})。")
-                            extracted.append(base64.b64decode(seg.data))
-                        except Exception:
-                            continue
+                    elif isinstance(seg_data, str) and len(seg_data) > 200:
+                        img_bytes = decode_base64_image(seg_data)
+                        if img_bytes:
+                            logger.info(f"[多图] 在消息段中找到Base64图片 (类型: {seg_type})。")
+                            extracted.append(img_bytes)
             return extracted
 
         # 1. 从回复消息中提取图片
-        if hasattr(self.message, 'reply') and self.message.reply:
-            reply_msg = self.message.reply
-            if hasattr(reply_msg, 'message_segment') and reply_msg.message_segment:
+        reply_msg = getattr(self.message, 'reply', None)
+        if reply_msg:
+            reply_segments = getattr(reply_msg, 'message_segment', None)
+            if reply_segments:
                 logger.info("[多图] 尝试从回复消息中提取图片...")
-                reply_images = await _extract_images_from_segments(reply_msg.message_segment)
+                reply_images = await _extract_images_from_segments(reply_segments)
                 images.extend(reply_images)
                 logger.info(f"[多图] 从回复消息中提取到 {len(reply_images)} 张图片")
 
@@ -331,10 +336,7 @@ class BaseDrawCommand(BaseCommand, ABC):
         images.extend(current_images)
 
         # 准备处理 @ 提及
-        if hasattr(segments, 'type') and segments.type == 'seglist':
-            segments = segments.data
-        if not isinstance(segments, list):
-            segments = [segments]
+        segments = normalize_segments(segments)
 
         # 3. 收集 @ 提及的用户头像
         mentioned_users = []
@@ -342,10 +344,10 @@ class BaseDrawCommand(BaseCommand, ABC):
             if seg.type == 'text' and isinstance(seg.data, str) and '@' in seg.data:
                 # 提取所有 @ 的用户 ID
                 # 匹配标准 @123456
-                for match in re.finditer(r'@(\d{5,11})\b', seg.data):
+                for match in _MULTI_AT_QQ_RE.finditer(seg.data):
                     mentioned_users.append(match.group(1))
                 # 匹配特殊格式 @<Name:123456>
-                for match in re.finditer(r'@<[^>]+:(\d+)>', seg.data):
+                for match in _MULTI_AT_MENTION_RE.finditer(seg.data):
                     mentioned_users.append(match.group(1))
             elif seg.type == 'at':
                 # 处理 at 类型的消息段
@@ -357,12 +359,14 @@ class BaseDrawCommand(BaseCommand, ABC):
                 elif isinstance(seg.data, str):
                     mentioned_users.append(seg.data)
 
-        # 下载 @ 用户的头像
-        for user_id in mentioned_users:
-            logger.info(f"[多图] 获取 @{user_id} 的头像")
-            img_bytes = await download_image(f"https://q1.qlogo.cn/g?b=qq&nk={user_id}&s=640", proxy)
-            if img_bytes:
-                images.append(img_bytes)
+        # 并发下载 @ 用户的头像，按提及顺序加入
+        if mentioned_users:
+            logger.info(f"[多图] 获取 {len(mentioned_users)} 个 @用户的头像: {', '.join(mentioned_users)}")
+            avatars = await fetch_avatars(mentioned_users, proxy)
+            for user_id in mentioned_users:
+                img_bytes = avatars.get(user_id)
+                if img_bytes:
+                    images.append(img_bytes)
 
         logger.info(f"[多图] 共收集到 {len(images)} 张图片")
         return images
@@ -396,15 +400,31 @@ class BaseDrawCommand(BaseCommand, ABC):
                     await self.send_text("⚠️ 管理员已关闭绘图功能")
                     return True, "管理员专用模式", True
 
-        start_time = datetime.now()
+        start_time = time.perf_counter()
         status_msg_start_time = time.time()
 
         prompt = await self.get_prompt()
         if not prompt:
             return True, "无效的Prompt", True
 
-        await self._notify_start()
-        image_bytes = await self.get_source_image_bytes()
+        # 图片获取与端点构建、开始提示并行进行；无可用端点时任务尚未执行即被取消
+        image_task = asyncio.create_task(self.get_source_image_bytes())
+        try:
+            endpoints_to_try = build_drawing_endpoints()
+
+            if not endpoints_to_try:
+                image_task.cancel()
+                await self.send_text("❌ 未配置任何API密钥或端点。" )
+                return True, "无可用密钥或端点", True
+
+            await self._notify_start()
+            image_bytes = await image_task
+        finally:
+            # 提前返回或出错时取消未完成的图片获取；已结束的任务取走异常，避免 "Task exception was never retrieved"
+            if not image_task.done():
+                image_task.cancel()
+            elif not image_task.cancelled():
+                image_task.exception()
 
         if not image_bytes and not self.allow_text_only:
             await self.send_text("❌ 未找到可供处理的图片或图片处理失败。" )
@@ -429,21 +449,23 @@ class BaseDrawCommand(BaseCommand, ABC):
             ]
         }
 
-        endpoints_to_try = build_drawing_endpoints()
-
-        if not endpoints_to_try:
-            await self.send_text("❌ 未配置任何API密钥或端点。" )
-            return True, "无可用密钥或端点", True
-
         last_error = ""
         proxy = self.get_config("proxy.proxy_url") if self.get_config("proxy.enable") else None
+        gemini_request_body = None
+
+        # 各端点共用的请求片段只构建一次；它们在构建请求时只读，各端点共享同一份引用
+        user_text_prompt = prompt
+        image_data_url = f"data:{mime_type};base64,{base64_img}" if image_bytes else None
+        openai_content = [{"type": "text", "text": user_text_prompt}]
+        if image_data_url:
+            openai_content.append({"type": "image_url", "image_url": {"url": image_data_url}})
 
         for i, endpoint in enumerate(endpoints_to_try):
             api_url = endpoint["url"]
             api_key = endpoint["key"]
             endpoint_type = endpoint["type"]
 
-            logger.info(f"尝试第 {i+1}/{len(endpoints_to_try)} 个端点: {endpoint_type} ({api_url})")
+            logger.info("尝试第 %d/%d 个端点: %s (%s)", i + 1, len(endpoints_to_try), endpoint_type, api_url)
 
             headers = {"Content-Type": "application/json"}
             request_url = api_url
@@ -456,22 +478,23 @@ class BaseDrawCommand(BaseCommand, ABC):
                 is_doubao = False
                 is_tsai = False
 
-                if endpoint_type == 'lmarena':
+                kind = endpoint.get("kind") or classify_endpoint(api_url, endpoint_type)
+                if kind == 'lmarena':
                     is_openai = True
                     request_url = f"{api_url}"
                     client_proxy = None
-                elif "/chat/completions" in api_url:
+                elif kind == 'openai':
                     is_openai = True
                     request_url = api_url
-                elif "/images/generations" in api_url:
+                elif kind == 'doubao':
                     # 火山豆包图片生成 API
                     is_doubao = True
                     is_openai = False
                     request_url = api_url
-                elif "generateContent" in api_url:
+                elif kind == 'gemini':
                     is_openai = False
                     request_url = f"{api_url}?key={api_key}"
-                elif endpoint_type.startswith("custom_tsart") or "tavr.top" in api_url.lower() or "tsart.lat" in api_url.lower() or "endpoint=image" in api_url.lower():
+                elif kind == 'tsai':
                     is_tsai = True
                     is_openai = False
                     is_doubao = False
@@ -480,13 +503,6 @@ class BaseDrawCommand(BaseCommand, ABC):
                     logger.warning(f"无法识别的API地址格式: {api_url}，跳过。请检查配置。")
                     continue
 
-                # 提取用户文本 prompt
-                user_text_prompt = ""
-                for p in parts:
-                    if "text" in p:
-                        user_text_prompt = p["text"]
-                        break
-
                 if is_doubao:
                     # 火山豆包图片生成 API
                     headers["Authorization"] = f"Bearer {api_key}"
@@ -503,9 +519,8 @@ class BaseDrawCommand(BaseCommand, ABC):
                     }
 
                     # 如果有图片，添加到请求中（图生图模式）
-                    if image_bytes:
+                    if image_data_url:
                         # 豆包支持 data URL 格式的图片
-                        image_data_url = f"data:{mime_type};base64,{base64_img}"
                         doubao_payload["image"] = image_data_url
                         logger.info(f"构建豆包图生图请求: model={model_name}, prompt={user_text_prompt[:50]}...")
                     else:
@@ -515,13 +530,13 @@ class BaseDrawCommand(BaseCommand, ABC):
 
                 elif is_tsai:
                     headers["x-api-key"] = api_key
-                    if image_bytes and mime_type:
+                    if image_data_url:
                         request_url = f"{base_url}?endpoint=image_editing"
                         workflow = endpoint.get("model") or "rr3"
                         current_payload = {
                             "prompt": user_text_prompt,
                             "workflow": workflow,
-                            "image": f"data:{mime_type};base64,{base64_img}",
+                            "image": image_data_url,
                             "seed": -1
                         }
                     else:
@@ -537,23 +552,7 @@ class BaseDrawCommand(BaseCommand, ABC):
                     if api_key:
                         headers["Authorization"] = f"Bearer {api_key}"
 
-                    openai_messages = [
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "text",
-                                    "text": user_text_prompt
-                                }
-                            ]
-                        },
-                    ]
-
-                    if image_bytes:
-                        openai_messages[0]["content"].append({
-                            "type": "image_url",
-                            "image_url": { "url": f"data:{mime_type};base64,{base64_img}" }
-                        })
+                    openai_messages = [{"role": "user", "content": openai_content}]
 
                     model_name = endpoint.get("model")
                     if not model_name:
@@ -566,7 +565,9 @@ class BaseDrawCommand(BaseCommand, ABC):
                     }
                     current_payload = openai_payload
 
-                logger.info(f"准备向 {endpoint_type} 端点发送请求。URL: {request_url}, Payload: {safe_json_dumps(current_payload)}")
+                # 请求体可能包含数 MB 的 base64 图片，仅在 INFO 级别启用时才构建截断后的日志内容；URL 中的 Key 不写入日志
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info("准备向 %s 端点发送请求。URL: %s, Payload: %s", endpoint_type, redact_url(request_url), safe_json_dumps(current_payload))
 
                 img_data = None
                 failure_reason = ""
@@ -576,45 +577,45 @@ class BaseDrawCommand(BaseCommand, ABC):
 
                 debug_mode = self.get_config("behavior.debug_mode", False)
 
+                # 请求体只序列化一次，流式与非流式分支共用；原始 Gemini 载荷在各端点间不变，跨重试复用
+                if current_payload is payload:
+                    if gemini_request_body is None:
+                        gemini_request_body = dumps_json_bytes(payload)
+                    request_body = gemini_request_body
+                else:
+                    request_body = dumps_json_bytes(current_payload)
+
                 if use_stream:
                     try:
                         debug_sse_lines = [] if debug_mode else None
                         accumulated_content = ""
-                        async with httpx.AsyncClient(proxy=client_proxy, timeout=180.0, follow_redirects=True) as client:
-                            async with client.stream("POST", request_url, json=current_payload, headers=headers) as response:
+                        async with shared_http_client(client_proxy, 180.0) as client:
+                            async with client.stream("POST", request_url, content=request_body, headers=headers) as response:
                                 if response.status_code != 200:
-                                    raw_body = await response.aread()
-                                    raise Exception(f"API请求失败, 状态码: {response.status_code} - {raw_body.decode('utf-8', 'ignore')}")
+                                    raise Exception(f"API请求失败, 状态码: {response.status_code} - {await read_error_body(response)}")
 
-                                async for line in response.aiter_lines():
-                                    line = line.strip()
-                                    if not line:
-                                        continue
-                                    if line.startswith(':'):
+                                async for sse_data in iter_sse_data(response, decode=False):
+                                    if debug_sse_lines is not None:
+                                        debug_sse_lines.append(sse_data.decode('utf-8', 'replace'))
+
+                                    # 只有正文 content 会被累积，不含该字段的事件（推理、元数据等）无需解析
+                                    if b'"content"' not in sse_data:
                                         continue
 
-                                    if line.startswith('data:'):
-                                        data_str = line[5:].strip()
-                                        if data_str == "DONE" or data_str == "[DONE]":
-                                            break
-
-                                        if debug_sse_lines is not None:
-                                            debug_sse_lines.append(data_str)
-
-                                        try:
-                                            response_data = json.loads(data_str)
-                                            # 只累积流式正文，避免在半截 base64 chunk 上误提取并截断。
-                                            if "choices" in response_data and response_data["choices"]:
-                                                choice = response_data["choices"][0]
-                                                delta = choice.get("delta", {})
-                                                chunk_content = delta.get("content", "")
-                                                message = choice.get("message", {})
-                                                if not chunk_content and isinstance(message, dict):
-                                                    chunk_content = message.get("content", "")
-                                                if chunk_content:
-                                                    accumulated_content += chunk_content
-                                        except json.JSONDecodeError:
-                                            pass
+                                    try:
+                                        response_data = loads_json(sse_data)
+                                        # 只累积流式正文，避免在半截 base64 chunk 上误提取并截断。
+                                        if "choices" in response_data and response_data["choices"]:
+                                            choice = response_data["choices"][0]
+                                            delta = choice.get("delta", {})
+                                            chunk_content = delta.get("content", "")
+                                            message = choice.get("message", {})
+                                            if not chunk_content and isinstance(message, dict):
+                                                chunk_content = message.get("content", "")
+                                            if chunk_content:
+                                                accumulated_content += chunk_content
+                                    except json.JSONDecodeError:
+                                        pass
 
                         # 流结束后：尝试从累积内容中提取
                         if not img_data and accumulated_content:
@@ -646,12 +647,12 @@ class BaseDrawCommand(BaseCommand, ABC):
                 else:
                     try:
                         if is_tsai:
-                            async with httpx.AsyncClient(proxy=client_proxy, timeout=60.0, follow_redirects=True) as client:
-                                response = await client.post(request_url, json=current_payload, headers=headers)
+                            async with shared_http_client(client_proxy, 60.0) as client:
+                                response = await client.post(request_url, content=request_body, headers=headers)
                                 if response.status_code != 200:
-                                    raise Exception(f"创建任务失败: {response.status_code} - {response.text}")
+                                    raise Exception(f"创建任务失败: {response.status_code} - {error_body_text(response)}")
 
-                                resp_json = response.json()
+                                resp_json = loads_json(response.content)
                                 task_id = resp_json.get("data", {}).get("id")
                                 if not task_id:
                                     raise Exception(f"未能获取TS-AI任务ID: {resp_json}")
@@ -663,7 +664,7 @@ class BaseDrawCommand(BaseCommand, ABC):
                                     if poll_resp.status_code != 200:
                                         continue
 
-                                    poll_data = poll_resp.json()
+                                    poll_data = loads_json(poll_resp.content)
                                     status = poll_data.get("data", {}).get("status")
                                     if status == "completed":
                                         image_url = poll_data["data"]["result"]["image_url"]
@@ -675,18 +676,18 @@ class BaseDrawCommand(BaseCommand, ABC):
                                 else:
                                     raise Exception("TS-AI任务轮询超时")
                         else:
-                            async with httpx.AsyncClient(proxy=client_proxy, timeout=120.0, follow_redirects=True) as client:
-                                response = await client.post(request_url, json=current_payload, headers=headers)
+                            async with shared_http_client(client_proxy, 120.0) as client:
+                                response = await client.post(request_url, content=request_body, headers=headers)
                     except httpx.RequestError as e:
                         logger.error(
-                            f"httpx.RequestError for endpoint {endpoint_type} ({request_url}): "
-                            f"{type(e).__name__}: {repr(e)}"
+                            "httpx.RequestError for endpoint %s (%s): %s: %r",
+                            endpoint_type, redact_url(request_url), type(e).__name__, e
                         )
                         raise
 
                     if not is_tsai:
                         if response.status_code == 200:
-                            data = response.json()
+                            data = loads_json(response.content)
                             img_data = await extract_all_image_data(data)
                             if not img_data:
                                 if debug_mode:
@@ -697,13 +698,13 @@ class BaseDrawCommand(BaseCommand, ABC):
                                 reason = extract_text_failure_reason(data)
                                 raise Exception(f"API未返回图片, 原因: {reason or '响应中没有可提取的图片数据'}")
                         else:
-                            raise Exception(f"API请求失败, 状态码: {response.status_code} - {response.text}")
+                            raise Exception(f"API请求失败, 状态码: {response.status_code} - {error_body_text(response)}")
 
                 if img_data:
                     if endpoint_type != 'lmarena':
-                        key_manager.record_key_usage(api_key, True)
+                        get_key_manager().record_key_usage(api_key, True)
 
-                    elapsed = (datetime.now() - start_time).total_seconds()
+                    elapsed = time.perf_counter() - start_time
                     logger.info(f"使用 {endpoint_type} 端点成功生成图片，耗时 {elapsed:.2f}s")
 
                     try:
@@ -718,7 +719,7 @@ class BaseDrawCommand(BaseCommand, ABC):
                                     if image_bytes:
                                         image_to_send_b64 = base64.b64encode(image_bytes).decode('utf-8')
                                 elif 'base64,' in single_img_data:
-                                    image_to_send_b64 = single_img_data.split('base64,')[1]
+                                    image_to_send_b64 = single_img_data.partition('base64,')[2]
                                 else:
                                     image_to_send_b64 = single_img_data
 
@@ -790,45 +791,70 @@ class BaseDrawCommand(BaseCommand, ABC):
                 logger.warning(f"端点 {endpoint_type} 尝试失败: {type(e).__name__}: {e}")
                 if endpoint_type != 'lmarena':
                     is_quota_error = "429" in str(e)
-                    key_manager.record_key_usage(api_key, False, force_disable=is_quota_error)
+                    get_key_manager().record_key_usage(api_key, False, force_disable=is_quota_error)
                 last_error = str(e)
                 await asyncio.sleep(1)
 
-        elapsed = (datetime.now() - start_time).total_seconds()
+        elapsed = time.perf_counter() - start_time
         fail_msg = f"❌ 生成失败 ({elapsed:.2f}s, {len(endpoints_to_try)}次尝试)\n最终错误: {last_error}"
         fail_msg_send_time = time.time()
         await self.send_text(fail_msg)
-        asyncio.create_task(self._delayed_recall_fail_message(fail_msg_send_time, fail_msg))
-        await self._recall_status_messages(status_msg_start_time)
+        asyncio.create_task(self._recall_after_failure(status_msg_start_time, fail_msg_send_time))
         return True, "所有尝试均失败", True
 
-    async def _delayed_recall_fail_message(self, fail_msg_send_time: float, fail_msg_content: str) -> None:
+    async def _query_recent_messages(self, chat_id: str, start_time: float, limit: int) -> List[Tuple[float, str, str]]:
+        """查询聊天中指定时间之后的可撤回消息，统一返回 (时间, 内容, 消息ID) 元组列表
+
+        消息 ID 只字符串化一次；没有 ID 或 send_api_ 开头的本地占位 ID 在此直接过滤。
+        """
+        bot_messages = await self.ctx.message.get_by_time_in_chat(
+            chat_id=chat_id,
+            start_time=str(start_time),
+            end_time=str(time.time() + 5),
+            limit=limit
+        )
+        records = []
+        for msg in bot_messages:
+            if isinstance(msg, dict):
+                msg_time = msg.get('timestamp', 0)
+                content = msg.get('processed_plain_text', '')
+                msg_id = msg.get('message_id', None)
+            else:
+                msg_time = getattr(msg, 'time', getattr(msg, 'timestamp', 0))
+                content = getattr(msg, 'processed_plain_text', '')
+                msg_id = getattr(msg, 'message_id', None)
+            if not msg_id:
+                continue
+            sid = str(msg_id)
+            if sid.startswith('send_api_'):
+                continue
+            records.append((float(msg_time), content or '', sid))
+        return records
+
+    @staticmethod
+    def _pick_status_message_ids(records: List[Tuple[float, str, str]], status_msg_start_time: float) -> List[str]:
+        """从查询结果中挑出需要撤回的状态消息"""
+        status_prefixes = ("戳一戳", "✅ ")
+        return [
+            sid for msg_time, content, sid in records
+            if msg_time >= status_msg_start_time - 1 and content.startswith(status_prefixes)
+        ]
+
+    async def _recall_after_failure(self, status_msg_start_time: float, fail_msg_send_time: float) -> None:
+        """失败后的统一撤回任务：约 2 秒后撤回状态消息，约 6 秒后撤回失败提示
+
+        失败提示单独按其发送时间查询，避免生成耗时较长时与状态消息合并查询的结果被 limit 截断而漏掉失败提示。
+        """
+        await self._recall_status_messages(status_msg_start_time)
         try:
-            await asyncio.sleep(5)
+            await asyncio.sleep(max(0.0, fail_msg_send_time + 6 - time.time()))
             chat_id = self._get_stream_id()
             if not chat_id: return
-            await asyncio.sleep(1)
-            current_time = time.time()
-            bot_messages = await self.ctx.message.get_by_time_in_chat(
-                chat_id=chat_id,
-                start_time=str(fail_msg_send_time - 2),
-                end_time=str(current_time + 5),
-                limit=10
-            )
-            for msg in bot_messages:
-                if isinstance(msg, dict):
-                    content = msg.get('processed_plain_text', '')
-                    msg_id = msg.get('message_id', None)
-                    msg_time = msg.get('timestamp', 0)
-                else:
-                    content = getattr(msg, 'processed_plain_text', '')
-                    msg_id = getattr(msg, 'message_id', None)
-                    msg_time = getattr(msg, 'time', getattr(msg, 'timestamp', 0))
-
-                if content.startswith("❌ 生成失败") and float(msg_time) >= fail_msg_send_time - 2:
-                    if msg_id and not str(msg_id).startswith('send_api_'):
-                        await self._safe_recall([str(msg_id)])
-                        return
+            records = await self._query_recent_messages(chat_id, fail_msg_send_time - 2, limit=10)
+            for msg_time, content, sid in records:
+                if content.startswith("❌ 生成失败") and msg_time >= fail_msg_send_time - 2:
+                    await self._safe_recall([sid])
+                    return
         except Exception: pass
 
     async def _recall_status_messages(self, status_msg_start_time: float) -> None:
@@ -839,29 +865,8 @@ class BaseDrawCommand(BaseCommand, ABC):
             chat_id = self._get_stream_id()
             if not chat_id: return
             await asyncio.sleep(2)
-            current_time = time.time()
-            bot_messages = await self.ctx.message.get_by_time_in_chat(
-                chat_id=chat_id,
-                start_time=str(status_msg_start_time - 5),
-                end_time=str(current_time + 5),
-                limit=20
-            )
-            status_prefixes = ("戳一戳", "✅ ")
-            to_recall = []
-            for msg in bot_messages:
-                if isinstance(msg, dict):
-                    msg_time = msg.get('timestamp', 0)
-                    content = msg.get('processed_plain_text', '')
-                    msg_id = msg.get('message_id', None)
-                else:
-                    msg_time = getattr(msg, 'time', getattr(msg, 'timestamp', 0))
-                    content = getattr(msg, 'processed_plain_text', '')
-                    msg_id = getattr(msg, 'message_id', None)
-                    
-                if float(msg_time) >= status_msg_start_time - 1:
-                    if content.startswith(status_prefixes):
-                        if msg_id and not str(msg_id).startswith('send_api_'):
-                            to_recall.append(str(msg_id))
+            records = await self._query_recent_messages(chat_id, status_msg_start_time - 5, limit=20)
+            to_recall = self._pick_status_message_ids(records, status_msg_start_time)
             if to_recall:
                 await self._safe_recall(to_recall)
         except Exception: pass
@@ -895,28 +900,44 @@ class BaseMultiImageDrawCommand(BaseDrawCommand):
                     await self.send_text("⚠️ 管理员已关闭绘图功能")
                     return True, "管理员专用模式", True
 
-        start_time = datetime.now()
+        start_time = time.perf_counter()
         status_msg_start_time = time.time()
 
         prompt = await self.get_prompt()
         if not prompt:
             return True, "无效的Prompt", True
 
-        await self._notify_start()
+        # 获取多张图片与端点构建、开始提示并行进行；无可用端点时任务尚未执行即被取消
+        images_task = asyncio.create_task(self.get_multiple_source_images(min_count=2))
+        try:
+            endpoints_to_try = build_drawing_endpoints()
+
+            if not endpoints_to_try:
+                images_task.cancel()
+                await self.send_text("❌ 未配置任何API密钥或端点。" )
+                return True, "无可用密钥或端点", True
 
-        # 获取多张图片
-        images = await self.get_multiple_source_images(min_count=2)
+            await self._notify_start()
+            images = await images_task
+        finally:
+            if not images_task.done():
+                images_task.cancel()
+            elif not images_task.cancelled():
+                images_task.exception()
 
         if len(images) < 2:
             await self.send_text("❌ 请至少提供2张图片（通过回复消息、@用户或直接发送）")
             return True, "图片数量不足", True
 
+        # 每张图片只转换、编码一次，各端点重试时复用同一份 (mime_type, base64) 结果
+        encoded_images = []
+        for img_bytes in images:
+            img_bytes = convert_if_gif(img_bytes)
+            encoded_images.append((get_image_mime_type(img_bytes), base64.b64encode(img_bytes).decode('utf-8')))
+
         # 构造 Gemini 格式的 parts
         parts = []
-        for i, img_bytes in enumerate(images):
-            img_bytes = convert_if_gif(img_bytes)
-            base64_img = base64.b64encode(img_bytes).decode('utf-8')
-            mime_type = get_image_mime_type(img_bytes)
+        for i, (mime_type, base64_img) in enumerate(encoded_images):
             # 添加图片标签，帮助模型识别
             parts.append({"text": f"Image {i+1}:"})
             parts.append({"inline_data": {"mime_type": mime_type, "data": base64_img}})
@@ -933,21 +954,24 @@ class BaseMultiImageDrawCommand(BaseDrawCommand):
             ]
         }
 
-        endpoints_to_try = build_drawing_endpoints()
-
-        if not endpoints_to_try:
-            await self.send_text("❌ 未配置任何API密钥或端点。" )
-            return True, "无可用密钥或端点", True
-
         last_error = ""
         proxy = self.get_config("proxy.proxy_url") if self.get_config("proxy.enable") else None
+        gemini_request_body = None
+
+        # 各端点共用的请求片段只构建一次；它们在构建请求时只读，各端点共享同一份引用
+        user_text_prompt = prompt
+        image_data_urls = [f"data:{mime};base64,{b64_img}" for mime, b64_img in encoded_images]
+        openai_content = [{"type": "text", "text": f"Prompt: {user_text_prompt}"}]
+        for img_idx, image_data_url in enumerate(image_data_urls):
+            openai_content.append({"type": "text", "text": f"Image {img_idx+1}:"})
+            openai_content.append({"type": "image_url", "image_url": {"url": image_data_url}})
 
         for i, endpoint in enumerate(endpoints_to_try):
             api_url = endpoint["url"]
             api_key = endpoint["key"]
             endpoint_type = endpoint["type"]
 
-            logger.info(f"尝试第 {i+1}/{len(endpoints_to_try)} 个端点: {endpoint_type} ({api_url})")
+            logger.info("尝试第 %d/%d 个端点: %s (%s)", i + 1, len(endpoints_to_try), endpoint_type, api_url)
 
             headers = {"Content-Type": "application/json"}
             request_url = api_url
@@ -960,21 +984,22 @@ class BaseMultiImageDrawCommand(BaseDrawCommand):
                 is_doubao = False
                 is_tsai = False
 
-                if endpoint_type == 'lmarena':
+                kind = endpoint.get("kind") or classify_endpoint(api_url, endpoint_type)
+                if kind == 'lmarena':
                     is_openai = True
                     request_url = f"{api_url}"
                     client_proxy = None
-                elif "/chat/completions" in api_url:
+                elif kind == 'openai':
                     is_openai = True
                     request_url = api_url
-                elif "/images/generations" in api_url:
+                elif kind == 'doubao':
                     is_doubao = True
                     is_openai = False
                     request_url = api_url
-                elif "generateContent" in api_url:
+                elif kind == 'gemini':
                     is_openai = False
                     request_url = f"{api_url}?key={api_key}"
-                elif endpoint_type.startswith("custom_tsart") or "tavr.top" in api_url.lower() or "tsart.lat" in api_url.lower() or "endpoint=image" in api_url.lower():
+                elif kind == 'tsai':
                     is_tsai = True
                     is_openai = False
                     is_doubao = False
@@ -983,8 +1008,6 @@ class BaseMultiImageDrawCommand(BaseDrawCommand):
                     logger.warning(f"无法识别的API地址格式: {api_url}，跳过。请检查配置。")
                     continue
 
-                user_text_prompt = prompt
-
                 if is_doubao:
                     headers["Authorization"] = f"Bearer {api_key}"
 
@@ -999,23 +1022,13 @@ class BaseMultiImageDrawCommand(BaseDrawCommand):
                         "watermark": False
                     }
 
-                    image_list = []
-                    for img in images:
-                        img = convert_if_gif(img)
-                        b64_img = base64.b64encode(img).decode('utf-8')
-                        mime = get_image_mime_type(img)
-                        image_list.append(f"data:{mime};base64,{b64_img}")
-
-                    doubao_payload["image"] = image_list
+                    doubao_payload["image"] = image_data_urls
 
                     current_payload = doubao_payload
 
                 elif is_tsai:
                     headers["x-api-key"] = api_key
-                    if images:
-                        first_image = convert_if_gif(images[0])
-                        first_image_b64 = base64.b64encode(first_image).decode('utf-8')
-                        first_image_mime = get_image_mime_type(first_image)
+                    if image_data_urls:
                         if len(images) > 1:
                             logger.info(f"TS-AI 多图暂仅使用第 1 张参考图，其余 {len(images) - 1} 张将被忽略。")
                         request_url = f"{base_url}?endpoint=image_editing"
@@ -1023,7 +1036,7 @@ class BaseMultiImageDrawCommand(BaseDrawCommand):
                         current_payload = {
                             "prompt": user_text_prompt,
                             "workflow": workflow,
-                            "image": f"data:{first_image_mime};base64,{first_image_b64}",
+                            "image": image_data_urls[0],
                             "seed": -1
                         }
                     else:
@@ -1039,19 +1052,7 @@ class BaseMultiImageDrawCommand(BaseDrawCommand):
                     if api_key:
                         headers["Authorization"] = f"Bearer {api_key}"
 
-                    content_list = [{"type": "text", "text": f"Prompt: {user_text_prompt}"}]
-
-                    for i, img_bytes in enumerate(images):
-                        img_bytes = convert_if_gif(img_bytes)
-                        base64_img = base64.b64encode(img_bytes).decode('utf-8')
-                        mime_type = get_image_mime_type(img_bytes)
-                        content_list.append({"type": "text", "text": f"Image {i+1}:"})
-                        content_list.append({
-                            "type": "image_url",
-                            "image_url": { "url": f"data:{mime_type};base64,{base64_img}" }
-                        })
-
-                    openai_messages = [{"role": "user", "content": content_list}]
+                    openai_messages = [{"role": "user", "content": openai_content}]
 
                     model_name = endpoint.get("model")
                     if not model_name:
@@ -1074,40 +1075,44 @@ class BaseMultiImageDrawCommand(BaseDrawCommand):
 
                 debug_mode = self.get_config("behavior.debug_mode", False)
 
+                # 请求体只序列化一次，流式与非流式分支共用；原始 Gemini 载荷在各端点间不变，跨重试复用
+                if current_payload is payload:
+                    if gemini_request_body is None:
+                        gemini_request_body = dumps_json_bytes(payload)
+                    request_body = gemini_request_body
+                else:
+                    request_body = dumps_json_bytes(current_payload)
+
                 if use_stream:
                     try:
                         debug_sse_lines = [] if debug_mode else None
                         accumulated_content = ""
-                        async with httpx.AsyncClient(proxy=client_proxy, timeout=180.0, follow_redirects=True) as client:
-                            async with client.stream("POST", request_url, json=current_payload, headers=headers) as response:
+                        async with shared_http_client(client_proxy, 180.0) as client:
+                            async with client.stream("POST", request_url, content=request_body, headers=headers) as response:
                                 if response.status_code != 200:
-                                    raw_body = await response.aread()
-                                    raise Exception(f"API请求失败, 状态码: {response.status_code} - {raw_body.decode('utf-8', 'ignore')}")
-
-                                async for line in response.aiter_lines():
-                                    line = line.strip()
-                                    if not line: continue
-                                    if line.startswith(':'): continue
-                                    if line.startswith('data:'):
-                                        data_str = line[5:].strip()
-                                        if data_str == "DONE" or data_str == "[DONE]": break
-
-                                        if debug_sse_lines is not None:
-                                            debug_sse_lines.append(data_str)
-
-                                        try:
-                                            response_data = json.loads(data_str)
-                                            # 只累积流式正文，避免在半截 base64 chunk 上误提取并截断。
-                                            if "choices" in response_data and response_data["choices"]:
-                                                choice = response_data["choices"][0]
-                                                delta = choice.get("delta", {})
-                                                chunk_content = delta.get("content", "")
-                                                message = choice.get("message", {})
-                                                if not chunk_content and isinstance(message, dict):
-                                                    chunk_content = message.get("content", "")
-                                                if chunk_content:
-                                                    accumulated_content += chunk_content
-                                        except json.JSONDecodeError: pass
+                                    raise Exception(f"API请求失败, 状态码: {response.status_code} - {await read_error_body(response)}")
+
+                                async for sse_data in iter_sse_data(response, decode=False):
+                                    if debug_sse_lines is not None:
+                                        debug_sse_lines.append(sse_data.decode('utf-8', 'replace'))
+
+                                    # 只有正文 content 会被累积，不含该字段的事件（推理、元数据等）无需解析
+                                    if b'"content"' not in sse_data:
+                                        continue
+
+                                    try:
+                                        response_data = loads_json(sse_data)
+                                        # 只累积流式正文，避免在半截 base64 chunk 上误提取并截断。
+                                        if "choices" in response_data and response_data["choices"]:
+                                            choice = response_data["choices"][0]
+                                            delta = choice.get("delta", {})
+                                            chunk_content = delta.get("content", "")
+                                            message = choice.get("message", {})
+                                            if not chunk_content and isinstance(message, dict):
+                                                chunk_content = message.get("content", "")
+                                            if chunk_content:
+                                                accumulated_content += chunk_content
+                                    except json.JSONDecodeError: pass
 
                         # 流结束后：尝试从累积内容中提取
                         if not img_data and accumulated_content:
@@ -1136,12 +1141,12 @@ class BaseMultiImageDrawCommand(BaseDrawCommand):
                 else:
                     try:
                         if is_tsai:
-                            async with httpx.AsyncClient(proxy=client_proxy, timeout=60.0, follow_redirects=True) as client:
-                                response = await client.post(request_url, json=current_payload, headers=headers)
+                            async with shared_http_client(client_proxy, 60.0) as client:
+                                response = await client.post(request_url, content=request_body, headers=headers)
                                 if response.status_code != 200:
-                                    raise Exception(f"创建任务失败: {response.status_code} - {response.text}")
+                                    raise Exception(f"创建任务失败: {response.status_code} - {error_body_text(response)}")
 
-                                resp_json = response.json()
+                                resp_json = loads_json(response.content)
                                 task_id = resp_json.get("data", {}).get("id")
                                 if not task_id:
                                     raise Exception(f"未能获取TS-AI任务ID: {resp_json}")
@@ -1153,7 +1158,7 @@ class BaseMultiImageDrawCommand(BaseDrawCommand):
                                     if poll_resp.status_code != 200:
                                         continue
 
-                                    poll_data = poll_resp.json()
+                                    poll_data = loads_json(poll_resp.content)
                                     status = poll_data.get("data", {}).get("status")
                                     if status == "completed":
                                         image_url = poll_data["data"]["result"]["image_url"]
@@ -1165,15 +1170,15 @@ class BaseMultiImageDrawCommand(BaseDrawCommand):
                                 else:
                                     raise Exception("TS-AI任务轮询超时")
                         else:
-                            async with httpx.AsyncClient(proxy=client_proxy, timeout=120.0, follow_redirects=True) as client:
-                                response = await client.post(request_url, json=current_payload, headers=headers)
+                            async with shared_http_client(client_proxy, 120.0) as client:
+                                response = await client.post(request_url, content=request_body, headers=headers)
                     except httpx.RequestError as e:
                         logger.error(f"httpx.RequestError: {type(e).__name__}: {e!r}")
                         raise
 
                     if not is_tsai:
                         if response.status_code == 200:
-                            data = response.json()
+                            data = loads_json(response.content)
                             img_data = await extract_all_image_data(data)
                             if not img_data:
                                 if debug_mode:
@@ -1184,13 +1189,13 @@ class BaseMultiImageDrawCommand(BaseDrawCommand):
                                 reason = extract_text_failure_reason(data)
                                 raise Exception(f"API未返回图片, 原因: {reason or '响应中没有可提取的图片数据'}")
                         else:
-                            raise Exception(f"API请求失败, 状态码: {response.status_code} - {response.text}")
+                            raise Exception(f"API请求失败, 状态码: {response.status_code} - {error_body_text(response)}")
 
                 if img_data:
                     if endpoint_type != 'lmarena':
-                        key_manager.record_key_usage(api_key, True)
+                        get_key_manager().record_key_usage(api_key, True)
 
-                    elapsed = (datetime.now() - start_time).total_seconds()
+                    elapsed = time.perf_counter() - start_time
                     logger.info(f"使用 {endpoint_type} 端点成功生成图片，耗时 {elapsed:.2f}s")
 
                     try:
@@ -1205,7 +1210,7 @@ class BaseMultiImageDrawCommand(BaseDrawCommand):
                                     if image_bytes:
                                         image_to_send_b64 = base64.b64encode(image_bytes).decode('utf-8')
                                 elif 'base64,' in single_img_data:
-                                    image_to_send_b64 = single_img_data.split('base64,')[1]
+                                    image_to_send_b64 = single_img_data.partition('base64,')[2]
                                 else:
                                     image_to_send_b64 = single_img_data
 
@@ -1253,16 +1258,15 @@ class BaseMultiImageDrawCommand(BaseDrawCommand):
                 logger.warning(f"端点 {endpoint_type} 尝试失败: {type(e).__name__}: {e}")
                 if endpoint_type != 'lmarena':
                     is_quota_error = "429" in str(e)
-                    key_manager.record_key_usage(api_key, False, force_disable=is_quota_error)
+                    get_key_manager().record_key_usage(api_key, False, force_disable=is_quota_error)
                 last_error = str(e)
                 await asyncio.sleep(1)
 
-        elapsed = (datetime.now() - start_time).total_seconds()
+        elapsed = time.perf_counter() - start_time
         fail_msg = f"❌ 生成失败 ({elapsed:.2f}s, {len(endpoints_to_try)}次尝试)\n最终错误: {last_error}"
         fail_msg_send_time = time.time()
         await self.send_text(fail_msg)
-        asyncio.create_task(self._delayed_recall_fail_message(fail_msg_send_time, fail_msg))
-        await self._recall_status_messages(status_msg_start_time)
+        asyncio.create_task(self._recall_after_failure(status_msg_start_time, fail_msg_send_time))
         return True, "所有尝试均失败", True
 
 
@@ -1319,12 +1323,21 @@ class BaseVideoCommand(BaseCommand, ABC):
                     await self.send_text("⚠️ 管理员已关闭绘图功能")
                     return True, "管理员专用模式", True
 
-        start_time = datetime.now()
+        start_time = time.perf_counter()
 
         prompt = await self.get_prompt()
         if not prompt:
             return True, "无效的Prompt", True
 
+        # 使用复用函数获取端点；先确认有可用渠道，再进行图片获取与编码
+        from .draw_logic import get_video_endpoints, process_video_generation, send_video_via_napcat
+
+        endpoints_to_try = await get_video_endpoints(self.get_config, logger=logger)
+
+        if not endpoints_to_try:
+            await self.send_text("❌ 未配置视频生成渠道。\n请使用 `/渠道设置视频 <渠道名> true` 启用视频渠道。")
+            return True, "无视频渠道", True
+
         # 根据 requires_image 决定是否需要图片
         image_bytes = None
         base64_img = None
@@ -1342,15 +1355,6 @@ class BaseVideoCommand(BaseCommand, ABC):
             base64_img = base64.b64encode(image_bytes).decode('utf-8')
             mime_type = get_image_mime_type(image_bytes)
 
-        # 使用复用函数获取端点
-        from .draw_logic import get_video_endpoints, process_video_generation, send_video_via_napcat
-
-        endpoints_to_try = await get_video_endpoints(self.get_config, logger=logger)
-
-        if not endpoints_to_try:
-            await self.send_text("❌ 未配置视频生成渠道。\n请使用 `/渠道设置视频 <渠道名> true` 启用视频渠道。")
-            return True, "无视频渠道", True
-
         # 发送开始提示
         await self.send_text("🎬 开始生成视频，请稍候...")
 
@@ -1368,7 +1372,7 @@ class BaseVideoCommand(BaseCommand, ABC):
         )
 
         if video_data:
-            elapsed = (datetime.now() - start_time).total_seconds()
+            elapsed = time.perf_counter() - start_time
 
             # 获取群ID或用户ID
             group_id = None
@@ -1414,6 +1418,6 @@ class BaseVideoCommand(BaseCommand, ABC):
                 await self.send_text(f"❌ 视频发送失败: {send_error}")
                 return True, f"视频发送失败: {send_error}", True
         else:
-            elapsed = (datetime.now() - start_time).total_seconds()
+            elapsed = time.perf_counter() - start_time
             await self.send_text(f"❌ 视频生成失败 ({elapsed:.2f}s)\n错误: {last_error}")
             return True, "所有尝试均失败", True
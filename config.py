@@ -219,6 +219,11 @@ class BehaviorConfig(PluginConfigBase):
         description="是否显示大香蕉网站中标记为猎奇/重口/限制级的提示词",
         json_schema_extra=ui("显示限制级提示词", "开启后会显示被标记为猎奇、重口或限制级的提示词。请按使用场景谨慎开启。"),
     )
+    parallel_attempts: int = Field(
+        default=1,
+        description="自动绘图/自拍等 Action 同时尝试的绘图端点数：1 为逐个尝试；大于 1 时若当前端点 8 秒内未返回，会再启动下一个端点，任一成功即取消其余请求。/bnn、/绘图、/+、/多图 等命令不受影响，仍逐个尝试",
+        json_schema_extra=ui("并行尝试端点数（仅 Action）", "仅对麦麦主动触发的绘图/自拍 Action 生效，命令仍逐个尝试端点。设为 2~3 可缩短慢渠道的等待时间，但可能额外消耗其他渠道的额度。"),
+    )
     banana_sync_on_load: bool = Field(
         default=False,
         description="插件加载时是否自动同步大香蕉提示词，关闭后仅手动同步",
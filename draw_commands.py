@@ -21,36 +21,111 @@ UniversalPromptCommand (/+ 指令名):
     - 使用管理员预先配置的提示词预设进行绘图
     - 支持动态添加新的绘图风格
 
-每个命令通过重写 get_prompt() 方法来定义如何解析用户输入并生成提示词。
+每个命令通过重写 get_prompt() 方法来定义如何解析用户输入并生成提示词；
+"指令 + 提示词" 格式的命令继承 TriggerPromptMixin，只需声明 command_pattern 与 _EMPTY_HINT。
 """
 import re
-import random
-from typing import Tuple, Optional
+from typing import ClassVar, Tuple, Optional
 from .base_commands import BaseDrawCommand, BaseMultiImageDrawCommand, BaseVideoCommand
-from .managers import data_manager
+from .managers import get_data_manager
 from .utils import logger
 
-class CustomDrawCommand(BaseDrawCommand):
-    command_name: str = "gemini_custom_draw"
-    command_description: str = "使用自定义Prompt进行AI绘图"
-    command_pattern: str = r".*/bnn.*"
-    
+# 预编译的消息解析正则
+_DRAW_RE = re.compile(r"(?:^|\s)/绘图\s*(.*)", re.DOTALL)
+# re.ASCII 下 \s 只做 ASCII 判断，中文消息常见的全角空格与不换行空格显式保留
+_UNIVERSAL_RE = re.compile(r"(?:^|[\s\u3000\xa0\]])/\+[\s\u3000\xa0]*(.+?)(?:$|[\s\u3000\xa0]*\[)", re.ASCII)
+
+# 固定的错误提示文本
+_ERR_MISSING_TRIGGER_FMT = "❌ 未找到 {} 指令。"
+_ERR_EMPTY_BNN = "❌ 自定义指令(/bnn)内容不能为空。"
+_ERR_EMPTY_DRAW = "❌ 请输入绘图描述！\n例如：`/绘图 一只可爱的小猫`"
+_ERR_EMPTY_MULTI = "❌ 请输入提示词！\n例如：`/多图 融合这两张图`"
+_ERR_NO_PRESET = "❌ 当前没有任何预设提示词！\n请先使用 `/添加提示词` 添加。"
+_ERR_EMPTY_IMAGE_VIDEO = "❌ 请输入视频描述！\n例如：`/图生视频 让画面动起来`"
+_ERR_EMPTY_TEXT_VIDEO = "❌ 请输入视频描述！\n例如：`/文生视频 一只可爱的小猫在草地上打滚`"
+
+
+def _strip_cq(msg: str) -> str:
+    """
+    移除消息中的 [CQ:...] 码，与正则 \\[CQ:.*?\\] 的替换结果一致。
+    使用 str.find 单次扫描代替正则回溯；未闭合或跨行的片段保持原样。
+    """
+    start = msg.find('[CQ:')
+    if start < 0:
+        return msg
+    parts = []
+    pos = 0
+    while start >= 0:
+        end = msg.find(']', start + 4)
+        if end < 0:
+            break
+        if msg.find('\n', start + 4, end) >= 0:
+            # 正则中的 . 不匹配换行，从下一个位置继续查找
+            start = msg.find('[CQ:', start + 1)
+            continue
+        parts.append(msg[pos:start])
+        pos = end + 1
+        start = msg.find('[CQ:', pos)
+    parts.append(msg[pos:])
+    return ''.join(parts)
+
+
+def _find_trigger_tail(msg: str, trigger: str, trigger_len: int) -> Optional[str]:
+    """
+    定位触发词并返回其后去除首尾空白的文本，未找到时返回 None。
+    触发词本身不以空白开头，因此无需先对整条消息 strip，只处理尾部片段即可。
+    """
+    pos = msg.find(trigger)
+    if pos < 0:
+        return None
+    return msg[pos + trigger_len:].strip()
+
+
+class TriggerPromptMixin:
+    """
+    为 "指令 + 提示词" 格式的命令提供统一的提示词解析。
+
+    这些命令的 command_pattern 只是 ".*触发词.*"，等价于子串判断，解析时直接用 str.find 定位，不再经过正则。
+    子类只需声明 command_pattern 与 _EMPTY_HINT；_TRIGGER 在类定义时由 __init_subclass__ 从 command_pattern
+    预先计算 (触发词, 触发词长度, 未找到触发词时的提示, 空提示词时的提示)。
+    """
+    _EMPTY_HINT: ClassVar[str] = ""
+    _TRIGGER: ClassVar[Tuple[str, int, str, str]] = ("", 0, "", "")
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        pattern = cls.__dict__.get('command_pattern')
+        if pattern is None:
+            return
+        trigger = pattern[2:-2]
+        if not (pattern.startswith('.*') and pattern.endswith('.*')) or not trigger or re.escape(trigger) != trigger:
+            raise ValueError(f"{cls.__name__}.command_pattern 必须是 '.*触发词.*' 形式: {pattern!r}")
+        cls._TRIGGER = (trigger, len(trigger), _ERR_MISSING_TRIGGER_FMT.format(trigger), cls._EMPTY_HINT)
+
     async def get_prompt(self) -> Optional[str]:
-        cleaned_message = re.sub(r'\[CQ:.*?\]', '', self.message.raw_message).strip()
-        command_pattern = "/bnn"
-        command_pos = cleaned_message.find(command_pattern)
-        
-        if command_pos == -1:
-            await self.send_text("❌ 未找到 /bnn 指令。")
+        return await self._parse_trigger_prompt()
+
+    async def _parse_trigger_prompt(self) -> Optional[str]:
+        """去除 CQ 码后截取触发词之后的文本作为提示词，缺失时发送提示并返回 None"""
+        trigger, trigger_len, missing_hint, empty_hint = self._TRIGGER
+        prompt_text = _find_trigger_tail(_strip_cq(self.message.raw_message), trigger, trigger_len)
+
+        if prompt_text is None:
+            await self.send_text(missing_hint)
             return None
-            
-        prompt_text = cleaned_message[command_pos + len(command_pattern):].strip()
+
         if not prompt_text:
-            await self.send_text("❌ 自定义指令(/bnn)内容不能为空。")
+            await self.send_text(empty_hint)
             return None
-            
+
         return prompt_text
 
+class CustomDrawCommand(TriggerPromptMixin, BaseDrawCommand):
+    command_name: str = "gemini_custom_draw"
+    command_description: str = "使用自定义Prompt进行AI绘图"
+    command_pattern: str = r".*/bnn.*"
+    _EMPTY_HINT = _ERR_EMPTY_BNN
+
 class TextToImageCommand(BaseDrawCommand):
     command_name: str = "gemini_text_draw"
     command_description: str = "文生图：根据文字描述生成图片 (格式: /绘图 描述词)"
@@ -59,12 +134,12 @@ class TextToImageCommand(BaseDrawCommand):
 
     async def get_prompt(self) -> Optional[str]:
         msg = self.message.raw_message
-        match = re.search(r"(?:^|\s)/绘图\s*(.*)", msg, re.DOTALL)
+        match = _DRAW_RE.search(msg)
         if not match: return None
         prompt = match.group(1).strip()
         
         if not prompt:
-            await self.send_text("❌ 请输入绘图描述！\n例如：`/绘图 一只可爱的小猫`")
+            await self.send_text(_ERR_EMPTY_DRAW)
             return None
         return prompt
 
@@ -79,51 +154,34 @@ class UniversalPromptCommand(BaseDrawCommand):
 
     async def execute(self) -> Tuple[bool, Optional[str], bool]:
         msg = self.message.raw_message
-        logger.info(f"[Universal] 收到指令: {msg}")
+        logger.info("[Universal] 收到指令: %s", msg)
         
-        match = re.search(r"(?:^|[\s\]])/\+\s*(.+?)(?:$|\s*\[)", msg)
+        match = _UNIVERSAL_RE.search(msg)
         if not match: return False, None, False
         
         cmd_name = match.group(1).strip()
-        prompts = data_manager.get_effective_prompts(
+        prompts = get_data_manager().get_effective_prompts(
             include_banana=self.get_config("behavior.enable_banana_prompts", True),
             show_restricted=self.get_config("behavior.show_restricted", False),
         )
         
         if cmd_name not in prompts:
-            logger.info(f"[Universal] 未找到 Prompt: {cmd_name}")
+            logger.info("[Universal] 未找到 Prompt: %s", cmd_name)
             await self.send_text(f"❌ 未找到指令: {cmd_name}\n请使用 `/添加提示词 {cmd_name}:内容` 添加。")
             return True, f"未找到指令: {cmd_name}", False
             
-        logger.info(f"[Universal] 找到 Prompt: {cmd_name}，准备执行。")
+        logger.info("[Universal] 找到 Prompt: %s，准备执行。", cmd_name)
         self.current_prompt_content = prompts[cmd_name]
         return await super().execute()
 
     async def get_prompt(self) -> Optional[str]:
         return self.current_prompt_content
 
-class MultiImageDrawCommand(BaseMultiImageDrawCommand):
+class MultiImageDrawCommand(TriggerPromptMixin, BaseMultiImageDrawCommand):
     command_name: str = "gemini_multi_image_draw"
     command_description: str = "多图生图：根据至少2张图片和提示词生成图片"
     command_pattern: str = r".*/多图.*"
-
-    async def get_prompt(self) -> Optional[str]:
-        # 移除 CQ 码以获取纯文本
-        cleaned_message = re.sub(r'\[CQ:.*?\]', '', self.message.raw_message).strip()
-        command_pattern = "/多图"
-        command_pos = cleaned_message.find(command_pattern)
-        
-        if command_pos == -1:
-            await self.send_text("❌ 未找到 /多图 指令。")
-            return None
-            
-        prompt_text = cleaned_message[command_pos + len(command_pattern):].strip()
-        
-        if not prompt_text:
-            await self.send_text("❌ 请输入提示词！\n例如：`/多图 融合这两张图`")
-            return None
-            
-        return prompt_text
+    _EMPTY_HINT = _ERR_EMPTY_MULTI
 
 
 class RandomPromptDrawCommand(BaseDrawCommand):
@@ -138,20 +196,27 @@ class RandomPromptDrawCommand(BaseDrawCommand):
         self.selected_prompt_content = None
 
     async def execute(self) -> Tuple[bool, Optional[str], bool]:
-        prompts = data_manager.get_effective_prompts(
-            include_banana=self.get_config("behavior.enable_banana_prompts", True),
-            show_restricted=self.get_config("behavior.show_restricted", False),
-        )
+        if self.get_config("behavior.enable_banana_prompts", True):
+            prompts = get_data_manager().get_effective_prompts(
+                include_banana=True,
+                show_restricted=self.get_config("behavior.show_restricted", False),
+            )
+            prompt_names = tuple(prompts)
+        else:
+            # 仅本地词库时直接使用 data_manager 缓存的名称元组，无需构建合并视图
+            prompts = get_data_manager().get_prompts()
+            prompt_names = get_data_manager().get_prompt_keys()
         
-        if not prompts:
-            await self.send_text("❌ 当前没有任何预设提示词！\n请先使用 `/添加提示词` 添加。")
+        if not prompt_names:
+            await self.send_text(_ERR_NO_PRESET)
             return True, "无预设", True
         
-        # 随机选择一个提示词
-        self.selected_prompt_name = random.choice(list(prompts.keys()))
+        # 随机选择一个提示词（random 仅此处使用，按需导入）
+        from random import randrange
+        self.selected_prompt_name = prompt_names[randrange(len(prompt_names))]
         self.selected_prompt_content = prompts[self.selected_prompt_name]
         
-        logger.info(f"[Random] 随机选中提示词: {self.selected_prompt_name}")
+        logger.info("[Random] 随机选中提示词: %s", self.selected_prompt_name)
         
         return await super().execute()
 
@@ -165,53 +230,19 @@ class RandomPromptDrawCommand(BaseDrawCommand):
         return None
 
 
-class VideoGenerateCommand(BaseVideoCommand):
+class VideoGenerateCommand(TriggerPromptMixin, BaseVideoCommand):
     """图生视频命令 - 根据图片和提示词生成视频"""
     command_name: str = "gemini_video_generate"
     command_description: str = "图生视频：根据图片和描述生成视频"
     command_pattern: str = r".*/图生视频.*"
+    _EMPTY_HINT = _ERR_EMPTY_IMAGE_VIDEO
     requires_image: bool = True  # 需要图片输入
 
-    async def get_prompt(self) -> Optional[str]:
-        # 移除 CQ 码以获取纯文本
-        cleaned_message = re.sub(r'\[CQ:.*?\]', '', self.message.raw_message).strip()
-        command_pattern = "/图生视频"
-        command_pos = cleaned_message.find(command_pattern)
-        
-        if command_pos == -1:
-            await self.send_text("❌ 未找到 /图生视频 指令。")
-            return None
-            
-        prompt_text = cleaned_message[command_pos + len(command_pattern):].strip()
-        
-        if not prompt_text:
-            await self.send_text("❌ 请输入视频描述！\n例如：`/图生视频 让画面动起来`")
-            return None
-            
-        return prompt_text
-
 
-class TextToVideoCommand(BaseVideoCommand):
+class TextToVideoCommand(TriggerPromptMixin, BaseVideoCommand):
     """文生视频命令 - 根据文字描述生成视频"""
     command_name: str = "gemini_text_to_video"
     command_description: str = "文生视频：根据文字描述生成视频"
     command_pattern: str = r".*/文生视频.*"
+    _EMPTY_HINT = _ERR_EMPTY_TEXT_VIDEO
     requires_image: bool = False  # 不需要图片输入
-
-    async def get_prompt(self) -> Optional[str]:
-        # 移除 CQ 码以获取纯文本
-        cleaned_message = re.sub(r'\[CQ:.*?\]', '', self.message.raw_message).strip()
-        command_pattern = "/文生视频"
-        command_pos = cleaned_message.find(command_pattern)
-        
-        if command_pos == -1:
-            await self.send_text("❌ 未找到 /文生视频 指令。")
-            return None
-            
-        prompt_text = cleaned_message[command_pos + len(command_pattern):].strip()
-        
-        if not prompt_text:
-            await self.send_text("❌ 请输入视频描述！\n例如：`/文生视频 一只可爱的小猫在草地上打滚`")
-            return None
-            
-        return prompt_text
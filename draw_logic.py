@@ -1,17 +1,23 @@
 
 import asyncio
-import base64
 import json
+import logging
+import random
 import time
-from datetime import datetime
-from typing import Tuple, Optional, List, Dict, Any
+from collections import OrderedDict
+from typing import Tuple, Optional, List, Dict, Any, Callable, Awaitable, Iterable
 from urllib.parse import urlparse
 
 import httpx
 import re
 
-from .utils import extract_all_image_data, safe_json_dumps, download_image, extract_text_failure_reason
-from .managers import key_manager, data_manager
+from .utils import (
+    extract_all_image_data, safe_json_dumps, download_image, extract_text_failure_reason,
+    shared_http_client, iter_sse_data, dumps_json_bytes, loads_json, splice_json_object,
+    error_body_text, read_error_body, b64encode_async, make_data_url,
+    decode_base64_image, b64decode_bytes, log_enabled
+)
+from .managers import get_key_manager, get_data_manager
 
 try:
     from src.common.database.database_model import Images, Messages
@@ -19,6 +25,83 @@ except ImportError:
     Images = None
     Messages = None
 
+# 预编译的 @提及 解析正则：@<昵称:用户ID> 与 @QQ号
+# QQ 号只由 ASCII 数字组成，使用 re.ASCII 让 \d/\b 只按 ASCII 判断（中文紧跟 QQ 号时也能匹配）
+_AT_MENTION_RE = re.compile(r'@<[^:>]+:([^:>]+)>', re.ASCII)
+_AT_QQ_RE = re.compile(r'@(\d{5,11})\b', re.ASCII)
+
+
+def _find_at_user_id(text: str) -> Optional[str]:
+    """返回文本中第一个 @ 提及的用户 ID；不含 '@' 的文本直接跳过正则匹配"""
+    if '@' not in text:
+        return None
+    m = _AT_MENTION_RE.search(text) or _AT_QQ_RE.search(text)
+    return m.group(1) if m else None
+
+# getattr 的哨兵默认值：区分"属性不存在"与"属性值为 None"，代替 hasattr 探测
+_MISSING = object()
+
+
+def normalize_segments(segments: Any) -> List[Any]:
+    """将 消息段 / 消息段列表 / seglist 包装 统一展开为消息段列表"""
+    if not segments:
+        return []
+    if getattr(segments, 'type', None) == 'seglist':
+        segments = segments.data
+    if not isinstance(segments, list):
+        return [segments]
+    return segments
+
+# QQ 头像 LRU 缓存：user_id -> (写入时间, 图片字节)，同一用户并发请求只下载一次
+# 超过 _AVATAR_MAX_BYTES 的头像不进缓存，避免少数大图占满内存
+_AVATAR_TTL = 3600.0
+_AVATAR_CACHE_MAX = 1024
+_AVATAR_MAX_BYTES = 2 * 1024 * 1024
+_AVATAR_CACHE: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+# 正在下载的头像：user_id -> 下载任务，任务结束时由回调移除
+_AVATAR_INFLIGHT: Dict[str, "asyncio.Task[Optional[bytes]]"] = {}
+
+async def _download_avatar(user_id: str, proxy: Optional[str]) -> Optional[bytes]:
+    avatar = await download_image(f"https://q1.qlogo.cn/g?b=qq&nk={user_id}&s=640", proxy)
+    # 下载失败（None）不缓存，下次调用重新请求
+    if avatar and len(avatar) <= _AVATAR_MAX_BYTES:
+        _AVATAR_CACHE[user_id] = (time.monotonic(), avatar)
+        _AVATAR_CACHE.move_to_end(user_id)
+        while len(_AVATAR_CACHE) > _AVATAR_CACHE_MAX:
+            _AVATAR_CACHE.popitem(last=False)
+    return avatar
+
+async def fetch_avatar(user_id: Any, proxy: Optional[str] = None) -> Optional[bytes]:
+    """下载 QQ 头像，结果缓存 1 小时；同一用户的并发请求共享一次下载"""
+    user_id = str(user_id)
+    cached = _AVATAR_CACHE.get(user_id)
+    if cached and time.monotonic() - cached[0] < _AVATAR_TTL:
+        _AVATAR_CACHE.move_to_end(user_id)
+        return cached[1]
+
+    task = _AVATAR_INFLIGHT.get(user_id)
+    if task is None:
+        task = asyncio.create_task(_download_avatar(user_id, proxy))
+        _AVATAR_INFLIGHT[user_id] = task
+        task.add_done_callback(lambda _task: _AVATAR_INFLIGHT.pop(user_id, None))
+    # shield：某个调用方被取消时不取消其他调用方共享的下载
+    return await asyncio.shield(task)
+
+# 批量下载头像时的最大并发数
+_AVATAR_FETCH_CONCURRENCY = 8
+
+async def fetch_avatars(user_ids: Iterable[Any], proxy: Optional[str] = None) -> Dict[str, bytes]:
+    """并发下载多个用户的头像（共享连接池，最多 8 个并发），返回 user_id -> 图片字节，下载失败的用户不出现在结果中"""
+    unique_ids = list(dict.fromkeys(str(uid) for uid in user_ids))
+    semaphore = asyncio.Semaphore(_AVATAR_FETCH_CONCURRENCY)
+
+    async def _fetch_one(user_id: str) -> Optional[bytes]:
+        async with semaphore:
+            return await fetch_avatar(user_id, proxy)
+
+    results = await asyncio.gather(*(_fetch_one(uid) for uid in unique_ids))
+    return {uid: avatar for uid, avatar in zip(unique_ids, results) if avatar}
+
 async def extract_source_image(
     message,
     proxy: Optional[str] = None,
@@ -41,13 +124,7 @@ async def extract_source_image(
     
     # 1. 尝试从消息段中提取
     async def _extract_image_from_segments(segments) -> Optional[bytes]:
-        if not segments:
-            return None
-        if hasattr(segments, 'type') and segments.type == 'seglist':
-            segments = segments.data
-        if not isinstance(segments, list):
-            segments = [segments]
-        for seg in segments:
+        for seg in normalize_segments(segments):
             if isinstance(seg, dict):
                 seg_type = seg.get('type')
                 seg_data = seg.get('data')
@@ -59,9 +136,11 @@ async def extract_source_image(
 
             if seg_type == 'image' or seg_type == 'emoji':
                 if isinstance(binary_data_base64, str) and len(binary_data_base64) > 200:
+                    # binary_data_base64 始终是图片数据，直接解码，不做文件头检查（BMP 等格式也应接受）
                     try:
+                        image_bytes = b64decode_bytes(binary_data_base64)
                         if logger: logger.info(f"在消息段中找到Base64图片 (类型: {seg_type})。")
-                        return base64.b64decode(binary_data_base64)
+                        return image_bytes
                     except Exception:
                         if logger: logger.warning(f"无法将类型为 '{seg_type}' 的二进制段解码为图片，已跳过。")
                         continue
@@ -73,12 +152,12 @@ async def extract_source_image(
                     if logger: logger.warning(f"消息段URL图片下载失败，继续尝试后续片段 (类型: {seg_type})。")
                     continue
                 elif isinstance(seg_data, str) and len(seg_data) > 200:
-                    try:
+                    image_bytes = decode_base64_image(seg_data)
+                    if image_bytes:
                         if logger: logger.info(f"在消息段中找到Base64图片 (类型: {seg_type})。")
-                        return base64.b64decode(seg_data)
-                    except Exception:
-                        if logger: logger.warning(f"无法将类型为 '{seg_type}' 的段解码为图片，已跳过。")
-                        continue
+                        return image_bytes
+                    if logger: logger.warning(f"无法将类型为 '{seg_type}' 的段解码为图片，已跳过。")
+                    continue
         return None
 
     async def _fetch_message_via_capability(message_id: Any) -> Optional[dict]:
@@ -156,15 +235,16 @@ async def extract_source_image(
     # 2. 尝试从回复的消息中提取
     async def _extract_from_reply() -> Optional[bytes]:
         # 情况 A: 递归检查 reply (因为 message.reply 可能本身是 CompatMessage 但不含图)
-        if hasattr(message, 'reply') and message.reply:
-            if hasattr(message.reply, 'message_segment'):
-                img = await extract_source_image(message.reply, proxy, logger, ctx)
+        reply = getattr(message, 'reply', None)
+        if reply:
+            if getattr(reply, 'message_segment', _MISSING) is not _MISSING:
+                img = await extract_source_image(reply, proxy, logger, ctx)
                 if img: return img
         
         # 情况 B: 官方 message capability 查询历史回复消息
         reply_to_id = getattr(message, 'reply_to', None)
-        if not reply_to_id and hasattr(message, 'reply') and message.reply:
-            reply_to_id = getattr(message.reply, 'message_id', None)
+        if not reply_to_id and reply:
+            reply_to_id = getattr(reply, 'message_id', None)
 
         if reply_to_id:
             try:
@@ -190,8 +270,9 @@ async def extract_source_image(
     # 3. 尝试从当前消息中提取
     async def _extract_from_current() -> Optional[bytes]:
         # 情况 A: MaiMessages 对象 (Runtime) - 有 message_segment
-        if hasattr(message, 'message_segment'):
-            return await _extract_image_from_segments(message.message_segment)
+        segments = getattr(message, 'message_segment', _MISSING)
+        if segments is not _MISSING:
+            return await _extract_image_from_segments(segments)
         
         # 情况 B: 当前消息如果也是一个 MaiMessage 或 DatabaseMessages
         if Messages:
@@ -209,21 +290,17 @@ async def extract_source_image(
     # 4. 尝试从 @的用户头像提取
     async def _extract_from_at_user() -> Optional[bytes]:
         async def _download_avatar(user_id: str) -> Optional[bytes]:
-             avatar_url = f"https://q1.qlogo.cn/g?b=qq&nk={user_id}&s=640"
              if logger: logger.info(f"使用 @用户 {user_id} 的头像。")
-             return await download_image(avatar_url, proxy)
+             return await fetch_avatar(user_id, proxy)
 
         # 情况 A: MaiMessages
-        if hasattr(message, 'message_segment'):
-            segments = message.message_segment
-            if hasattr(segments, 'type') and segments.type == 'seglist':
-                segments = segments.data
-            if not isinstance(segments, list):
-                segments = [segments]
+        segments = getattr(message, 'message_segment', _MISSING)
+        if segments is not _MISSING:
+            segments = normalize_segments(segments)
             
-            if logger:
+            if logger and log_enabled(logger, logging.DEBUG):
                 segment_preview = [
-                    ({'type': s.type, 'data': s.data} if hasattr(s, 'type') else str(s))
+                    ({'type': s.type, 'data': s.data} if getattr(s, 'type', _MISSING) is not _MISSING else str(s))
                     for s in segments
                 ]
                 try:
@@ -232,32 +309,28 @@ async def extract_source_image(
                     logger.debug(f"[调试] 提取@，当前 segments: {str(segment_preview)[:500]}")
             
             for seg in segments:
+                seg_type = seg.type
+                seg_data = seg.data
                 # 检查 type='at'
-                if seg.type == 'at':
-                    if isinstance(seg.data, dict):
-                        qq = seg.data.get('qq') or seg.data.get('user_id') or seg.data.get('id') or seg.data.get('target_user_id')
+                if seg_type == 'at':
+                    if isinstance(seg_data, dict):
+                        qq = seg_data.get('qq') or seg_data.get('user_id') or seg_data.get('id') or seg_data.get('target_user_id')
                         if qq and str(qq) != 'all':
                             return await _download_avatar(str(qq))
-                    elif isinstance(seg.data, str) and str(seg.data) != 'all':
-                        return await _download_avatar(str(seg.data))
+                    elif isinstance(seg_data, str) and seg_data != 'all':
+                        return await _download_avatar(seg_data)
                 # 检查 type='text' 中的 @<nick:id> 和 @id
-                elif seg.type == 'text' and isinstance(seg.data, str):
-                    matches = re.findall(r'@<[^:>]+:([^:>]+)>', seg.data)
-                    for user_id in matches:
-                        return await _download_avatar(str(user_id))
-                    matches = re.findall(r'@(\d{5,11})\b', seg.data)
-                    for user_id in matches:
-                        return await _download_avatar(str(user_id))
+                elif seg_type == 'text' and isinstance(seg_data, str):
+                    at_user_id = _find_at_user_id(seg_data)
+                    if at_user_id:
+                        return await _download_avatar(at_user_id)
         
         # 情况 B: DatabaseMessages (检查文本中的 @<nick:id> 和 @id)
         text = getattr(message, 'processed_plain_text', '') or getattr(message, 'display_message', '') or ''
         if logger: logger.debug(f"[调试] 提取@，当前纯文本: {text[:500]}")
-        at_matches = re.findall(r'@<[^:>]+:([^:>]+)>', text)
-        for user_id in at_matches:
-             return await _download_avatar(str(user_id))
-        at_matches = re.findall(r'@(\d{5,11})\b', text)
-        for user_id in at_matches:
-             return await _download_avatar(str(user_id))
+        at_user_id = _find_at_user_id(text)
+        if at_user_id:
+            return await _download_avatar(at_user_id)
             
         return None
 
@@ -283,45 +356,125 @@ async def extract_source_image(
     
     return None
 
+def classify_endpoint(api_url: str, endpoint_type: str = "") -> str:
+    """
+    根据端点 URL 判断 API 类型，在构建端点列表时计算一次，请求循环中直接读取 endpoint["kind"]。
+
+    Returns:
+        'lmarena' / 'openai' / 'doubao' / 'gemini' / 'tsai' / 'unknown'
+    """
+    if endpoint_type == 'lmarena':
+        return 'lmarena'
+    if not api_url:
+        return 'unknown'
+    if "/chat/completions" in api_url:
+        return 'openai'
+    if "/images/generations" in api_url:
+        return 'doubao'
+    if "generateContent" in api_url:
+        return 'gemini'
+    lower_url = api_url.lower()
+    if endpoint_type.startswith("custom_tsart") or "tavr.top" in lower_url or "tsart.lat" in lower_url or "endpoint=image" in lower_url:
+        return 'tsai'
+    return 'unknown'
+
+
+# 端点列表缓存：{"draw"/"video": 端点列表}，渠道或 Key 数据变更（含外部修改文件后重新加载）时清空
+_ENDPOINT_CACHE: Dict[str, List[Dict[str, Any]]] = {}
+
+
+def invalidate_endpoint_cache() -> None:
+    """清空端点列表缓存；作为 data_manager / key_manager 的数据变更回调"""
+    _ENDPOINT_CACHE.clear()
+
+
+_endpoint_cache_watching = False
+
+
+def _watch_endpoint_sources() -> None:
+    """首次构建端点列表时注册缓存失效回调（管理器单例延迟创建，不在模块导入时注册）"""
+    global _endpoint_cache_watching
+    if not _endpoint_cache_watching:
+        get_data_manager().add_change_listener(invalidate_endpoint_cache)
+        get_key_manager().add_change_listener(invalidate_endpoint_cache)
+        _endpoint_cache_watching = True
+
+# 并行尝试端点时，前一个请求超过该秒数仍未返回才启动下一个（对冲请求）
+_HEDGE_DELAY = 8.0
+
+
+class _ParsedChannel:
+    """预解析的渠道配置，构建端点列表时只解析一次，之后用属性访问代替 dict.get 链"""
+
+    __slots__ = ("name", "url", "key", "model", "enabled", "stream", "legacy", "endpoint_type", "kind")
+
+    def __init__(self, name: str, channel_info: Any):
+        self.name = name
+        self.url = ""
+        self.key = ""
+        self.model = None
+        self.enabled = True
+        self.stream = False
+        # 旧版 "url:key" 字符串格式的渠道只使用自带的 Key，不关联 Key 管理器
+        self.legacy = not isinstance(channel_info, dict)
+
+        if isinstance(channel_info, dict):
+            self.url = channel_info.get("url")
+            self.key = channel_info.get("key")
+            self.model = channel_info.get("model")
+            self.enabled = channel_info.get("enabled", True)
+            self.stream = channel_info.get("stream", False)
+        elif isinstance(channel_info, str) and ":" in channel_info:
+            self.url, self.key = channel_info.rsplit(":", 1)
+
+        self.endpoint_type = f"custom_{name}"
+        self.kind = classify_endpoint(self.url, self.endpoint_type)
+
+    def endpoint(self, key: str) -> Dict[str, Any]:
+        return {
+            "type": self.endpoint_type,
+            "url": self.url,
+            "key": key,
+            "model": self.model,
+            "stream": self.stream,
+            "kind": self.kind,
+        }
+
+
+def _parse_usable_channels(channels: Dict[str, Any]) -> Dict[str, _ParsedChannel]:
+    """解析渠道配置，并预先过滤掉已禁用或缺少 URL 的渠道"""
+    parsed = {}
+    for name, channel_info in channels.items():
+        channel = _ParsedChannel(name, channel_info)
+        if channel.enabled and channel.url:
+            parsed[name] = channel
+    return parsed
+
+
 def build_drawing_endpoints() -> List[Dict[str, Any]]:
-    """从渠道配置和渠道 Key 中构建绘图端点列表。"""
+    """从渠道配置和渠道 Key 中构建绘图端点列表。
+
+    结果会被缓存，渠道或 Key 数据变更时通过 invalidate_endpoint_cache() 失效。
+    """
 
+    _watch_endpoint_sources()
+    image_channels = get_data_manager().get_image_channels()
+    all_keys = get_key_manager().get_all_keys()
+    cached = _ENDPOINT_CACHE.get("draw")
+    if cached is not None:
+        return list(cached)
+
+    # 视频渠道不在 image_channels 中，禁用或缺少 URL 的渠道在解析时已过滤
+    channels = _parse_usable_channels(image_channels)
     endpoints_to_try = []
-    custom_channels = data_manager.get_channels()
 
     # 1. 渠道内直接保存的 Key（兼容旧数据）
-    for name, channel_info in custom_channels.items():
-        c_url = ""
-        c_key = ""
-        c_model = None
-        c_enabled = True
-        c_is_video = False
-        
-        if isinstance(channel_info, dict):
-            c_url = channel_info.get("url")
-            c_key = channel_info.get("key")
-            c_model = channel_info.get("model")
-            c_enabled = channel_info.get("enabled", True)
-            c_is_video = channel_info.get("is_video", False)
-        elif isinstance(channel_info, str) and ":" in channel_info:
-            c_url, c_key = channel_info.rsplit(":", 1)
-        
-        # 跳过视频渠道
-        if c_is_video:
-            continue
-        
-        if c_url and c_key and c_enabled:
-            c_stream = channel_info.get("stream", False) if isinstance(channel_info, dict) else False
-            endpoints_to_try.append({
-                "type": f"custom_{name}",
-                "url": c_url,
-                "key": c_key,
-                "model": c_model,
-                "stream": c_stream
-            })
+    for channel in channels.values():
+        if channel.key:
+            endpoints_to_try.append(channel.endpoint(channel.key))
 
     # 2. Key 管理器中的渠道 Key
-    for key_info in key_manager.get_all_keys():
+    for key_info in all_keys:
         if key_info.get('status') != 'active':
             continue
         
@@ -329,34 +482,12 @@ def build_drawing_endpoints() -> List[Dict[str, Any]]:
         if not key_type:
             key_type = 'bailili' if key_info['value'].startswith('sk-') else 'google'
 
-        if key_type in custom_channels:
-            channel_info = custom_channels[key_type]
-            c_enabled = True
-            c_url = ""
-            c_model = None
-            c_is_video = False
-            
-            if isinstance(channel_info, dict):
-                c_url = channel_info.get("url")
-                c_model = channel_info.get("model")
-                c_enabled = channel_info.get("enabled", True)
-                c_is_video = channel_info.get("is_video", False)
-            
-            # 跳过视频渠道
-            if c_is_video:
-                continue
-            
-            if c_enabled and c_url:
-                c_stream = channel_info.get("stream", False)
-                endpoints_to_try.append({
-                    "type": f"custom_{key_type}",
-                    "url": c_url,
-                    "key": key_info['value'],
-                    "model": c_model,
-                    "stream": c_stream
-                })
+        channel = channels.get(key_type)
+        if channel is not None and not channel.legacy:
+            endpoints_to_try.append(channel.endpoint(key_info['value']))
     
-    return endpoints_to_try
+    _ENDPOINT_CACHE["draw"] = endpoints_to_try
+    return list(endpoints_to_try)
 
 
 async def get_drawing_endpoints(config_getter=None) -> List[Dict[str, Any]]:
@@ -369,6 +500,190 @@ async def get_drawing_endpoints(config_getter=None) -> List[Dict[str, Any]]:
     return build_drawing_endpoints()
 
 
+class _DrawRequest:
+    """
+    一次绘图请求内各端点共享的数据。
+    大体积字段（原图 data URL、转换后的 OpenAI 消息、原始 Gemini 请求体）在首个需要它的端点处
+    序列化为 JSON 字节一次，后续端点直接拼接复用。
+    """
+
+    def __init__(self, payload: Dict[str, Any], image_bytes: Optional[bytes], mime_type: Optional[str]):
+        self.payload = payload
+        self.image_bytes = image_bytes
+        self.mime_type = mime_type
+        self._image_data_url_json: Optional[bytes] = None
+        self._openai_messages_json: Optional[bytes] = None
+        self._payload_json: Optional[bytes] = None
+
+        # 提取用户文本 prompt (简单提取，用于日志或特定API)
+        self.user_text_prompt = ""
+        if "contents" in payload and payload["contents"]:
+            for p in payload["contents"][0].get("parts", []):
+                if "text" in p:
+                    self.user_text_prompt = p["text"]
+                    if self.user_text_prompt.startswith("Prompt: "):
+                        self.user_text_prompt = self.user_text_prompt[8:]
+                    break
+
+    @property
+    def has_image(self) -> bool:
+        return bool(self.image_bytes and self.mime_type)
+
+    def image_data_url_json(self) -> bytes:
+        if self._image_data_url_json is None:
+            self._image_data_url_json = dumps_json_bytes(make_data_url(self.mime_type, self.image_bytes))
+        return self._image_data_url_json
+
+    def openai_messages_json(self) -> bytes:
+        # 重新构建 OpenAI 格式的消息
+        # 简单起见，如果原 payload 是 Gemini 格式，我们尝试转换
+        # 这里假设 payload 就是 Gemini 格式的 {"contents": [{"parts": ...}]}
+        if self._openai_messages_json is None:
+            openai_content = []
+            
+            parts = self.payload.get("contents", [{}])[0].get("parts", [])
+            for part in parts:
+                if "text" in part:
+                    openai_content.append({"type": "text", "text": part["text"]})
+                elif "inline_data" in part:
+                    mime = part["inline_data"]["mime_type"]
+                    data = part["inline_data"]["data"]
+                    openai_content.append({
+                        "type": "image_url",
+                        "image_url": {"url": f"data:{mime};base64,{data}"}
+                    })
+
+            openai_messages = [
+                {
+                    "role": "user",
+                    "content": openai_content
+                }
+            ]
+            self._openai_messages_json = dumps_json_bytes(openai_messages)
+        return self._openai_messages_json
+
+    def payload_json(self) -> bytes:
+        if self._payload_json is None:
+            self._payload_json = dumps_json_bytes(self.payload)
+        return self._payload_json
+
+
+# 各类端点的请求构建函数：(请求上下文, 端点, 请求头, 日志) -> (请求 URL, 请求体字节)，按需补充认证请求头
+
+def _build_gemini_request(req: _DrawRequest, endpoint: Dict[str, Any], headers: Dict[str, str], logger) -> Tuple[str, bytes]:
+    return f"{endpoint['url']}?key={endpoint['key']}", req.payload_json()
+
+
+def _build_openai_request(req: _DrawRequest, endpoint: Dict[str, Any], headers: Dict[str, str], logger) -> Tuple[str, bytes]:
+    if endpoint["key"]:
+        headers["Authorization"] = f"Bearer {endpoint['key']}"
+
+    model_name = endpoint.get("model")
+    if not model_name:
+        model_name = "gemini-pro-vision"
+
+    openai_payload = {
+        "model": model_name,
+        "stream": endpoint.get("stream", False),
+    }
+    return endpoint["url"], splice_json_object(openai_payload, {"messages": req.openai_messages_json()})
+
+
+def _build_doubao_request(req: _DrawRequest, endpoint: Dict[str, Any], headers: Dict[str, str], logger) -> Tuple[str, bytes]:
+    # 火山豆包图片生成 API
+    headers["Authorization"] = f"Bearer {endpoint['key']}"
+    model_name = endpoint.get("model") or "doubao-seedream-4-5-251128"
+    
+    doubao_payload = {
+        "model": model_name,
+        "prompt": req.user_text_prompt,
+        "response_format": "url",
+        "size": "2k",
+        "stream": False,
+        "watermark": False
+    }
+    
+    if req.has_image:
+        logger.info(f"构建豆包图生图请求: model={model_name}...")
+        return endpoint["url"], splice_json_object(doubao_payload, {"image": req.image_data_url_json()})
+    logger.info(f"构建豆包文生图请求: model={model_name}...")
+    return endpoint["url"], dumps_json_bytes(doubao_payload)
+
+
+def _build_tsai_request(req: _DrawRequest, endpoint: Dict[str, Any], headers: Dict[str, str], logger) -> Tuple[str, bytes]:
+    headers["x-api-key"] = endpoint["key"]
+    base_url = endpoint["url"].split("?")[0]
+    tsai_payload = {
+        "prompt": req.user_text_prompt,
+        "workflow": endpoint.get("model") or "rr3",
+        "seed": -1
+    }
+    if req.has_image:
+        return f"{base_url}?endpoint=image_editing", splice_json_object(tsai_payload, {"image": req.image_data_url_json()})
+    return f"{base_url}?endpoint=image_generation", dumps_json_bytes(tsai_payload)
+
+
+_REQUEST_BUILDERS: Dict[str, Callable[..., Tuple[str, bytes]]] = {
+    'lmarena': _build_openai_request,
+    'openai': _build_openai_request,
+    'doubao': _build_doubao_request,
+    'gemini': _build_gemini_request,
+    'tsai': _build_tsai_request,
+}
+
+
+async def _race_endpoints(
+    endpoints: List[Dict[str, Any]],
+    attempt: Callable[[int, Dict[str, Any]], Awaitable[Optional[Any]]],
+    width: int = 1,
+    hedge_delay: float = _HEDGE_DELAY,
+) -> Optional[Any]:
+    """
+    按端点列表顺序调度 attempt(i, endpoint)，返回第一个非空结果，全部失败时返回 None。
+
+    width 为 1 时逐个尝试；大于 1 时采用对冲请求：正在进行的请求超过 hedge_delay 仍未返回时
+    再启动下一个端点（同时最多 width 个），每个失败的请求立即补上一个端点。
+    任一端点成功即取消其余请求；被取消的请求不计入 Key 的成功/失败统计。
+    """
+    pending = iter(enumerate(endpoints))
+    running: set = set()
+
+    def _launch_next() -> bool:
+        nxt = next(pending, None)
+        if nxt is None:
+            return False
+        running.add(asyncio.create_task(attempt(*nxt)))
+        return True
+
+    try:
+        exhausted = not _launch_next()
+        while running:
+            can_hedge = width > 1 and not exhausted and len(running) < width
+            done, _ = await asyncio.wait(
+                running,
+                timeout=hedge_delay if can_hedge else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                exhausted = not _launch_next()
+                continue
+            for task in done:
+                running.discard(task)
+                result = task.result()
+                if result:
+                    return result
+                # 每个失败的请求只补上一个端点，扩大并发只由对冲计时触发
+                if not exhausted:
+                    exhausted = not _launch_next()
+        return None
+    finally:
+        # 成功返回或调用方被取消时，取消仍在进行的请求
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+
+
 async def process_drawing_api_request(
     payload: Dict[str, Any],
     endpoints: List[Dict[str, Any]],
@@ -388,7 +703,7 @@ async def process_drawing_api_request(
         mime_type: 原图MIME类型
         proxy: 代理地址
         logger: 日志记录器
-        config_getter: 配置获取函数
+        config_getter: 配置获取函数（读取 behavior.parallel_attempts 控制同时尝试的端点数）
     
     Returns:
         (image_data_list, error_message)
@@ -396,39 +711,48 @@ async def process_drawing_api_request(
         error_message: 错误信息（如果全部失败）
     """
     last_error = ""
-    start_time = datetime.now()
+    start_time = time.perf_counter()
+    req = _DrawRequest(payload, image_bytes, mime_type)
+    user_text_prompt = req.user_text_prompt
+
+    try:
+        parallel_attempts = max(1, int(config_getter("behavior.parallel_attempts", 1))) if config_getter else 1
+    except (TypeError, ValueError):
+        parallel_attempts = 1
 
-    for i, endpoint in enumerate(endpoints):
+    async def _attempt(i: int, endpoint: Dict[str, Any]) -> Optional[List[str]]:
+        """尝试单个端点，成功返回图片数据，失败记录错误并返回 None"""
+        nonlocal last_error
         api_url = endpoint["url"]
         api_key = endpoint["key"]
         endpoint_type = endpoint["type"]
         
-        logger.info(f"尝试第 {i+1}/{len(endpoints)} 个端点: {endpoint_type} ({api_url})")
+        logger.info("尝试第 %d/%d 个端点: %s (%s)", i + 1, len(endpoints), endpoint_type, api_url)
 
         headers = {"Content-Type": "application/json"}
         request_url = api_url
 
         try:
-            current_payload = payload.copy()
             client_proxy = proxy 
             
-            is_openai = False
-            is_doubao = False
-            is_tsai = False
-            is_gpt_image = False
-            
             # 获取模型名称（用于判断特殊模型类型）
             endpoint_model = endpoint.get("model") or ""
             
-            # 判断 API 类型
-            if endpoint_type == 'lmarena':
-                is_openai = True
-                request_url = f"{api_url}" 
+            # 判断 API 类型（kind 在构建端点时已计算）
+            kind = endpoint.get("kind") or classify_endpoint(api_url, endpoint_type)
+            # gpt-image 系列模型按模型名单独处理，其余类型查表构建请求
+            is_gpt_image = kind != 'lmarena' and "gpt-image" in endpoint_model.lower()
+            is_tsai = kind == 'tsai' and not is_gpt_image
+            builder = _REQUEST_BUILDERS.get(kind)
+            if builder is None and not is_gpt_image:
+                logger.warning(f"无法识别的API地址格式: {api_url}，跳过。请检查配置。")
+                return None
+            if kind == 'lmarena':
                 client_proxy = None 
-            elif endpoint_model and "gpt-image" in endpoint_model.lower():
+
+            # 特定 API 格式转换
+            if is_gpt_image:
                 # gpt-image 系列模型只支持 /v1/images/generations 和 /v1/images/edits
-                is_gpt_image = True
-                is_openai = False
                 # 自动将 /v1/chat/completions 替换为正确的端点
                 base_api_url = api_url.replace("/v1/chat/completions", "").replace("/chat/completions", "").rstrip("/")
                 if image_bytes and mime_type:
@@ -436,38 +760,7 @@ async def process_drawing_api_request(
                 else:
                     request_url = f"{base_api_url}/v1/images/generations"
                 logger.info(f"检测到 gpt-image 模型，自动切换端点: {request_url}")
-            elif "/chat/completions" in api_url:
-                is_openai = True
-                request_url = api_url
-            elif "/images/generations" in api_url:
-                # 火山豆包图片生成 API
-                is_doubao = True
-                is_openai = False
-                request_url = api_url
-            elif "generateContent" in api_url:
-                is_openai = False
-                request_url = f"{api_url}?key={api_key}"
-            elif endpoint_type.startswith("custom_tsart") or "tavr.top" in api_url.lower() or "tsart.lat" in api_url.lower() or "endpoint=image" in api_url.lower():
-                is_tsai = True
-                is_openai = False
-                is_doubao = False
-                base_url = api_url.split("?")[0]
-            else:
-                logger.warning(f"无法识别的API地址格式: {api_url}，跳过。请检查配置。")
-                continue
 
-            # 提取用户文本 prompt (简单提取，用于日志或特定API)
-            user_text_prompt = ""
-            if "contents" in current_payload and current_payload["contents"]:
-                for p in current_payload["contents"][0].get("parts", []):
-                    if "text" in p:
-                        user_text_prompt = p["text"]
-                        if user_text_prompt.startswith("Prompt: "):
-                            user_text_prompt = user_text_prompt[8:]
-                        break
-            
-            # 特定 API 格式转换
-            if is_gpt_image:
                 # gpt-image-2 使用 /v1/images/generations 或 /v1/images/edits
                 headers["Authorization"] = f"Bearer {api_key}"
                 model_name = endpoint_model or "gpt-image-2"
@@ -496,18 +789,18 @@ async def process_drawing_api_request(
                     logger.info(f"构建 gpt-image 图生图请求 (edits): model={model_name}")
                     
                     # 直接发送 multipart 请求
-                    async with httpx.AsyncClient(proxy=client_proxy, timeout=180.0, follow_redirects=True) as client:
+                    async with shared_http_client(client_proxy, 180.0) as client:
                         response = await client.post(request_url, data=form_data, files=files, headers=headers)
                     
                     if response.status_code == 200:
-                        data = response.json()
+                        data = loads_json(response.content)
                         img_data = await extract_all_image_data(data)
                         if img_data:
                             if endpoint_type != 'lmarena':
-                                key_manager.record_key_usage(api_key, True)
-                            elapsed = (datetime.now() - start_time).total_seconds()
+                                get_key_manager().record_key_usage(api_key, True)
+                            elapsed = time.perf_counter() - start_time
                             logger.info(f"使用 {endpoint_type} (gpt-image edits) 端点成功生成图片，耗时 {elapsed:.2f}s")
-                            return img_data, ""
+                            return img_data
                         else:
                             if debug_mode:
                                 logger.warning(f"[调试模式] gpt-image edits 响应未提取到图片，原始响应:")
@@ -515,7 +808,7 @@ async def process_drawing_api_request(
                             reason = extract_text_failure_reason(data)
                             raise Exception(f"gpt-image edits API未返回图片, 原因: {reason or '响应中没有可提取的图片数据'}")
                     else:
-                        raise Exception(f"API请求失败, 状态码: {response.status_code} - {response.text}")
+                        raise Exception(f"API请求失败, 状态码: {response.status_code} - {error_body_text(response)}")
                 else:
                     # 文生图模式：使用 /v1/images/generations (JSON)
                     gpt_image_payload = {
@@ -523,95 +816,11 @@ async def process_drawing_api_request(
                         "prompt": user_text_prompt,
                         "size": "auto",
                     }
-                    current_payload = gpt_image_payload
+                    request_body = dumps_json_bytes(gpt_image_payload)
                     logger.info(f"构建 gpt-image 文生图请求 (generations): model={model_name}")
             
-            elif is_doubao:
-                headers["Authorization"] = f"Bearer {api_key}"
-                model_name = endpoint.get("model") or "doubao-seedream-4-5-251128"
-                
-                doubao_payload = {
-                    "model": model_name,
-                    "prompt": user_text_prompt,
-                    "response_format": "url",
-                    "size": "2k",
-                    "stream": False,
-                    "watermark": False
-                }
-                
-                if image_bytes and mime_type:
-                    # 获取 image parts 中的 base64
-                    # 尝试从 payload 中恢复原图 base64，或者使用传入的 bytes
-                    base64_img = base64.b64encode(image_bytes).decode('utf-8')
-                    image_data_url = f"data:{mime_type};base64,{base64_img}"
-                    doubao_payload["image"] = image_data_url
-                    logger.info(f"构建豆包图生图请求: model={model_name}...")
-                else:
-                    logger.info(f"构建豆包文生图请求: model={model_name}...")
-                
-                current_payload = doubao_payload
-            
-            elif is_tsai:
-                headers["x-api-key"] = api_key
-                if image_bytes and mime_type:
-                    request_url = f"{base_url}?endpoint=image_editing"
-                    workflow = endpoint.get("model") or "rr3"
-                    base64_img = base64.b64encode(image_bytes).decode('utf-8')
-                    tsai_payload = {
-                        "prompt": user_text_prompt,
-                        "workflow": workflow,
-                        "image": f"data:{mime_type};base64,{base64_img}",
-                        "seed": -1
-                    }
-                else:
-                    request_url = f"{base_url}?endpoint=image_generation"
-                    workflow = endpoint.get("model") or "rr3"
-                    tsai_payload = {
-                        "prompt": user_text_prompt,
-                        "workflow": workflow,
-                        "seed": -1
-                    }
-                current_payload = tsai_payload
-
-            elif is_openai:
-                if api_key:
-                    headers["Authorization"] = f"Bearer {api_key}"
-                
-                # 重新构建 OpenAI 格式的消息
-                # 简单起见，如果原 payload 是 Gemini 格式，我们尝试转换
-                # 这里假设 payload 就是 Gemini 格式的 {"contents": [{"parts": ...}]}
-                
-                openai_content = []
-                
-                parts = payload.get("contents", [{}])[0].get("parts", [])
-                for part in parts:
-                    if "text" in part:
-                        openai_content.append({"type": "text", "text": part["text"]})
-                    elif "inline_data" in part:
-                        mime = part["inline_data"]["mime_type"]
-                        data = part["inline_data"]["data"]
-                        openai_content.append({
-                            "type": "image_url",
-                            "image_url": {"url": f"data:{mime};base64,{data}"}
-                        })
-
-                openai_messages = [
-                    {
-                        "role": "user",
-                        "content": openai_content
-                    }
-                ]
-
-                model_name = endpoint.get("model")
-                if not model_name:
-                    model_name = "gemini-pro-vision"
-
-                openai_payload = {
-                    "model": model_name,
-                    "messages": openai_messages,
-                    "stream": endpoint.get("stream", False),
-                }
-                current_payload = openai_payload
+            else:
+                request_url, request_body = builder(req, endpoint, headers, logger)
 
             logger.info(f"准备向 {endpoint_type} 端点发送请求。")
             
@@ -620,46 +829,41 @@ async def process_drawing_api_request(
             use_stream = endpoint.get("stream", False)
             
             # gpt-image、豆包、TS-AI 图像接口不支持当前流式解析路径，强制关闭
-            if is_gpt_image or is_doubao or is_tsai:
+            if is_gpt_image or kind in ('doubao', 'tsai'):
                 use_stream = False
             
             if use_stream:
                 try:
                     debug_sse_lines = [] if debug_mode else None
                     accumulated_content = ""
-                    async with httpx.AsyncClient(proxy=client_proxy, timeout=180.0, follow_redirects=True) as client:
-                        async with client.stream("POST", request_url, json=current_payload, headers=headers) as response:
+                    async with shared_http_client(client_proxy, 180.0) as client:
+                        async with client.stream("POST", request_url, content=request_body, headers=headers) as response:
                             if response.status_code != 200:
-                                raw_body = await response.aread()
-                                raise Exception(f"API请求失败, 状态码: {response.status_code} - {raw_body.decode('utf-8', 'ignore')}")
+                                raise Exception(f"API请求失败, 状态码: {response.status_code} - {await read_error_body(response)}")
+
+                            async for sse_data in iter_sse_data(response, decode=False):
+                                if debug_sse_lines is not None:
+                                    debug_sse_lines.append(sse_data.decode('utf-8', 'replace'))
+
+                                # 只有正文 content 会被累积，不含该字段的事件（推理、元数据等）无需解析
+                                if b'"content"' not in sse_data:
+                                    continue
+
+                                try:
+                                    response_data = loads_json(sse_data)
+                                    # 只累积流式正文，避免在半截 base64 chunk 上误提取并截断。
+                                    if "choices" in response_data and response_data["choices"]:
+                                        choice = response_data["choices"][0]
+                                        delta = choice.get("delta", {})
+                                        chunk_content = delta.get("content", "")
+                                        message = choice.get("message", {})
+                                        if not chunk_content and isinstance(message, dict):
+                                            chunk_content = message.get("content", "")
+                                        if chunk_content:
+                                            accumulated_content += chunk_content
+                                except json.JSONDecodeError:
+                                    pass
 
-                            async for line in response.aiter_lines():
-                                line = line.strip()
-                                if not line: continue
-                                if line.startswith(':'): continue
-                                
-                                if line.startswith('data:'):
-                                    data_str = line[5:].strip()
-                                    if data_str == "DONE" or data_str == "[DONE]": break
-                                    
-                                    if debug_sse_lines is not None:
-                                        debug_sse_lines.append(data_str)
-                                    
-                                    try:
-                                        response_data = json.loads(data_str)
-                                        # 只累积流式正文，避免在半截 base64 chunk 上误提取并截断。
-                                        if "choices" in response_data and response_data["choices"]:
-                                            choice = response_data["choices"][0]
-                                            delta = choice.get("delta", {})
-                                            chunk_content = delta.get("content", "")
-                                            message = choice.get("message", {})
-                                            if not chunk_content and isinstance(message, dict):
-                                                chunk_content = message.get("content", "")
-                                            if chunk_content:
-                                                accumulated_content += chunk_content
-                                    except json.JSONDecodeError:
-                                        pass
-                    
                     # 流结束后：尝试从累积内容中提取
                     if not img_data and accumulated_content:
                         logger.info(f"[图片] SSE流结束，尝试从累积内容中提取图片 (长度: {len(accumulated_content)})")
@@ -687,24 +891,24 @@ async def process_drawing_api_request(
             else:
                 try:
                     if is_tsai:
-                        async with httpx.AsyncClient(proxy=client_proxy, timeout=60.0, follow_redirects=True) as client:
-                            response = await client.post(request_url, json=current_payload, headers=headers)
+                        async with shared_http_client(client_proxy, 60.0) as client:
+                            response = await client.post(request_url, content=request_body, headers=headers)
                             if response.status_code != 200:
-                                raise Exception(f"创建任务失败: {response.status_code} - {response.text}")
+                                raise Exception(f"创建任务失败: {response.status_code} - {error_body_text(response)}")
                             
-                            resp_json = response.json()
+                            resp_json = loads_json(response.content)
                             task_id = resp_json.get("data", {}).get("id")
                             if not task_id:
                                 raise Exception(f"未能获取TS-AI任务ID: {resp_json}")
                                 
-                            poll_url = f"{base_url}?endpoint=task_status&task_id={task_id}"
+                            poll_url = f"{api_url.split('?')[0]}?endpoint=task_status&task_id={task_id}"
                             for _ in range(60):
                                 await asyncio.sleep(3)
                                 poll_resp = await client.get(poll_url, headers=headers)
                                 if poll_resp.status_code != 200:
                                     continue
                                     
-                                poll_data = poll_resp.json()
+                                poll_data = loads_json(poll_resp.content)
                                 status = poll_data.get("data", {}).get("status")
                                 if status == "completed":
                                     image_url = poll_data["data"]["result"]["image_url"]
@@ -716,15 +920,15 @@ async def process_drawing_api_request(
                             else:
                                 raise Exception("TS-AI任务轮询超时")
                     else:
-                        async with httpx.AsyncClient(proxy=client_proxy, timeout=120.0, follow_redirects=True) as client:
-                            response = await client.post(request_url, json=current_payload, headers=headers)
+                        async with shared_http_client(client_proxy, 120.0) as client:
+                            response = await client.post(request_url, content=request_body, headers=headers)
                 except httpx.RequestError as e:
                     logger.error(f"httpx.RequestError: {type(e).__name__}: {e!r}")
                     raise
 
                 if not is_tsai:
                     if response.status_code == 200:
-                        data = response.json()
+                        data = loads_json(response.content)
                         img_data = await extract_all_image_data(data)
                         if not img_data:
                             if debug_mode:
@@ -735,16 +939,16 @@ async def process_drawing_api_request(
                             reason = extract_text_failure_reason(data)
                             raise Exception(f"API未返回图片, 原因: {reason or '响应中没有可提取的图片数据'}")
                     else:
-                        error_text = response.text
+                        error_text = error_body_text(response)
                         raise Exception(f"API请求失败, 状态码: {response.status_code} - {error_text}")
 
             if img_data:
                 if endpoint_type != 'lmarena':
-                    key_manager.record_key_usage(api_key, True)
+                    get_key_manager().record_key_usage(api_key, True)
                 
-                elapsed = (datetime.now() - start_time).total_seconds()
+                elapsed = time.perf_counter() - start_time
                 logger.info(f"使用 {endpoint_type} 端点成功生成图片，耗时 {elapsed:.2f}s")
-                return img_data, ""
+                return img_data
 
             if not img_data:
                 if failure_reason:
@@ -755,10 +959,16 @@ async def process_drawing_api_request(
             logger.warning(f"端点 {endpoint_type} 尝试失败: {type(e).__name__}: {e}")
             if endpoint_type != 'lmarena':
                 is_quota_error = "429" in str(e)
-                key_manager.record_key_usage(api_key, False, force_disable=is_quota_error)
+                get_key_manager().record_key_usage(api_key, False, force_disable=is_quota_error)
             last_error = str(e)
-            await asyncio.sleep(1)
+            if parallel_attempts <= 1:
+                await asyncio.sleep(1)
+            return None
+
 
+    img_data = await _race_endpoints(endpoints, _attempt, parallel_attempts)
+    if img_data:
+        return img_data, ""
     return None, last_error
 
 
@@ -766,50 +976,50 @@ async def get_video_endpoints(config_getter, logger=None) -> List[Dict[str, Any]
     """
     获取视频生成端点列表（只返回 is_video=True 的渠道）
     """
+    _watch_endpoint_sources()
+    video_channels = get_data_manager().get_video_channels()
+    keys_by_type = get_key_manager().get_active_keys_by_type()
+    cached = _ENDPOINT_CACHE.get("video")
+    if cached is not None:
+        return list(cached)
+
     endpoints_to_try = []
-    custom_channels = data_manager.get_channels()
     
-    for name, channel_info in custom_channels.items():
-        if not isinstance(channel_info, dict):
-            continue
-        if not channel_info.get("is_video", False):
-            continue
+    for name, channel in _parse_usable_channels(video_channels).items():
+        if channel.key:
+            endpoints_to_try.append(channel.endpoint(channel.key))
         
-        c_url = channel_info.get("url")
-        c_enabled = channel_info.get("enabled", True)
-        c_model = channel_info.get("model")
-        c_key = channel_info.get("key")
-        
-        if c_url and c_enabled:
-            if c_key:
-                endpoints_to_try.append({
-                    "type": f"custom_{name}",
-                    "url": c_url,
-                    "key": c_key,
-                    "model": c_model,
-                    "stream": channel_info.get("stream", False)
-                })
-            
-            # 检查 key_manager 中的 keys
-            key_manager_keys_count = 0
-            for key_info in key_manager.get_all_keys():
-                if key_info.get('status') != 'active':
-                    continue
-                if key_info.get('type') == name:
-                    key_manager_keys_count += 1
-                    endpoints_to_try.append({
-                        "type": f"custom_{name}",
-                        "url": c_url,
-                        "key": key_info['value'],
-                        "model": c_model,
-                        "stream": channel_info.get("stream", False)
-                    })
-                    
-            if not c_key and key_manager_keys_count == 0:
-                if logger:
-                    logger.warning(f"[视频] 渠道 '{name}' 已启用但未找到有效Key (检查了 key_manager 和 data.json)")
+        # 检查 key_manager 中的 keys
+        channel_keys = keys_by_type.get(name, ())
+        for key_info in channel_keys:
+            endpoints_to_try.append(channel.endpoint(key_info['value']))
+                
+        if not channel.key and not channel_keys:
+            if logger:
+                logger.warning(f"[视频] 渠道 '{name}' 已启用但未找到有效Key (检查了 key_manager 和 data.json)")
     
-    return endpoints_to_try
+    _ENDPOINT_CACHE["video"] = endpoints_to_try
+    return list(endpoints_to_try)
+
+
+async def _poll_with_backoff(
+    max_total: float = 600.0,
+    initial: float = 1.0,
+    factor: float = 1.5,
+    max_interval: float = 15.0,
+):
+    """
+    异步任务轮询间隔生成器：每次等待后产出一次，等待时间按指数退避增长（带 ±20% 抖动），
+    累计等待超过 max_total 后结束，调用方可用 `async for ... else` 处理超时。
+    """
+    interval = initial
+    waited = 0.0
+    while waited < max_total:
+        delay = min(interval * random.uniform(0.8, 1.2), max_total - waited)
+        await asyncio.sleep(delay)
+        waited += delay
+        yield
+        interval = min(interval * factor, max_interval)
 
 
 async def process_video_generation(
@@ -842,7 +1052,7 @@ async def process_video_generation(
         api_key = endpoint["key"]
         endpoint_type = endpoint["type"]
         
-        logger.info(f"[视频] 尝试端点: {endpoint_type}")
+        logger.info("[视频] 尝试端点: %s", endpoint_type)
         
         headers = {
             "Content-Type": "application/json",
@@ -867,12 +1077,12 @@ async def process_video_generation(
                     "resolution": "1080p"
                 }
                 
-                async with httpx.AsyncClient(proxy=proxy, timeout=60.0, follow_redirects=True) as client:
-                    response = await client.post(api_url, json=doubao_payload, headers=headers)
+                async with shared_http_client(proxy, 60.0) as client:
+                    response = await client.post(api_url, content=dumps_json_bytes(doubao_payload), headers=headers)
                     if response.status_code != 200:
-                        raise Exception(f"创建任务失败: {response.status_code} - {response.text}")
+                        raise Exception(f"创建任务失败: {response.status_code} - {error_body_text(response)}")
                     
-                    task_id = response.json().get("id")
+                    task_id = loads_json(response.content).get("id")
                     if not task_id:
                         raise Exception("未获取到任务ID")
                     
@@ -880,13 +1090,12 @@ async def process_video_generation(
                     
                     # 轮询任务状态
                     poll_url = f"{api_url}/{task_id}"
-                    for poll_count in range(120):  # 最多10分钟
-                        await asyncio.sleep(5)
+                    async for _ in _poll_with_backoff():  # 最多10分钟
                         poll_resp = await client.get(poll_url, headers=headers)
                         if poll_resp.status_code != 200:
                             continue
                         
-                        poll_data = poll_resp.json()
+                        poll_data = loads_json(poll_resp.content)
                         status = poll_data.get("status")
                         
                         if status == "succeeded":
@@ -900,7 +1109,7 @@ async def process_video_generation(
                             if video_url:
                                 video_resp = await client.get(video_url)
                                 if video_resp.status_code == 200:
-                                    video_data = base64.b64encode(video_resp.content).decode('utf-8')
+                                    video_data = await b64encode_async(video_resp.content)
                                     logger.info(f"[视频] 豆包视频下载完成")
                             break
                         elif status == "failed":
@@ -934,39 +1143,31 @@ async def process_video_generation(
 
                 use_stream = endpoint.get("stream", False)
                 
-                async with httpx.AsyncClient(proxy=proxy, timeout=300.0, follow_redirects=True) as client:
+                async with shared_http_client(proxy, 300.0) as client:
                     if use_stream:
                         # 流式模式：累积所有 content，流结束后统一提取
                         accumulated_content = ""
-                        async with client.stream("POST", api_url, json=openai_payload, headers=headers) as response:
+                        async with client.stream("POST", api_url, content=dumps_json_bytes(openai_payload), headers=headers) as response:
                             if response.status_code != 200:
-                                raw_body = await response.aread()
-                                error_msg = raw_body.decode('utf-8', 'ignore')
+                                error_msg = await read_error_body(response)
                                 raise Exception(f"API请求失败: {response.status_code} - {error_msg}")
                             
-                            async for line in response.aiter_lines():
-                                line = line.strip()
-                                if not line or line.startswith(':'):
-                                    continue
-                                if line.startswith('data:'):
-                                    data_str = line[5:].strip()
-                                    if data_str in ["DONE", "[DONE]"]:
-                                        break
-                                    try:
-                                        response_data = json.loads(data_str)
-                                        # 只累积流式正文，避免在半截 base64 chunk 上误提取并截断。
-                                        if "choices" in response_data and response_data["choices"]:
-                                            choice = response_data["choices"][0]
-                                            delta = choice.get("delta", {})
-                                            chunk_content = delta.get("content", "")
-                                            message = choice.get("message", {})
-                                            if not chunk_content and isinstance(message, dict):
-                                                chunk_content = message.get("content", "")
-                                            if chunk_content:
-                                                accumulated_content += chunk_content
-                                    except json.JSONDecodeError:
-                                        pass
-                        
+                            async for sse_data in iter_sse_data(response, decode=False):
+                                try:
+                                    response_data = loads_json(sse_data)
+                                    # 只累积流式正文，避免在半截 base64 chunk 上误提取并截断。
+                                    if "choices" in response_data and response_data["choices"]:
+                                        choice = response_data["choices"][0]
+                                        delta = choice.get("delta", {})
+                                        chunk_content = delta.get("content", "")
+                                        message = choice.get("message", {})
+                                        if not chunk_content and isinstance(message, dict):
+                                            chunk_content = message.get("content", "")
+                                        if chunk_content:
+                                            accumulated_content += chunk_content
+                                except json.JSONDecodeError:
+                                    pass
+
                         # 流结束后：如果还没拿到 video_data，尝试从累积内容中提取
                         if not video_data and accumulated_content:
                             logger.info(f"[视频] 流式响应累积内容长度: {len(accumulated_content)}")
@@ -982,15 +1183,15 @@ async def process_video_generation(
                             }
                             video_data = await extract_video_data(pseudo_response)
                     else:
-                        response = await client.post(api_url, json=openai_payload, headers=headers)
+                        response = await client.post(api_url, content=dumps_json_bytes(openai_payload), headers=headers)
                         if response.status_code == 200:
-                            data = response.json()
+                            data = loads_json(response.content)
                             video_data = await extract_video_data(data)
                             if not video_data and debug_mode:
                                 logger.warning(f"[调试模式] 视频非流式响应未提取到数据，原始响应:")
                                 logger.warning(f"[调试模式] {json.dumps(data, ensure_ascii=False)[:2000]}")
                         else:
-                            raise Exception(f"API请求失败: {response.status_code} - {response.text}")
+                            raise Exception(f"API请求失败: {response.status_code} - {error_body_text(response)}")
             
             # TS-AI 视频生成
             elif "api.tavr.top" in api_url or "api.tsart.lat" in api_url or "tsart.lat" in api_url or "endpoint=video_generation" in api_url:
@@ -1011,25 +1212,24 @@ async def process_video_generation(
                     tsai_video_payload["width"] = 832
                     tsai_video_payload["height"] = 480
                     
-                async with httpx.AsyncClient(proxy=proxy, timeout=60.0, follow_redirects=True) as client:
-                    response = await client.post(request_url, json=tsai_video_payload, headers=headers)
+                async with shared_http_client(proxy, 60.0) as client:
+                    response = await client.post(request_url, content=dumps_json_bytes(tsai_video_payload), headers=headers)
                     if response.status_code != 200:
-                        raise Exception(f"创建TS-AI视频任务失败: {response.status_code} - {response.text}")
+                        raise Exception(f"创建TS-AI视频任务失败: {response.status_code} - {error_body_text(response)}")
                     
-                    task_id = response.json().get("data", {}).get("id")
+                    task_id = loads_json(response.content).get("data", {}).get("id")
                     if not task_id:
-                        raise Exception(f"未获取到TS-AI视频任务ID: {response.text}")
+                        raise Exception(f"未获取到TS-AI视频任务ID: {error_body_text(response)}")
                         
                     logger.info(f"[视频] TS-AI任务已创建: {task_id}")
                     
                     poll_url = f"{base_url}?endpoint=task_status&task_id={task_id}"
-                    for _ in range(120): # 最多10分钟
-                        await asyncio.sleep(5)
+                    async for _ in _poll_with_backoff():  # 最多10分钟
                         poll_resp = await client.get(poll_url, headers=headers)
                         if poll_resp.status_code != 200:
                             continue
                             
-                        poll_data = poll_resp.json()
+                        poll_data = loads_json(poll_resp.content)
                         status = poll_data.get("data", {}).get("status")
                         if status == "completed":
                             result_data = poll_data.get("data", {}).get("result", {})
@@ -1052,13 +1252,13 @@ async def process_video_generation(
                 gemini_payload = {"contents": [{"parts": parts}]}
                 request_url = f"{api_url}?key={api_key}"
                 
-                async with httpx.AsyncClient(proxy=proxy, timeout=300.0, follow_redirects=True) as client:
-                    response = await client.post(request_url, json=gemini_payload, headers={"Content-Type": "application/json"})
+                async with shared_http_client(proxy, 300.0) as client:
+                    response = await client.post(request_url, content=dumps_json_bytes(gemini_payload), headers={"Content-Type": "application/json"})
                     if response.status_code == 200:
-                        data = response.json()
+                        data = loads_json(response.content)
                         video_data = await extract_video_data(data)
                     else:
-                        raise Exception(f"API请求失败: {response.status_code} - {response.text}")
+                        raise Exception(f"API请求失败: {response.status_code} - {error_body_text(response)}")
             
             # 如果提取到的是 URL，需要下载视频并转为 base64
             if video_data and video_data.startswith("url:"):
@@ -1075,10 +1275,10 @@ async def process_video_generation(
                 if api_key and api_host and video_host and api_host == video_host:
                     dl_headers["Authorization"] = f"Bearer {api_key}"
                 try:
-                    async with httpx.AsyncClient(proxy=proxy, timeout=120.0, follow_redirects=True) as dl_client:
+                    async with shared_http_client(proxy, 120.0) as dl_client:
                         dl_response = await dl_client.get(video_url, headers=dl_headers)
                         if dl_response.status_code == 200 and dl_response.content:
-                            video_data = base64.b64encode(dl_response.content).decode('utf-8')
+                            video_data = await b64encode_async(dl_response.content)
                             logger.info(f"[视频] 视频下载完成，大小: {len(dl_response.content)} 字节")
                         else:
                             if "Authorization" in dl_headers:
@@ -1086,7 +1286,7 @@ async def process_video_generation(
                                 dl_headers.pop("Authorization", None)
                                 dl_response2 = await dl_client.get(video_url, headers=dl_headers)
                                 if dl_response2.status_code == 200 and dl_response2.content:
-                                    video_data = base64.b64encode(dl_response2.content).decode('utf-8')
+                                    video_data = await b64encode_async(dl_response2.content)
                                     logger.info(f"[视频] 视频下载完成（无认证头），大小: {len(dl_response2.content)} 字节")
                                 else:
                                     raise Exception(f"下载视频失败: HTTP {dl_response.status_code} / {dl_response2.status_code}")
@@ -1098,7 +1298,7 @@ async def process_video_generation(
                     last_error = f"视频URL获取成功但下载失败: {dl_err}"
             
             if video_data:
-                key_manager.record_key_usage(api_key, True)
+                get_key_manager().record_key_usage(api_key, True)
                 return video_data, ""
             else:
                 # API 调用成功但未提取到视频数据
@@ -1109,7 +1309,7 @@ async def process_video_generation(
         except Exception as e:
             logger.warning(f"[视频] 端点 {endpoint_type} 失败: {type(e).__name__}: {e}")
             is_quota_error = "429" in str(e)
-            key_manager.record_key_usage(api_key, False, force_disable=is_quota_error)
+            get_key_manager().record_key_usage(api_key, False, force_disable=is_quota_error)
             last_error = str(e)
             await asyncio.sleep(1)
     
@@ -1146,10 +1346,10 @@ async def send_video_via_napcat(
         return False, "无法确定发送目标"
     
     try:
-        async with httpx.AsyncClient(timeout=300.0) as client:
+        async with shared_http_client(None, 300.0) as client:
             response = await client.post(api_url, json=request_data)
             if response.status_code == 200:
-                result = response.json()
+                result = loads_json(response.content)
                 if result.get("status") == "ok" or result.get("retcode") == 0:
                     logger.info(f"[视频] 发送成功")
                     return True, ""
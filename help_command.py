@@ -15,7 +15,90 @@ HelpCommand (/基咪绘图帮助):
 """
 from typing import Tuple, Optional
 from maibot_sdk.compat.base import BaseCommand
-from .managers import data_manager
+from .managers import get_data_manager
+
+# 帮助文本中不随配置变化的部分，模块加载时拼接一次
+_HEADER_TEXT = "\n".join([
+    "🎨 Gemini 绘图插件帮助 🎨",
+    "本插件基于 Google Gemini 系列模型，提供强大的图片二次创作能力。",
+    "━━━━━━━━━━━━━━━━━━━━",
+    "💡 Tip: 管理员可以使用 /添加提示词 动态添加新指令哦！",
+])
+
+_USER_TEXT_HEAD = "\n".join([
+    "✨ 用户指令 ✨",
+    "━━━━━━━━━━━━━━━━━━━━",
+    "【绘图指令】",
+    "▪️ /绘图 {描述词}: 文生图，根据文字描述生成图片",
+    "▪️ /bnn {prompt}: 使用你的自定义prompt进行绘图",
+    "▪️ /多图 {prompt}: 多图生图，需配合至少2张图片使用",
+    "▪️ /随机 或 /随机绘图: 随机抽取预设风格进行绘图",
+    "▪️ /图生视频 {描述词}: 图生视频，需配合图片使用",
+    "▪️ /文生视频 {描述词}: 文生视频，只需文字描述",
+    "▪️ /查看提示词 {名称}: 查看指定提示词的完整内容",
+    "",
+    "【使用方法】",
+    "1. 回复图片 + 指令",
+    "2. @用户 + 指令",
+    "3. 发送图片 + 指令",
+    "4. 直接发送指令 (使用自己头像)",
+])
+
+_BANANA_ENABLED_TEXT = "\n".join([
+    "\n\n【大香蕉扩展词库】",
+    "▪️ 当前可用 {count} 条",
+    "▪️ /大香蕉提示词 {{关键词}}: 搜索扩展提示词",
+    "▪️ 搜索结果可直接用 `/+ 完整名称` 调用",
+])
+
+_BANANA_DISABLED_TEXT = "\n\n【大香蕉扩展词库】\n▪️ 当前未启用"
+
+_ADMIN_TEXT = "\n".join([
+    "🔑 管理员指令 🔑",
+    "━━━━━━━━━━━━━━━━━━━━",
+    "▪️ /渠道添加key: 添加渠道API Key",
+    "▪️ /渠道删除key: 删除渠道API Key",
+    "▪️ /渠道key列表: 查看各渠道Key状态",
+    "▪️ /渠道重置key: 重置指定渠道的Key",
+    "▪️ /渠道设置错误上限: 设置Key的错误禁用上限",
+    "▪️ /添加提示词 {名称}:{prompt}: 动态添加绘图风格",
+    "▪️ /修改提示词 {名称}:{新prompt}: 修改已有绘图风格",
+    "▪️ /删除提示词 {名称}: 删除绘图风格",
+    "▪️ /添加渠道: 添加自定义API渠道",
+    "▪️ /删除渠道: 删除自定义API渠道",
+    "▪️ /渠道修改模型: 修改渠道模型",
+    "▪️ /启用渠道: 启用指定渠道",
+    "▪️ /禁用渠道: 禁用指定渠道",
+    "▪️ /渠道设置流式 {名称} {true|false}: 设置渠道是否使用流式请求",
+    "▪️ /渠道设置视频 {名称} {true|false}: 设置渠道是否用于视频生成",
+    "▪️ /渠道列表: 查看所有渠道状态",
+    "▪️ /渠道同步大香蕉: 手动同步大香蕉扩展词库",
+    "▪️ /渠道设置猎奇 开启|关闭: 显示或隐藏大香蕉限制级提示词",
+])
+
+# 用户指令文本缓存：(data_manager 版本, 是否启用大香蕉, 大香蕉词条数) -> 文本
+_user_text_cache: Tuple[Optional[tuple], str] = (None, "")
+
+
+def _build_user_text(prompts_config: dict, banana_enabled: bool, banana_count: int) -> str:
+    """拼接用户指令节点文本；数据与大香蕉词库均未变化时直接复用上次结果"""
+    global _user_text_cache
+    cache_key = (get_data_manager().version, banana_enabled, banana_count)
+    if _user_text_cache[0] == cache_key:
+        return _user_text_cache[1]
+
+    pieces = [_USER_TEXT_HEAD]
+    if banana_enabled:
+        pieces.append(_BANANA_ENABLED_TEXT.format(count=banana_count))
+    else:
+        pieces.append(_BANANA_DISABLED_TEXT)
+    if prompts_config:
+        pieces.append("\n\n【预设风格】\n")
+        pieces.append("\n".join([f"▪️ /+ {name}" for name in get_data_manager().get_sorted_prompt_names()]))
+
+    user_text = "".join(pieces)
+    _user_text_cache = (cache_key, user_text)
+    return user_text
 
 class HelpCommand(BaseCommand):
     command_name: str = "gemini_help"
@@ -24,46 +107,17 @@ class HelpCommand(BaseCommand):
     permission: str = "user"
 
     async def execute(self) -> Tuple[bool, Optional[str], bool]:
-        prompts_config = data_manager.get_prompts()
+        prompts_config = get_data_manager().get_prompts()
         banana_enabled = self.get_config("behavior.enable_banana_prompts", True)
         banana_show_restricted = self.get_config("behavior.show_restricted", False)
-        banana_prompts = data_manager.get_banana_prompts(show_restricted=banana_show_restricted) if banana_enabled else {}
+        banana_prompts = get_data_manager().get_banana_prompts(show_restricted=banana_show_restricted) if banana_enabled else {}
         bot_name = "Gemini Drawer"
 
         # 节点1: 标题和介绍
-        header_text = "🎨 Gemini 绘图插件帮助 🎨\n"
-        header_text += "本插件基于 Google Gemini 系列模型，提供强大的图片二次创作能力。\n"
-        header_text += "━━━━━━━━━━━━━━━━━━━━\n"
-        header_text += "💡 Tip: 管理员可以使用 /添加提示词 动态添加新指令哦！"
-
-        # 节点2: 用户指令
-        user_text = "✨ 用户指令 ✨\n━━━━━━━━━━━━━━━━━━━━\n"
-        user_text += "【绘图指令】\n"
-        user_text += "▪️ /绘图 {描述词}: 文生图，根据文字描述生成图片\n"
-        user_text += "▪️ /bnn {prompt}: 使用你的自定义prompt进行绘图\n"
-        user_text += "▪️ /多图 {prompt}: 多图生图，需配合至少2张图片使用\n"
-        user_text += "▪️ /随机 或 /随机绘图: 随机抽取预设风格进行绘图\n"
-        user_text += "▪️ /图生视频 {描述词}: 图生视频，需配合图片使用\n"
-        user_text += "▪️ /文生视频 {描述词}: 文生视频，只需文字描述\n"
-        user_text += "▪️ /查看提示词 {名称}: 查看指定提示词的完整内容\n\n"
-        user_text += "【使用方法】\n"
-        user_text += "1. 回复图片 + 指令\n"
-        user_text += "2. @用户 + 指令\n"
-        user_text += "3. 发送图片 + 指令\n"
-        user_text += "4. 直接发送指令 (使用自己头像)"
-
-        if banana_enabled:
-            user_text += "\n\n【大香蕉扩展词库】\n"
-            user_text += f"▪️ 当前可用 {len(banana_prompts)} 条"
-            user_text += "\n▪️ /大香蕉提示词 {关键词}: 搜索扩展提示词"
-            user_text += "\n▪️ 搜索结果可直接用 `/+ 完整名称` 调用"
-        else:
-            user_text += "\n\n【大香蕉扩展词库】\n▪️ 当前未启用"
+        header_text = _HEADER_TEXT
 
-        if prompts_config:
-            user_text += "\n\n【预设风格】\n"
-            sorted_prompts = sorted(prompts_config.keys())
-            user_text += "\n".join([f"▪️ /+ {name}" for name in sorted_prompts])
+        # 节点2: 用户指令（固定部分 + 随词库变化的部分）
+        user_text = _build_user_text(prompts_config, banana_enabled, len(banana_prompts))
 
         # 构建原生 send.forward 格式的消息列表
         # 格式参考 hello_world_plugin: {"user_id": "0", "nickname": "xxx", "segments": [{"type": "text", "content": "xxx"}]}
@@ -75,28 +129,10 @@ class HelpCommand(BaseCommand):
         # 检查是否为管理员，追加管理员指令节点
         user_id_from_msg = getattr(self.message.message_info.user_info, 'user_id', None)
         admin_list = self.get_config("general.admins", [])
-        str_admin_list = [str(admin) for admin in admin_list]
-
-        if user_id_from_msg and str(user_id_from_msg) in str_admin_list:
-            admin_text = "🔑 管理员指令 🔑\n━━━━━━━━━━━━━━━━━━━━\n"
-            admin_text += "▪️ /渠道添加key: 添加渠道API Key\n"
-            admin_text += "▪️ /渠道删除key: 删除渠道API Key\n"
-            admin_text += "▪️ /渠道key列表: 查看各渠道Key状态\n"
-            admin_text += "▪️ /渠道重置key: 重置指定渠道的Key\n"
-            admin_text += "▪️ /渠道设置错误上限: 设置Key的错误禁用上限\n"
-            admin_text += "▪️ /添加提示词 {名称}:{prompt}: 动态添加绘图风格\n"
-            admin_text += "▪️ /修改提示词 {名称}:{新prompt}: 修改已有绘图风格\n"
-            admin_text += "▪️ /删除提示词 {名称}: 删除绘图风格\n"
-            admin_text += "▪️ /添加渠道: 添加自定义API渠道\n"
-            admin_text += "▪️ /删除渠道: 删除自定义API渠道\n"
-            admin_text += "▪️ /渠道修改模型: 修改渠道模型\n"
-            admin_text += "▪️ /启用渠道: 启用指定渠道\n"
-            admin_text += "▪️ /禁用渠道: 禁用指定渠道\n"
-            admin_text += "▪️ /渠道设置流式 {名称} {true|false}: 设置渠道是否使用流式请求\n"
-            admin_text += "▪️ /渠道设置视频 {名称} {true|false}: 设置渠道是否用于视频生成\n"
-            admin_text += "▪️ /渠道列表: 查看所有渠道状态\n"
-            admin_text += "▪️ /渠道同步大香蕉: 手动同步大香蕉扩展词库\n"
-            admin_text += "▪️ /渠道设置猎奇 开启|关闭: 显示或隐藏大香蕉限制级提示词"
+        is_admin = bool(user_id_from_msg) and str(user_id_from_msg) in {str(admin) for admin in admin_list}
+
+        if is_admin:
+            admin_text = _ADMIN_TEXT
             messages.append({"user_id": "0", "nickname": bot_name, "segments": [{"type": "text", "content": admin_text}]})
 
         # 使用原生 send.forward() API 发送转发消息
@@ -109,7 +145,7 @@ class HelpCommand(BaseCommand):
             else:
                 # 兜底: 如果无法获取原生上下文，则用纯文本发送
                 all_text = header_text + "\n\n" + user_text
-                if user_id_from_msg and str(user_id_from_msg) in str_admin_list:
+                if is_admin:
                     all_text += "\n\n" + admin_text
                 await self.send_text(all_text)
         else:
@@ -7,35 +7,70 @@ KeyManager (API Key 管理器):
     管理各渠道的 API Key，提供：
     - add_keys(): 为指定渠道添加新的 API Key
     - get_all_keys(): 获取所有渠道的 Key 列表及状态
+    - get_active_keys_by_type(): 按渠道分组的可用 Key 索引
     - record_key_usage(): 记录 Key 使用情况（成功/失败计数）
+    - close(): 写入尚未落盘的修改并关闭使用统计数据库
     - manual_reset_keys(): 手动重置 Key 的错误计数和禁用状态
     - reset_specific_key(): 重置指定渠道的特定 Key
+    - get_key_by_index(): 按渠道内序号获取 Key（基于渠道 -> 下标索引）
     - _migrate_legacy_data(): 从旧版配置迁移数据
 
 DataManager (配置数据管理器):
     管理提示词预设和渠道配置，提供：
     - get_prompts() / add_prompt() / delete_prompt(): 提示词 CRUD
+    - get_sorted_prompt_names(): 按名称排序的提示词列表（增删时增量维护）
     - get_channels() / add_channel() / delete_channel() / update_channel(): 渠道 CRUD
+    - get_image_channels() / get_video_channels(): 预先分组的绘图/视频渠道
     - _migrate_from_toml(): 从 TOML 配置迁移到 JSON
 
 数据存储：
     所有数据存储在 data/ 目录下的 JSON 文件中
-    - keys.json: API Key 配置和使用统计
+    - keys.json: API Key 配置
+    - keys_stats.db: API Key 使用统计（错误计数等），SQLite WAL 模式，记录使用情况时只更新变化的行；
+      数据库在单独的线程中读写；旧版 keys.json 中的统计字段在首次加载时迁入数据库，之后只以数据库为准
     - config.json: 提示词预设和渠道配置
+    修改操作先更新内存并标记为待写入，0.5 秒内的多次修改合并为一次写盘；
+    插件卸载或进程退出时调用 flush() 写入尚未落盘的修改
 
-模块级实例：
-    - key_manager: KeyManager 的单例实例
-    - data_manager: DataManager 的单例实例
+单例访问：
+    - get_key_manager(): 获取 KeyManager 单例（首次调用时创建）
+    - get_data_manager(): 获取 DataManager 单例（首次调用时创建）
+    - close_managers(): 插件卸载时写入并关闭已创建的单例
+    - 模块属性 key_manager / data_manager 仍可访问，同样在首次访问时创建
 """
 import json
+import sys
+import bisect
+import asyncio
+import atexit
+import threading
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Tuple, Optional, Dict, Any
+from abc import ABC, abstractmethod
+from typing import List, Set, Tuple, Optional, Dict, Any, Callable
 from datetime import datetime
 from src.common.logger import get_logger
-from .utils import save_config_file
+from .utils import save_config_file, load_toml, atomic_write, dumps_json_bytes, loads_json
 
 logger = get_logger("gemini_drawer")
 
+# 插件目录与插件配置文件路径，模块加载时解析一次，各处共用
+PLUGIN_DIR = Path(__file__).parent
+CONFIG_PATH = PLUGIN_DIR / "config.toml"
+
+
+# 本进程中已确认存在的目录，mkdir 每个目录只执行一次
+_ensured_dirs = set()
+# 外部数据目录的解析结果，首次调用 _get_external_data_dir() 时确定
+_external_data_dir: Optional[Path] = None
+
+
+def _ensure_dir(path: Path):
+    if path not in _ensured_dirs:
+        path.mkdir(parents=True, exist_ok=True)
+        _ensured_dirs.add(path)
+
 
 def _get_external_data_dir() -> Path:
     """获取插件外部数据目录，将数据存储在插件目录之外，
@@ -54,7 +89,11 @@ def _get_external_data_dir() -> Path:
         ├── plugins/gemini_drawer/  <- 插件代码
         └── gemini_drawer/          <- 外部数据目录
     """
-    plugin_dir = Path(__file__).parent  # .../plugins/gemini_drawer
+    global _external_data_dir
+    if _external_data_dir is not None:
+        return _external_data_dir
+
+    plugin_dir = PLUGIN_DIR  # .../plugins/gemini_drawer
     plugins_parent = plugin_dir.parent.parent  # Docker: /MaiMBot/  Host: data/MaiMBot/
     
     # Docker 环境: plugins/ 和 data/ 是同级目录，都在 /MaiMBot/ 下
@@ -66,7 +105,8 @@ def _get_external_data_dir() -> Path:
         # 直接部署: plugins/ 在 data/MaiMBot/ 下
         external_dir = plugins_parent / "gemini_drawer"
     
-    external_dir.mkdir(parents=True, exist_ok=True)
+    _ensure_dir(external_dir)
+    _external_data_dir = external_dir
     return external_dir
 
 
@@ -92,10 +132,148 @@ def _migrate_internal_file(internal_file: Path, external_file: Path) -> bool:
         return False
 
 
-class KeyManager:
+def _file_stamp(path: Path) -> Optional[Tuple[int, int]]:
+    """返回文件的 (修改时间, 大小) 指纹，文件不存在时返回 None"""
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class _ChangeNotifier:
+    """数据版本号与变更回调：每次加载或保存后递增版本号，并通知已注册的缓存失效回调"""
+
+    def _init_change_tracking(self):
+        self.version = 0
+        self._change_listeners: List[Callable[[], None]] = []
+
+    def add_change_listener(self, callback: Callable[[], None]):
+        """注册数据变更回调（例如清空依赖渠道/Key 数据构建的缓存）"""
+        self._change_listeners.append(callback)
+
+    def _bump_version(self):
+        self.version += 1
+        for callback in self._change_listeners:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"数据变更回调执行失败: {e}")
+
+
+# config.toml 旧数据迁移完成标记，写入 keys.json / data.json 顶层；存在时启动时不再读取和解析 config.toml
+_TOML_MIGRATED_FLAG = "_migrated_from_toml"
+
+# 频繁变化的 Key 使用统计字段，单独保存在 keys_stats.db 中，记录使用情况时不必重写 keys.json
+_KEY_STAT_FIELDS = ("error_count", "last_used")
+# keys.json 中旧的统计字段已迁入 keys_stats.db 的标记；存在时统计只以数据库为准，忽略文件中的统计字段
+_STATS_MIGRATED_FLAG = "_stats_in_db"
+_UPSERT_KEY_STATS_SQL = (
+    "INSERT INTO key_stats (value, error_count, last_used) VALUES (?, ?, ?) "
+    "ON CONFLICT(value) DO UPDATE SET error_count = excluded.error_count, last_used = excluded.last_used"
+)
+
+# 延迟写盘的合并窗口（秒）：窗口内的多次修改只写一次文件
+_SAVE_DELAY = 0.5
+
+
+class _DeferredSave(ABC):
+    """
+    延迟写盘：修改内存数据后调用 _mark_dirty()，在 _SAVE_DELAY 秒后统一写一次文件，
+    窗口内的后续修改共用同一次写入。插件卸载或进程退出时通过 flush() 写入尚未落盘的修改。
+    定时写入在事件循环线程中序列化数据快照，再交给线程池执行写文件和 fsync，不阻塞事件循环；
+    flush()、save_config()/save_data() 以及没有事件循环时仍同步写入。
+    子类实现 _encode() 返回待写入的 [(文件路径, 内容)]。
+    """
+
+    def _init_deferred_save(self):
+        self._dirty = False
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # 正在线程池中执行的写入任务，写入完成前不从磁盘重新加载
+        self._write_tasks: Set[asyncio.Future] = set()
+        # 写盘互斥；每个快照带递增序号，按文件记录已写入的序号，较旧的快照不会覆盖较新的
+        self._io_lock = threading.Lock()
+        self._snapshot_seq = 0
+        self._written_seq: Dict[Path, int] = {}
+        atexit.register(self.flush)
+
+    def _mark_dirty(self):
+        self._dirty = True
+        self._bump_version()
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # 没有运行中的事件循环（如插件加载阶段的数据迁移），直接写入
+            self.flush()
+            return
+        self._flush_handle = loop.call_later(_SAVE_DELAY, self._flush_in_background)
+
+    def _flush_in_background(self):
+        self._flush_handle = None
+        files = self._take_pending()
+        if not files:
+            return
+        self._snapshot_seq += 1
+        task = asyncio.ensure_future(asyncio.to_thread(self._write_files, files, self._snapshot_seq))
+        self._write_tasks.add(task)
+        task.add_done_callback(self._write_tasks.discard)
+
+    def _cancel_pending_flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+    def _has_unsaved_changes(self) -> bool:
+        return self._dirty or bool(self._write_tasks)
+
+    def _take_pending(self) -> List[Tuple[Path, bytes]]:
+        """序列化尚未落盘的修改并清除脏标记，没有修改时返回空列表"""
+        if not self._dirty:
+            return []
+        self._dirty = False
+        return self._encode()
+
+    def _write_files(self, files: List[Tuple[Path, bytes]], seq: int):
+        with self._io_lock:
+            for path, data in files:
+                if seq < self._written_seq.get(path, 0):
+                    continue
+                try:
+                    atomic_write(path, data)
+                except OSError as e:
+                    logger.error(f"保存 {path.name} 失败: {e}")
+                    continue
+                self._written_seq[path] = seq
+                self._on_written(path)
+
+    def _write_now(self, files: List[Tuple[Path, bytes]]):
+        self._snapshot_seq += 1
+        self._write_files(files, self._snapshot_seq)
+
+    def flush(self):
+        """立即写入尚未落盘的修改"""
+        self._cancel_pending_flush()
+        files = self._take_pending()
+        if files:
+            self._write_now(files)
+
+    @abstractmethod
+    def _encode(self) -> List[Tuple[Path, bytes]]:
+        raise NotImplementedError
+
+    def _on_written(self, path: Path):
+        """文件写入成功后调用（可能在线程池中）"""
+
+
+class KeyManager(_ChangeNotifier, _DeferredSave):
     def __init__(self, keys_file_path: Path = None):
         if keys_file_path is None:
-            self.plugin_dir = Path(__file__).parent
+            self.plugin_dir = PLUGIN_DIR
             self.data_dir = _get_external_data_dir()
             self.keys_file = self.data_dir / "keys.json"
             # 从插件内部旧路径迁移数据
@@ -103,11 +281,61 @@ class KeyManager:
             _migrate_internal_file(internal_keys, self.keys_file)
         else:
             self.keys_file = keys_file_path
+            self.data_dir = self.keys_file.parent
             self.plugin_dir = self.keys_file.parent.parent 
             
+        self.stats_file = self.keys_file.with_name("keys_stats.db")
+        self._stats_conn: Optional[sqlite3.Connection] = None
+        # keys_stats.db 只在这个单线程中访问：写入按提交顺序执行，且不阻塞事件循环
+        self._stats_executor: Optional[ThreadPoolExecutor] = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="gemini_drawer_key_stats"
+        )
+
+        self._init_change_tracking()
+        self._init_deferred_save()
+        # 使用统计有变化、尚未写入 keys_stats.db 的 Key 值
+        self._stats_changed: Set[str] = set()
+        self._file_stamp: Optional[Tuple[int, int]] = None
+        # 按渠道分组的可用 Key 索引，数据版本变化时重建
+        self._keys_by_type: Dict[str, List[Dict[str, Any]]] = {}
+        self._keys_by_type_version = -1
+        # Key 值 -> Key 对象 的索引，在 Key 增删和重新加载时维护，查找与去重无需遍历列表
+        self._by_value: Dict[str, Dict[str, Any]] = {}
+        # 渠道名 -> 该渠道各 Key 在 config['keys'] 中的下标（按文件顺序），用于把用户输入的序号转换为列表位置
+        self._by_type: Dict[Optional[str], List[int]] = {}
         self.config = self._load_config()
+        self._rebuild_key_index()
         self._migrate_legacy_data()
 
+    def _rebuild_key_index(self):
+        by_value: Dict[str, Dict[str, Any]] = {}
+        by_type: Dict[Optional[str], List[int]] = {}
+        for i, key_obj in enumerate(self.config.get('keys', [])):
+            # 同一个 Key 重复出现时以第一个为准，与按顺序查找的结果一致
+            by_value.setdefault(key_obj['value'], key_obj)
+            by_type.setdefault(key_obj.get('type'), []).append(i)
+        self._by_value = by_value
+        self._by_type = by_type
+
+    def _append_key(self, key_obj: Dict[str, Any]):
+        """追加 Key 并同步更新索引"""
+        keys = self.config.setdefault('keys', [])
+        self._by_type.setdefault(key_obj.get('type'), []).append(len(keys))
+        self._by_value.setdefault(key_obj['value'], key_obj)
+        keys.append(key_obj)
+
+    def _position_of(self, key_type: str, index: int) -> Optional[int]:
+        """将渠道内从 1 开始的序号转换为 config['keys'] 中的下标，序号无效时返回 None"""
+        positions = self._by_type.get(key_type, ())
+        if index < 1 or index > len(positions):
+            return None
+        return positions[index - 1]
+
+    def get_key_by_index(self, key_type: str, index: int) -> Optional[Dict[str, Any]]:
+        """返回指定渠道的第 index 个 Key（从 1 开始），不存在时返回 None"""
+        position = self._position_of(key_type, index)
+        return None if position is None else self.config['keys'][position]
+
     def _migrate_legacy_data(self):
         migrated = False
         old_keys_file = self.plugin_dir / "keys.json"
@@ -117,12 +345,11 @@ class KeyManager:
                     old_data = json.load(f)
                     old_keys = old_data.get('keys', [])
                     if old_keys:
-                        current_keys = {k['value'] for k in self.config.get('keys', [])}
                         for k in old_keys:
-                            if k['value'] not in current_keys:
+                            if k['value'] not in self._by_value:
                                 if 'type' not in k:
                                     k['type'] = 'bailili' if k['value'].startswith('sk-') else 'google'
-                                self.config['keys'].append(k)
+                                self._append_key(k)
                                 migrated = True
                 old_keys_file.rename(old_keys_file.with_suffix('.json.bak'))
                 logger.info("已迁移旧的 keys.json 数据")
@@ -130,14 +357,13 @@ class KeyManager:
                 logger.error(f"迁移旧 keys.json 失败: {e}")
 
         config_path = self.plugin_dir / "config.toml"
-        if config_path.exists():
+        if not self.config.get(_TOML_MIGRATED_FLAG) and config_path.exists():
             try:
-                import toml
-                with open(config_path, 'r', encoding='utf-8') as f:
-                    config_data = toml.load(f)
+                config_data = load_toml(config_path)
                 
                 channels = config_data.get("channels", {})
                 config_changed = False
+                migrated_channels: List[str] = []
                 
                 for name, info in channels.items():
                     key_to_migrate = None
@@ -168,12 +394,19 @@ class KeyManager:
                     if key_to_migrate:
                         self.add_keys([key_to_migrate], name)
                         migrated = True
-                        logger.info(f"已迁移渠道 {name} 的 Key")
+                        migrated_channels.append(name)
+
+                # 汇总为一条日志，避免渠道较多时逐条输出
+                if migrated_channels:
+                    logger.info("已迁移渠道 Key: %s", ", ".join(migrated_channels))
 
                 if config_changed:
                     save_config_file(config_path, config_data)
                     logger.info("已从 config.toml 移除 Key")
 
+                self.config[_TOML_MIGRATED_FLAG] = True
+                migrated = True
+
             except Exception as e:
                 logger.error(f"迁移 config.toml 数据失败: {e}")
 
@@ -183,57 +416,256 @@ class KeyManager:
     def _load_config(self) -> Dict[str, Any]:
         try:
             if not self.keys_file.exists():
-                default_config = {"keys": [], "current_index": 0}
+                default_config = {"keys": [], "current_index": 0, _STATS_MIGRATED_FLAG: True}
                 self.save_config(default_config)
                 return default_config
-            with open(self.keys_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            stamp = _file_stamp(self.keys_file)
+            config = loads_json(self.keys_file.read_bytes())
+            if self._merge_stats(config):
+                # 旧统计字段已迁入数据库，立即写回不含统计字段、带迁移标记的 keys.json
+                self._write_now(self._encode_config(config))
+                stamp = _file_stamp(self.keys_file)
+            # 渠道名与状态只有少数几种取值，驻留后所有 Key 共享同一个字符串对象
+            for key_obj in config.get('keys', []):
+                if isinstance(key_obj.get('type'), str):
+                    key_obj['type'] = sys.intern(key_obj['type'])
+                if isinstance(key_obj.get('status'), str):
+                    key_obj['status'] = sys.intern(key_obj['status'])
+            self._file_stamp = stamp
+            self._bump_version()
+            return config
         except (IOError, json.JSONDecodeError) as e:
             logger.error(f"读取密钥配置失败: {e}")
             return {"keys": [], "current_index": 0}
 
-    def save_config(self, config_data: Dict[str, Any]):
+    def _run_stats(self, fn: Callable[..., Any], *args, wait: bool = False) -> Any:
+        """在统计专用线程中执行数据库操作。
+        有运行中的事件循环且无需结果时只提交不等待，写入任务计入未落盘的修改；否则等待执行完成并返回结果"""
+        if self._stats_executor is None:
+            # 已关闭（如 close() 之后的 atexit 写入），直接在当前线程执行
+            return fn(*args)
+        try:
+            future = self._stats_executor.submit(fn, *args)
+        except RuntimeError:
+            # 解释器退出时线程池已停止接收任务，直接在当前线程执行
+            return fn(*args)
+        if not wait:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                pass
+            else:
+                task = asyncio.wrap_future(future)
+                self._write_tasks.add(task)
+                task.add_done_callback(self._write_tasks.discard)
+                return None
+        return future.result()
+
+    def _stats_db(self) -> sqlite3.Connection:
+        """打开（首次调用时）使用统计数据库。WAL + synchronous=NORMAL 下单行更新不触发 fsync"""
+        if self._stats_conn is None:
+            conn = sqlite3.connect(str(self.stats_file), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS key_stats ("
+                "value TEXT PRIMARY KEY, error_count INTEGER NOT NULL DEFAULT 0, last_used TEXT)"
+            )
+            conn.commit()
+            self._stats_conn = conn
+        return self._stats_conn
+
+    def _read_stats(self) -> Dict[str, Tuple[int, Optional[str]]]:
+        conn = self._stats_db()
+        rows = conn.execute("SELECT value, error_count, last_used FROM key_stats").fetchall()
+        return {value: (error_count, last_used) for value, error_count, last_used in rows}
+
+    def _upsert_stats(self, rows: List[Tuple[str, int, Optional[str]]]):
         try:
-            with open(self.keys_file, 'w', encoding='utf-8') as f:
-                json.dump(config_data, f, indent=4, ensure_ascii=False)
-        except IOError as e:
-            logger.error(f"保存密钥配置失败: {e}")
+            conn = self._stats_db()
+            with conn:
+                conn.executemany(_UPSERT_KEY_STATS_SQL, rows)
+        except sqlite3.Error as e:
+            logger.error(f"保存 Key 使用统计失败: {e}")
+
+    def _replace_stats(self, rows: List[Tuple[str, int, Optional[str]]]):
+        try:
+            conn = self._stats_db()
+            with conn:
+                conn.execute("DELETE FROM key_stats")
+                conn.executemany(_UPSERT_KEY_STATS_SQL, rows)
+        except sqlite3.Error as e:
+            logger.error(f"保存 Key 使用统计失败: {e}")
+
+    def _close_stats_db(self):
+        if self._stats_conn is not None:
+            self._stats_conn.close()
+            self._stats_conn = None
+
+    def _merge_stats(self, config: Dict[str, Any]) -> bool:
+        """将 keys_stats.db 中的使用统计合并回 Key 对象，返回 keys.json 是否需要重写。
+        统计迁入数据库之前的 keys.json（旧版文件）仍带统计字段，此时以文件为准写入数据库并加上迁移标记；
+        迁移之后数据库是统计的唯一来源，keys.json 中残留的统计字段被忽略"""
+        try:
+            stats = self._run_stats(self._read_stats, wait=True)
+        except sqlite3.Error as e:
+            logger.warning(f"读取 Key 使用统计失败，将使用 keys.json 中的数据: {e}")
+            return False
+        migrate = not config.get(_STATS_MIGRATED_FLAG)
+        file_rows = []
+        for key_obj in config.get('keys', []):
+            has_file_stats = any(field in key_obj for field in _KEY_STAT_FIELDS)
+            if migrate and has_file_stats:
+                file_rows.append(self._stats_row(key_obj))
+                continue
+            key_stats = stats.get(key_obj.get('value'))
+            if key_stats is not None:
+                key_obj['error_count'], key_obj['last_used'] = key_stats
+            elif has_file_stats:
+                # 已迁移但数据库中没有该 Key 的记录（如手动添加的 Key），从零开始计数
+                key_obj['error_count'], key_obj['last_used'] = 0, None
+        if not migrate:
+            return False
+        if file_rows:
+            self._run_stats(self._upsert_stats, file_rows, wait=True)
+        config[_STATS_MIGRATED_FLAG] = True
+        return True
+
+    @staticmethod
+    def _stats_row(key_obj: Dict[str, Any]) -> Tuple[str, int, Optional[str]]:
+        return key_obj['value'], key_obj.get('error_count', 0), key_obj.get('last_used')
+
+    def _write_changed_stats(self):
+        """在事件循环线程中取出有变化的 Key 统计快照，交给统计线程逐行 UPSERT"""
+        if not self._stats_changed:
+            return
+        rows = [self._stats_row(self._by_value[value]) for value in self._stats_changed if value in self._by_value]
+        self._stats_changed.clear()
+        self._run_stats(self._upsert_stats, rows)
+
+    def _replace_all_stats(self, keys: List[Dict[str, Any]]):
+        """Key 配置整体保存时同步整张统计表，已删除的 Key 不再保留统计"""
+        self._stats_changed.clear()
+        self._run_stats(self._replace_stats, [self._stats_row(key_obj) for key_obj in keys])
+
+    def _encode_config(self, config_data: Dict[str, Any]) -> List[Tuple[Path, bytes]]:
+        # keys.json 由插件维护、随 Key 数量增长，使用紧凑格式序列化（有 orjson 时使用 orjson）；
+        # 使用统计字段写入 keys_stats.db，不进入 keys.json
+        stored = dict(config_data)
+        stored['keys'] = [
+            {field: value for field, value in key_obj.items() if field not in _KEY_STAT_FIELDS}
+            for key_obj in config_data.get('keys', [])
+        ]
+        return [(self.keys_file, dumps_json_bytes(stored))]
+
+    def _encode(self) -> List[Tuple[Path, bytes]]:
+        return self._encode_config(self.config)
+
+    def _on_written(self, path: Path):
+        if path == self.keys_file:
+            self._file_stamp = _file_stamp(self.keys_file)
+
+    def _mark_stats_dirty(self, key_value: str):
+        """只有使用统计变化：不递增数据版本（端点等缓存不依赖统计），延迟写入 keys_stats.db"""
+        self._stats_changed.add(key_value)
+        self._schedule_flush()
+
+    def _take_pending(self) -> List[Tuple[Path, bytes]]:
+        """Key 配置有修改时同步整张统计表并返回 keys.json 内容；只有统计变化时只更新变化的行"""
+        if self._dirty:
+            self._replace_all_stats(self.config.get('keys', []))
+            return super()._take_pending()
+        self._write_changed_stats()
+        return []
+
+    def _has_unsaved_changes(self) -> bool:
+        return bool(self._stats_changed) or super()._has_unsaved_changes()
+
+    def save_config(self, config_data: Dict[str, Any]):
+        """立即写入密钥配置；常规修改请使用 _mark_dirty() 延迟合并写入"""
+        if config_data is getattr(self, 'config', None):
+            self._dirty = False
+            self._cancel_pending_flush()
+        self._replace_all_stats(config_data.get('keys', []))
+        self._write_now(self._encode_config(config_data))
+        self._bump_version()
+
+    def close(self):
+        """写入尚未落盘的修改，等待统计线程写完后关闭使用统计数据库"""
+        self.flush()
+        executor = self._stats_executor
+        if executor is not None:
+            self._run_stats(self._close_stats_db, wait=True)
+            self._stats_executor = None
+            executor.shutdown(wait=True)
+        else:
+            self._close_stats_db()
 
     def add_keys(self, new_keys: List[str], key_type: str) -> Tuple[int, int]:
-        existing_keys = {key['value'] for key in self.config.get('keys', [])}
         added_count = 0
         duplicate_count = 0
+        key_type = sys.intern(key_type)
         for key_value in new_keys:
-            if key_value in existing_keys:
+            if key_value in self._by_value:
                 duplicate_count += 1
             else:
                 key_obj = {"value": key_value, "type": key_type, "status": "active", "error_count": 0, "last_used": None, "max_errors": 5}
-                self.config['keys'].append(key_obj)
+                self._append_key(key_obj)
                 added_count += 1
-        self.save_config(self.config)
+        # 全部重复时没有任何修改，不写盘也不使端点缓存失效
+        if added_count:
+            self._mark_dirty()
         return added_count, duplicate_count
 
     def get_all_keys(self) -> List[Dict[str, Any]]:
-        # 每次调用时从文件重新加载，支持实时更新
-        self.config = self._load_config()
+        # 文件被外部修改时重新加载，支持实时更新；内存中有未落盘的修改时以内存为准
+        if not self._has_unsaved_changes() and _file_stamp(self.keys_file) != self._file_stamp:
+            self.config = self._load_config()
+            self._rebuild_key_index()
         return self.config.get('keys', [])
 
+    def get_active_keys_by_type(self) -> Dict[str, List[Dict[str, Any]]]:
+        """返回 {渠道名: [状态为 active 的 Key]}，保持 Key 在文件中的顺序"""
+        keys = self.get_all_keys()
+        if self._keys_by_type_version != self.version:
+            keys_by_type: Dict[str, List[Dict[str, Any]]] = {}
+            for key_info in keys:
+                if key_info.get('status') == 'active':
+                    keys_by_type.setdefault(key_info.get('type'), []).append(key_info)
+            self._keys_by_type = keys_by_type
+            self._keys_by_type_version = self.version
+        return self._keys_by_type
+
+    def _drop_from_active_index(self, key_obj: Dict[str, Any]):
+        """Key 被自动禁用时只从所属渠道的可用列表中移除，不必按新版本号重建全部渠道的索引。
+        替换为新列表而不是原地修改，调用方已取得的列表不受影响"""
+        key_type = key_obj.get('type')
+        active = self._keys_by_type.get(key_type)
+        if active is not None:
+            self._keys_by_type[key_type] = [k for k in active if k is not key_obj]
+        self._keys_by_type_version = self.version
+
     def record_key_usage(self, key_value: str, success: bool, force_disable: bool = False):
-        keys = self.config.get('keys', [])
-        for key_obj in keys:
-            if key_obj['value'] == key_value:
-                if success:
-                    key_obj['error_count'] = 0
-                else:
-                    key_obj['error_count'] = key_obj.get('error_count', 0) + 1
-                    max_errors = key_obj.get('max_errors', 5)
-                    if max_errors != -1 and (force_disable or key_obj['error_count'] >= max_errors):
-                        if key_obj['status'] == 'active':
-                            key_obj['status'] = 'disabled'
-                            reason = "配额耗尽" if force_disable else "错误次数过多"
-                            logger.warning(f"API Key {key_value[:8]}... 已因“{reason}”被自动禁用。")
-                self.save_config(self.config)
-                return
+        key_obj = self._by_value.get(key_value)
+        if key_obj is None:
+            return
+        if success:
+            key_obj['error_count'] = 0
+        else:
+            key_obj['error_count'] = key_obj.get('error_count', 0) + 1
+            max_errors = key_obj.get('max_errors', 5)
+            if max_errors != -1 and (force_disable or key_obj['error_count'] >= max_errors):
+                if key_obj['status'] == 'active':
+                    key_obj['status'] = 'disabled'
+                    reason = "配额耗尽" if force_disable else "错误次数过多"
+                    logger.warning(f"API Key {key_value[:8]}... 已因“{reason}”被自动禁用。")
+                    # Key 状态变化会影响可用端点，需写入 keys.json 并通知缓存失效
+                    index_in_sync = self._keys_by_type_version == self.version
+                    self._mark_dirty()
+                    if index_in_sync:
+                        self._drop_from_active_index(key_obj)
+                    return
+        self._mark_stats_dirty(key_value)
 
     def manual_reset_keys(self, key_type: Optional[str] = None) -> int:
         keys = self.config.get('keys', [])
@@ -246,38 +678,28 @@ class KeyManager:
                 key_obj['error_count'] = 0
                 reset_count += 1
         if reset_count > 0:
-            self.save_config(self.config)
+            self._mark_dirty()
         return reset_count
 
     def reset_specific_key(self, key_type: str, index: int) -> bool:
-        keys = self.config.get('keys', [])
-        target_keys = []
-        for i, key_obj in enumerate(keys):
-            if key_obj.get('type') == key_type:
-                target_keys.append((i, key_obj))
-        
-        if index < 1 or index > len(target_keys):
+        key_obj = self.get_key_by_index(key_type, index)
+        if key_obj is None:
             return False
-        real_index, key_obj = target_keys[index - 1]
         key_obj['status'] = 'active'
         key_obj['error_count'] = 0
-        self.save_config(self.config)
+        self._mark_dirty()
         return True
 
     def delete_key(self, key_type: str, index: int) -> bool:
         """删除指定渠道的特定 Key"""
-        keys = self.config.get('keys', [])
-        target_keys = []
-        for i, key_obj in enumerate(keys):
-            if key_obj.get('type') == key_type:
-                target_keys.append((i, key_obj))
-        
-        if index < 1 or index > len(target_keys):
+        real_index = self._position_of(key_type, index)
+        if real_index is None:
             return False
         
-        real_index, key_obj = target_keys[index - 1]
-        del self.config['keys'][real_index]
-        self.save_config(self.config)
+        key_obj = self.config['keys'].pop(real_index)
+        # 删除后其后各 Key 的下标整体前移，重建索引
+        self._rebuild_key_index()
+        self._mark_dirty()
         logger.info(f"已删除渠道 {key_type} 的第 {index} 个 Key: {key_obj['value'][:8]}...")
         return True
 
@@ -288,14 +710,15 @@ class KeyManager:
         self.config['keys'] = [k for k in keys if k.get('type') != key_type]
         deleted_count = original_count - len(self.config['keys'])
         if deleted_count > 0:
-            self.save_config(self.config)
+            self._rebuild_key_index()
+            self._mark_dirty()
             logger.info(f"已删除渠道 {key_type} 的所有 Key，共 {deleted_count} 个")
         return deleted_count
 
-class DataManager:
+class DataManager(_ChangeNotifier, _DeferredSave):
     def __init__(self, data_file_path: Path = None):
         if data_file_path is None:
-            self.plugin_dir = Path(__file__).parent
+            self.plugin_dir = PLUGIN_DIR
             self.data_dir = _get_external_data_dir()
             self.data_file = self.data_dir / "data.json"
             self.banana_file = self.data_dir / "banana_prompts.json"
@@ -304,16 +727,30 @@ class DataManager:
             _migrate_internal_file(internal_data, self.data_file)
         else:
             self.data_file = data_file_path
-            self.banana_file = self.data_file.parent / "banana_prompts.json"
+            self.data_dir = self.data_file.parent
+            self.banana_file = self.data_dir / "banana_prompts.json"
             self.plugin_dir = self.data_file.parent.parent
             
+        self._init_change_tracking()
+        self._init_deferred_save()
+        self._file_stamp: Optional[Tuple[int, int]] = None
+        # 绘图/视频渠道索引，数据版本变化时重建
+        self._image_channels: Dict[str, Any] = {}
+        self._video_channels: Dict[str, Dict[str, Any]] = {}
+        self._channel_index_version = -1
         self.data = self._load_data()
+        # 本地提示词名称元组与有序名称列表，在提示词增删时增量维护、数据重新加载时重建
+        self._prompt_names: Tuple[str, ...] = ()
+        self._sorted_prompt_names: List[str] = []
+        self._refresh_prompt_names()
         self._migrate_from_root()
         self._migrate_from_toml()
 
     def _migrate_from_root(self):
         """迁移根目录下的 data.json/data.js 到 data/data.json"""
         migrated = False
+        migrated_files: List[str] = []
+        renamed_files: List[str] = []
         
         # 检查可能的旧文件名称
         possible_files = ["data.json", "data.js", "data.json.bak"]
@@ -342,55 +779,73 @@ class DataManager:
                 if "prompts" in content:
                     for name, prompt in content["prompts"].items():
                         if name not in self.data.get("prompts", {}):
-                            self.add_prompt(name, prompt)
+                            self._add_prompt_nosave(name, prompt)
                             changed = True
                             
                 # 迁移 Channels
                 if "channels" in content:
                     for name, info in content["channels"].items():
                         if name not in self.data.get("channels", {}):
-                            self.add_channel(name, info)
+                            self._add_channel_nosave(name, info)
                             changed = True
                             
                 if changed:
                     migrated = True
-                    logger.info(f"已从 {filename} 迁移数据")
+                    migrated_files.append(filename)
                 
                 # 备份旧文件
                 backup_path = root_file.with_suffix(root_file.suffix + ".migrated")
                 root_file.rename(backup_path)
-                logger.info(f"已将 {filename} 重命名为 {backup_path.name}")
+                renamed_files.append(f"{filename} -> {backup_path.name}")
                 
             except Exception as e:
                 logger.error(f"迁移 {filename} 数据失败: {e}")
 
+        # 迁移结果汇总为一条日志
+        if renamed_files:
+            logger.info(
+                "已从 %s 迁移数据，旧文件已重命名: %s",
+                ", ".join(migrated_files) or "（无新增数据）",
+                ", ".join(renamed_files),
+            )
+        # 迁移过程只修改内存数据，结束后重建名称索引并一次性写盘
         if migrated:
+            self._refresh_prompt_names()
             self.save_data()
 
     def _load_data(self) -> Dict[str, Any]:
         if not self.data_file.exists():
             return {"prompts": {}, "channels": {}}
         try:
-            with open(self.data_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            stamp = _file_stamp(self.data_file)
+            data = loads_json(self.data_file.read_bytes())
+            self._file_stamp = stamp
+            self._bump_version()
+            return data
         except Exception as e:
             logger.error(f"Failed to load data.json: {e}")
             return {"prompts": {}, "channels": {}}
 
+    def _encode(self) -> List[Tuple[Path, bytes]]:
+        # data.json 可能被手动编辑，保留缩进，但由 4 格缩小到 2 格
+        return [(self.data_file, json.dumps(self.data, indent=2, ensure_ascii=False).encode('utf-8'))]
+
+    def _on_written(self, path: Path):
+        self._file_stamp = _file_stamp(self.data_file)
+
     def save_data(self):
-        try:
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, indent=4, ensure_ascii=False)
-        except Exception as e:
-            logger.error(f"Failed to save data.json: {e}")
+        """立即写入 data.json；常规修改请使用 _mark_dirty() 延迟合并写入"""
+        self._dirty = False
+        self._cancel_pending_flush()
+        self._write_now(self._encode())
+        self._bump_version()
 
     def load_banana_data(self) -> Dict[str, Any]:
         """读取大香蕉独立词库；失败时不影响本地 data.json。"""
         if not self.banana_file.exists():
             return {"schema_version": 1, "prompts": {}}
         try:
-            with open(self.banana_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = loads_json(self.banana_file.read_bytes())
             if not isinstance(data, dict):
                 logger.warning("banana_prompts.json 顶层不是对象，已忽略")
                 return {"schema_version": 1, "prompts": {}}
@@ -406,11 +861,8 @@ class DataManager:
     def save_banana_data(self, banana_data: Dict[str, Any]) -> None:
         """原子写入大香蕉独立词库，不触碰 data.json。"""
         try:
-            self.data_dir.mkdir(parents=True, exist_ok=True)
-            tmp_file = self.banana_file.with_suffix(self.banana_file.suffix + ".tmp")
-            with open(tmp_file, 'w', encoding='utf-8') as f:
-                json.dump(banana_data, f, indent=2, ensure_ascii=False)
-            tmp_file.replace(self.banana_file)
+            _ensure_dir(self.data_dir)
+            atomic_write(self.banana_file, json.dumps(banana_data, indent=2, ensure_ascii=False).encode('utf-8'))
         except Exception as e:
             logger.error(f"保存 banana_prompts.json 失败: {e}")
             raise
@@ -474,14 +926,14 @@ class DataManager:
         return merged
 
     def _migrate_from_toml(self):
+        if self.data.get(_TOML_MIGRATED_FLAG):
+            return
         config_path = self.plugin_dir / "config.toml"
         if not config_path.exists():
             return
 
         try:
-            import toml
-            with open(config_path, 'r', encoding='utf-8') as f:
-                config_data = toml.load(f)
+            config_data = load_toml(config_path)
             
             data_changed = False
             config_changed = False
@@ -490,7 +942,7 @@ class DataManager:
             if "prompts" in config_data:
                 for name, prompt in config_data["prompts"].items():
                     if name not in self.data["prompts"]:
-                        self.data["prompts"][name] = prompt
+                        self._add_prompt_nosave(name, prompt)
                         data_changed = True
                 del config_data["prompts"]
                 config_changed = True
@@ -499,7 +951,7 @@ class DataManager:
             if "channels" in config_data:
                 for name, info in config_data["channels"].items():
                     if name not in self.data["channels"]:
-                        self.data["channels"][name] = info
+                        self._add_channel_nosave(name, info)
                         data_changed = True
                 del config_data["channels"]
                 config_changed = True
@@ -539,7 +991,7 @@ class DataManager:
                         channels["lmarena"] = channel_info
                         data_changed = True
                     if lmarena_key:
-                        added_count, _ = key_manager.add_keys([lmarena_key], "lmarena")
+                        added_count, _ = get_key_manager().add_keys([lmarena_key], "lmarena")
                         data_changed = data_changed or added_count > 0
 
                 for field_name in legacy_fields:
@@ -547,10 +999,12 @@ class DataManager:
                         del api_config[field_name]
                         config_changed = True
 
-            if data_changed:
-                self.save_data()
             if config_changed:
                 save_config_file(config_path, config_data)
+            if data_changed:
+                self._refresh_prompt_names()
+            self.data[_TOML_MIGRATED_FLAG] = True
+            self.save_data()
             if data_changed or config_changed:
                 logger.info("Successfully migrated legacy config.toml data")
 
@@ -560,16 +1014,38 @@ class DataManager:
     def get_prompts(self) -> Dict[str, str]:
         return self.data.get("prompts", {})
 
+    def _refresh_prompt_names(self):
+        prompts = self.data.get("prompts", {})
+        self._prompt_names = tuple(prompts)
+        self._sorted_prompt_names = sorted(prompts)
+
+    def get_prompt_keys(self) -> Tuple[str, ...]:
+        """返回本地提示词名称元组（在修改时预先构建，读取无额外开销）"""
+        return self._prompt_names
+
+    def get_sorted_prompt_names(self) -> List[str]:
+        """返回按名称排序的本地提示词列表（只读，调用方不应修改）"""
+        return self._sorted_prompt_names
+
+    def _add_prompt_nosave(self, name: str, prompt: str):
+        """只修改内存中的 data，不更新名称索引也不写盘，供批量迁移使用"""
+        self.data.setdefault("prompts", {})[name] = prompt
+
     def add_prompt(self, name: str, prompt: str):
-        if "prompts" not in self.data:
-            self.data["prompts"] = {}
-        self.data["prompts"][name] = prompt
-        self.save_data()
+        if name not in self.data.get("prompts", {}):
+            self._prompt_names += (name,)
+            bisect.insort(self._sorted_prompt_names, name)
+        self._add_prompt_nosave(name, prompt)
+        self._mark_dirty()
 
     def delete_prompt(self, name: str) -> bool:
         if name in self.data.get("prompts", {}):
             del self.data["prompts"][name]
-            self.save_data()
+            self._prompt_names = tuple(n for n in self._prompt_names if n != name)
+            index = bisect.bisect_left(self._sorted_prompt_names, name)
+            if index < len(self._sorted_prompt_names) and self._sorted_prompt_names[index] == name:
+                del self._sorted_prompt_names[index]
+            self._mark_dirty()
             return True
         return False
 
@@ -577,25 +1053,54 @@ class DataManager:
         """修改已存在的提示词"""
         if name in self.data.get("prompts", {}):
             self.data["prompts"][name] = prompt
-            self.save_data()
+            self._mark_dirty()
             return True
         return False
 
     def get_channels(self) -> Dict[str, Any]:
-        # 每次调用时从文件重新加载，支持实时更新
-        self.data = self._load_data()
+        # 文件被外部修改时重新加载，支持实时更新；内存中有未落盘的修改时以内存为准
+        if not self._has_unsaved_changes() and _file_stamp(self.data_file) != self._file_stamp:
+            self.data = self._load_data()
+            self._refresh_prompt_names()
         return self.data.get("channels", {})
 
+    def _refresh_channel_indexes(self):
+        channels = self.get_channels()
+        if self._channel_index_version == self.version:
+            return
+        image_channels: Dict[str, Any] = {}
+        video_channels: Dict[str, Dict[str, Any]] = {}
+        for name, info in channels.items():
+            if isinstance(info, dict) and info.get("is_video", False):
+                video_channels[name] = info
+            else:
+                image_channels[name] = info
+        self._image_channels = image_channels
+        self._video_channels = video_channels
+        self._channel_index_version = self.version
+
+    def get_image_channels(self) -> Dict[str, Any]:
+        """返回非视频渠道（含旧版 "url:key" 字符串格式）"""
+        self._refresh_channel_indexes()
+        return self._image_channels
+
+    def get_video_channels(self) -> Dict[str, Dict[str, Any]]:
+        """返回 is_video=True 的渠道"""
+        self._refresh_channel_indexes()
+        return self._video_channels
+
+    def _add_channel_nosave(self, name: str, info: Dict[str, Any]):
+        """只修改内存中的 data，不写盘，供批量迁移使用"""
+        self.data.setdefault("channels", {})[name] = info
+
     def add_channel(self, name: str, info: Dict[str, Any]):
-        if "channels" not in self.data:
-            self.data["channels"] = {}
-        self.data["channels"][name] = info
-        self.save_data()
+        self._add_channel_nosave(name, info)
+        self._mark_dirty()
 
     def delete_channel(self, name: str) -> bool:
         if name in self.data.get("channels", {}):
             del self.data["channels"][name]
-            self.save_data()
+            self._mark_dirty()
             return True
         return False
         
@@ -603,8 +1108,42 @@ class DataManager:
          if "channels" not in self.data:
             self.data["channels"] = {}
          self.data["channels"][name] = info
-         self.save_data()
+         self._mark_dirty()
+
+# 单例在首次使用时才创建：导入本模块不会读取数据文件、执行迁移或创建数据目录
+_key_manager: Optional[KeyManager] = None
+_data_manager: Optional[DataManager] = None
+
+
+def get_key_manager() -> KeyManager:
+    global _key_manager
+    if _key_manager is None:
+        _key_manager = KeyManager()
+    return _key_manager
+
+
+def get_data_manager() -> DataManager:
+    global _data_manager
+    if _data_manager is None:
+        # 先创建 KeyManager：它的 config.toml 迁移要先从 channels 中取出 Key，
+        # 之后 DataManager 才把 channels 移入 data.json 并从 config.toml 删除
+        get_key_manager()
+        _data_manager = DataManager()
+    return _data_manager
+
+
+def close_managers():
+    """写入已创建单例中尚未落盘的修改并关闭统计数据库；从未使用过的单例不会为此被创建"""
+    if _key_manager is not None:
+        _key_manager.close()
+    if _data_manager is not None:
+        _data_manager.flush()
+
 
-# 初始化实例
-key_manager = KeyManager()
-data_manager = DataManager()
+def __getattr__(name: str):
+    # 兼容旧的 `from .managers import key_manager` 写法（PEP 562），访问时才创建实例
+    if name == "key_manager":
+        return get_key_manager()
+    if name == "data_manager":
+        return get_data_manager()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
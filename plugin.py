@@ -1,5 +1,4 @@
 from typing import Any, Tuple, Optional, Type
-from pathlib import Path
 import re
 import base64
 import httpx
@@ -8,7 +7,7 @@ from maibot_sdk.types import ActivationType
 from maibot_sdk.context import PluginContext
 
 from .config import GeminiDrawerConfig
-from .managers import data_manager
+from .managers import PLUGIN_DIR, close_managers, get_data_manager
 
 from .help_command import HelpCommand
 from .draw_commands import (
@@ -25,6 +24,7 @@ from .admin_commands import (
     SyncBananaPromptsCommand, ToggleBananaRestrictedCommand, BananaPromptSearchCommand
 )
 from .actions import ImageGenerateAction, SelfieGenerateAction, SelfieVideoAction
+from .utils import close_http_clients
 
 
 DRAW_COMMAND_TIMEOUT_MS = 300_000
@@ -250,6 +250,11 @@ class GeminiDrawerPlugin(MaiBotPlugin):
     config_model = GeminiDrawerConfig
 
     def get_components(self) -> list[dict[str, Any]]:
+        # 组件声明在插件生命周期内不变，首次构建后缓存；配置热更新时清空重建
+        cached = getattr(self, "_components_cache", None)
+        if cached is not None:
+            return cached
+
         components = super().get_components()
         for component in components:
             metadata = component.get("metadata")
@@ -262,6 +267,7 @@ class GeminiDrawerPlugin(MaiBotPlugin):
 
             for key, value in nested_metadata.items():
                 metadata.setdefault(key, value)
+        self._components_cache = components
         return components
 
     def _set_context(self, ctx: PluginContext) -> None:
@@ -274,8 +280,7 @@ class GeminiDrawerPlugin(MaiBotPlugin):
         # 初始化自拍目录
         try:
             if self.config.selfie.enable:
-                plugin_dir = Path(__file__).parent
-                images_dir = plugin_dir / "images"
+                images_dir = PLUGIN_DIR / "images"
                 if not images_dir.exists():
                     images_dir.mkdir(parents=True, exist_ok=True)
                     self.ctx.logger.info(f"[GeminiDrawer] Auto-created images directory at: {images_dir}")
@@ -400,7 +405,7 @@ class GeminiDrawerPlugin(MaiBotPlugin):
                 "remote_last_updated": web_data.get("lastUpdated"),
                 "prompts": prompts,
             }
-            data_manager.save_banana_data(banana_data)
+            get_data_manager().save_banana_data(banana_data)
 
             return (
                 True,
@@ -418,10 +423,14 @@ class GeminiDrawerPlugin(MaiBotPlugin):
             return False, f"同步发生未知异常: {e}"
 
     async def on_unload(self) -> None:
+        # 写入延迟合并中尚未落盘的 Key 使用统计与数据修改，并关闭统计数据库
+        close_managers()
+        await close_http_clients()
         self.ctx.logger.info("Gemini Drawer 插件已卸载")
 
     async def on_config_update(self, scope: str, config_data: dict[str, Any], version: str) -> None:
         self.ctx.logger.info("Gemini Drawer 配置热更新: scope=%s version=%s", scope, version)
+        self._components_cache = None
         try:
             from maibot_sdk.compat.apis import config_api
             config_api.set_config_cache(
@@ -6,13 +6,33 @@ Gemini Drawer 工具函数模块
 配置文件处理：
 - fix_broken_toml_config(): 修复 TOML 配置文件中未加引号的中文键名
 - save_config_file(): 统一的配置文件保存入口，确保中文 Key 正确处理
+- load_toml(): 读取 TOML 文件（优先使用标准库 tomllib 或可选依赖 tomli）
+- atomic_write(): 临时文件 + fsync + os.replace 原子写入，配置与数据文件共用
 
 日志工具：
 - truncate_for_log(): 截断过长的日志数据
 - safe_json_dumps(): 安全的 JSON 序列化，自动截断 base64 数据
+- redact_url(): 隐去 URL 查询参数中的 API Key
+- log_enabled(): 判断日志级别是否启用，用于跳过昂贵的日志内容构建
+
+请求序列化：
+- dumps_json_bytes(): 将请求体序列化为 UTF-8 字节（优先使用可选依赖 orjson）
+- loads_json(): 解析 JSON 文本或字节（优先使用可选依赖 orjson）
+- splice_json_object(): 将普通字段与预先序列化好的大字段拼接为 JSON 对象字节
+
+HTTP 客户端：
+- get_http_client(): 获取按 (代理, 超时) 复用的共享 AsyncClient
+- shared_http_client(): 以 async with 方式使用共享客户端，退出时不关闭连接池
+- close_http_clients(): 插件卸载时关闭全部共享客户端
+- iter_sse_data(): 按字节切分 SSE 流，逐条产出 data: 字段内容
+- error_body_text() / read_error_body(): 截取错误响应体前 4KB 用于报错和日志
 
 图片处理：
 - download_image(): 异步下载图片，支持代理
+- b64encode_str() / b64decode_bytes(): base64 编解码（优先使用可选依赖 pybase64 的 SIMD 实现）
+- make_data_url(): 将图片字节编码为 data URL
+- b64encode_async(): 在线程池中进行 base64 编码，用于体积较大的视频数据
+- decode_base64_image(): 先校验前缀字符与解码后的文件头，确认是图片后才完整解码
 - get_image_mime_type(): 根据图片内容检测 MIME 类型
 - convert_if_gif(): 将 GIF 图片转换为 PNG 格式（取第一帧）
 - extract_image_data(): 从 API 响应中提取图片数据（URL 或 Base64）
@@ -22,36 +42,75 @@ Gemini Drawer 工具函数模块
 """
 import asyncio
 import json
+import os
+from contextlib import asynccontextmanager
 import re
 import io
 import httpx
 import base64
 from pathlib import Path
-from typing import List, Tuple, Type, Optional, Dict, Any
+from typing import List, Tuple, Type, Optional, Dict, Any, AsyncIterator
 from PIL import Image
 import logging
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pybase64
+except ImportError:
+    pybase64 = None
+
+# TOML 读取：Python 3.11+ 自带 tomllib，旧版本可选安装 tomli；都不可用时回退到 toml
+try:
+    import tomllib
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
 # 日志记录器
 logger = logging.getLogger("plugin.gemini_drawer")
 
+def atomic_write(path: Path, data: bytes):
+    """先写入同目录的临时文件并 fsync，再用 os.replace 原子替换，写入中途崩溃不会留下截断的文件"""
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+# fix_broken_toml_config() 使用的模式
+# 行首是非引号、非注释、非方括号的字符，且包含中文，后接等号
+_TOML_ZH_KEY_RE = re.compile(r'^([^#\n"\'\[]*[\u4e00-\u9fa5][^#\n"\'\[]*?)\s*=')
+_TOML_ADMINS_END_RE = re.compile(r'^\]\s*,?\s*(#.*)?$')
+_TOML_ADMIN_DIGIT_RE = re.compile(r'^(\s*)(\d+)(\s*,?\s*)$')
+
 def fix_broken_toml_config(file_path: Path):
     """
     读取配置文件原始文本，使用正则强制修复未加引号的中文键名。
     专门解决框架自动生成时 key 不带引号导致 Empty key 报错的问题。
     """
-    if not file_path.exists():
+    try:
+        raw = file_path.read_bytes()
+    except FileNotFoundError:
+        return
+
+    # 两类问题都不可能出现时直接返回：中文键名需要非 ASCII 字节，纯数字修复只发生在多行 admins 列表中。
+    # bytes.isascii() 为 C 实现，绝大多数已正常的配置文件无需逐行正则匹配
+    if raw.isascii() and b'admins = [' not in raw:
         return
 
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
+        lines = io.TextIOWrapper(io.BytesIO(raw), encoding='utf-8').readlines()
         
         fixed_lines = []
         modified = False
         
-        # 匹配规则：行首是非引号、非注释、非方括号的字符，且包含中文，后接等号
-        pattern = re.compile(r'^([^#\n"\'\[]*[\u4e00-\u9fa5][^#\n"\'\[]*?)\s*=')
-        
         # 简单的状态机，用于处理 admins 列表
         in_admins_block = False
         
@@ -59,7 +118,7 @@ def fix_broken_toml_config(file_path: Path):
             stripped = line.strip()
             
             # 1. 修复中文键名 (现有逻辑)
-            match = pattern.match(line)
+            match = _TOML_ZH_KEY_RE.match(line)
             if match:
                 key = match.group(1).strip()
                 parts = line.split('=', 1)
@@ -75,13 +134,13 @@ def fix_broken_toml_config(file_path: Path):
                 if ']' not in stripped.split('[', 1)[1]:
                     in_admins_block = True
                 fixed_lines.append(line)
-            elif in_admins_block and re.match(r'^\]\s*,?\s*(#.*)?$', stripped):
+            elif in_admins_block and _TOML_ADMINS_END_RE.match(stripped):
                 in_admins_block = False
                 fixed_lines.append(line)
             elif in_admins_block:
                 # 检查是否是纯数字（可能带逗号）
                 # 匹配: 空白 + 数字 + 可选逗号 + 空白
-                digit_match = re.match(r'^(\s*)(\d+)(\s*,?\s*)$', line)
+                digit_match = _TOML_ADMIN_DIGIT_RE.match(line)
                 if digit_match:
                     # 给数字加上双引号
                     prefix, number, suffix = digit_match.groups()
@@ -93,13 +152,21 @@ def fix_broken_toml_config(file_path: Path):
                 fixed_lines.append(line)
         
         if modified:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.writelines(fixed_lines)
+            atomic_write(file_path, "".join(fixed_lines).encode('utf-8'))
             logger.info("配置文件格式已自动修复（中文Key引号/Admins列表格式）。")
             
     except Exception as e:
         logger.error(f"尝试自动修复配置文件失败: {e}")
 
+def load_toml(file_path: Path) -> Dict[str, Any]:
+    """读取 TOML 文件；解析失败时抛出异常，由调用方处理"""
+    if tomllib is not None:
+        with open(file_path, 'rb') as f:
+            return tomllib.load(f)
+    import toml
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return toml.load(f)
+
 def save_config_file(config_path: Path, config_data: Dict[str, Any]):
     """
     统一的保存入口，保存前先转为字符串并二次处理，确保中文Key有引号。
@@ -109,49 +176,119 @@ def save_config_file(config_path: Path, config_data: Dict[str, Any]):
         # 1. 先生成标准 TOML 字符串
         content = toml.dumps(config_data)
         
-        # 2. 再次进行正则修复
+        # 2. 再次进行正则修复（只有非 ASCII 键名需要处理，纯 ASCII 内容跳过逐行检查）
         lines = content.splitlines()
-        final_lines = []
-        for line in lines:
-            stripped = line.strip()
-            if '=' in stripped and not stripped.startswith('#') and not stripped.startswith('['):
-                key_part, rest = stripped.split('=', 1)
-                key_clean = key_part.strip()
-                # 如果包含非ASCII且没引号
-                if any(ord(c) > 127 for c in key_clean) and not (key_clean.startswith('"') or key_clean.startswith("'")):
-                    line = f'"{key_clean}" ={rest}'
-            final_lines.append(line)
+        if not content.isascii():
+            final_lines = []
+            for line in lines:
+                stripped = line.strip()
+                if '=' in stripped and not stripped.startswith('#') and not stripped.startswith('['):
+                    key_part, rest = stripped.split('=', 1)
+                    key_clean = key_part.strip()
+                    # 如果包含非ASCII且没引号
+                    if not key_clean.isascii() and not (key_clean.startswith('"') or key_clean.startswith("'")):
+                        line = f'"{key_clean}" ={rest}'
+                final_lines.append(line)
+            lines = final_lines
             
-        with open(config_path, 'w', encoding='utf-8') as f:
-            f.write("\n".join(final_lines))
+        atomic_write(config_path, "\n".join(lines).encode('utf-8'))
             
     except Exception as e:
         logger.error(f"保存配置文件失败: {e}")
 
+def dumps_json_bytes(data: Any) -> bytes:
+    """
+    将请求体序列化为 JSON 字节，配合 httpx 的 content= 参数使用。
+    安装了 orjson 时使用 orjson（C 实现，大体积 base64 载荷明显更快），否则回退到标准库 json。
+    """
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode('utf-8')
+
+def splice_json_object(fields: Dict[str, Any], raw_fields: Dict[str, bytes]) -> bytes:
+    """
+    序列化 fields，并把 raw_fields 中已序列化好的 JSON 值直接拼接进同一个对象。
+    用于多次重试时复用体积很大的 base64 字段，避免每次请求都重新序列化。
+    """
+    head = dumps_json_bytes(fields)
+    parts = [head[:-1]]
+    need_comma = len(head) > 2
+    for name, raw in raw_fields.items():
+        if need_comma:
+            parts.append(b",")
+        parts.append(dumps_json_bytes(name))
+        parts.append(b":")
+        parts.append(raw)
+        need_comma = True
+    parts.append(b"}")
+    return b"".join(parts)
+
+def loads_json(data: Any) -> Any:
+    """
+    解析 JSON 字符串或字节，用于 SSE 等热路径。
+    orjson.JSONDecodeError 是 json.JSONDecodeError 的子类，调用方原有的异常处理无需修改。
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, (bytes, bytearray)):
+        # 标准库遇到非法 UTF-8 会抛出 UnicodeDecodeError 而不是 JSONDecodeError，先按 replace 解码
+        data = data.decode('utf-8', 'replace')
+    return json.loads(data)
+
 def truncate_for_log(data: str, max_length: int = 100) -> str:
     """截断用于日志的数据，避免过长"""
     if len(data) <= max_length:
         return data
     return data[:max_length//2] + "...[truncated]..." + data[-max_length//2:]
 
+# URL 查询参数中的 API Key（Gemini 使用 ?key=...）
+_URL_KEY_RE = re.compile(r'([?&]key=)[^&#]+')
+
+def redact_url(url: str) -> str:
+    """将 URL 中的 key= 参数值替换为 <redacted>，用于日志输出"""
+    if 'key=' not in url:
+        return url
+    return _URL_KEY_RE.sub(r'\1<redacted>', url)
+
+def log_enabled(log: Any, level: int) -> bool:
+    """日志记录器是否会输出该级别；无法判断时视为启用"""
+    is_enabled_for = getattr(log, 'isEnabledFor', None)
+    return is_enabled_for is None or is_enabled_for(level)
+
+_BASE64_MARK_RE = re.compile(r'base64', re.IGNORECASE)
+
 def safe_json_dumps(obj: Any) -> str:
     """安全地序列化JSON对象，对base64数据进行截断"""
-    def truncate_base64_values(o):
-        if isinstance(o, dict):
-            new_dict = {}
-            for k, v in o.items():
-                if isinstance(v, str) and ('base64' in v.lower() or len(v) > 500):
-                    new_dict[k] = truncate_for_log(v)
+    if not isinstance(obj, (dict, list)):
+        return json.dumps(obj, ensure_ascii=False)
+
+    # 用显式栈代替递归复制嵌套结构，每项为 (原容器, 复制出的新容器)
+    truncated_obj: Any = {} if isinstance(obj, dict) else []
+    stack = [(obj, truncated_obj)]
+    while stack:
+        src, dst = stack.pop()
+        if isinstance(src, dict):
+            for k, v in src.items():
+                if isinstance(v, str):
+                    # 不超过 100 字符时 truncate_for_log 原样返回；超过 500 字符直接截断，
+                    # 只有中间长度的字符串才查找 base64 标记（不区分大小写，不复制出小写副本）
+                    if len(v) > 500 or (len(v) > 100 and _BASE64_MARK_RE.search(v)):
+                        v = truncate_for_log(v)
+                    dst[k] = v
                 elif isinstance(v, (dict, list)):
-                    new_dict[k] = truncate_base64_values(v)
+                    child = {} if isinstance(v, dict) else []
+                    dst[k] = child
+                    stack.append((v, child))
                 else:
-                    new_dict[k] = v
-            return new_dict
-        elif isinstance(o, list):
-            return [truncate_base64_values(item) for item in o]
-        return o
-    
-    truncated_obj = truncate_base64_values(obj)
+                    dst[k] = v
+        else:
+            for item in src:
+                if isinstance(item, (dict, list)):
+                    child = {} if isinstance(item, dict) else []
+                    dst.append(child)
+                    stack.append((item, child))
+                else:
+                    dst.append(item)
     return json.dumps(truncated_obj, ensure_ascii=False)
 
 def extract_text_failure_reason(response_data: Dict[str, Any], max_length: int = 500) -> str:
@@ -411,6 +548,18 @@ def extract_text_failure_reason(response_data: Dict[str, Any], max_length: int =
         return ""
     return ""
 
+# 从模型响应文本中提取图片/视频的模式，模块加载时编译一次；
+# MIME 子类型只会是 ASCII，使用显式字符类代替 Unicode 语义的 \w
+_MD_IMAGE_RE = re.compile(r"!\[.*?\]\((.*?)\)")
+_IMAGE_URL_RE = re.compile(r"https?://[^\s]+\.(?:png|jpg|jpeg|gif|webp|bmp|ico|tiff?)(?:\?[^\s]*)?", re.IGNORECASE)
+_PLAIN_URL_RE = re.compile(r"https?://[^\s]+")
+_DATA_IMAGE_RE = re.compile(r"data:image/[A-Za-z0-9_]+;base64,([A-Za-z0-9+/=\n]+)")
+_BARE_IMAGE_B64_RE = re.compile(r"(?:^|[\s,])image/[A-Za-z0-9_]+;base64,([A-Za-z0-9+/=\n]+)")
+_MD_VIDEO_B64_RE = re.compile(r"!\[.*?\]\(data:video/[^;]+;base64,([a-zA-Z0-9+/=\n]+)\)")
+_DATA_VIDEO_RE = re.compile(r"data:video/[^;]+;base64,([a-zA-Z0-9+/=\n]+)")
+_MP4_URL_RE = re.compile(r"(https?://[^\s<>\"]+\.mp4(?:\?[^\s<>\"]*)?)")
+_SOURCE_TAG_RE = re.compile(r'<source[^>]+src="([^"]+)"')
+
 async def extract_image_data(response_data: Dict[str, Any]) -> Optional[str]:
     """从API响应中提取图片数据（URL或Base64）"""
     try:
@@ -515,7 +664,7 @@ async def extract_image_data(response_data: Dict[str, Any]) -> Optional[str]:
                                 text_content = item["text"]
                                 if isinstance(text_content, str):
                                     # 匹配 markdown 图片格式
-                                    match_url = re.search(r"!\[.*?\]\((.*?)\)", text_content)
+                                    match_url = _MD_IMAGE_RE.search(text_content)
                                     if match_url:
                                         image_url = match_url.group(1)
                                         if "base64," in image_url:
@@ -533,7 +682,7 @@ async def extract_image_data(response_data: Dict[str, Any]) -> Optional[str]:
                 elif isinstance(content_data, str):
                     content_text = content_data
                     
-                    match_url = re.search(r"!\[.*?\]\((.*?)\)", content_text)
+                    match_url = _MD_IMAGE_RE.search(content_text)
                     if match_url:
                         image_url = match_url.group(1)
                         if "base64," in image_url:
@@ -550,7 +699,7 @@ async def extract_image_data(response_data: Dict[str, Any]) -> Optional[str]:
 
                     # 匹配裸露的HTTP/HTTPS URL
                     # 优先匹配常见的图片后缀
-                    match_plain_url = re.search(r"https?://[^\s]+\.(?:png|jpg|jpeg|gif|webp|bmp|ico|tiff?)(?:\?[^\s]*)?", content_text, re.IGNORECASE)
+                    match_plain_url = _IMAGE_URL_RE.search(content_text)
                     if match_plain_url:
                         image_url = match_plain_url.group(0)
                         logger.info(f"从响应中提取到裸图片URL(带后缀): {image_url[:100]}...")
@@ -559,7 +708,7 @@ async def extract_image_data(response_data: Dict[str, Any]) -> Optional[str]:
                     # 如果没有带后缀的URL，再次尝试匹配所有URL，但在日志中标记风险
                     # 这一步是为了兼容某些不带后缀的图片API（如某些重定向链接）
                     # 但为了避免匹配到 dashboard 等页面，我们可以尝试排除一些关键词
-                    match_all_url = re.search(r"https?://[^\s]+", content_text)
+                    match_all_url = _PLAIN_URL_RE.search(content_text)
                     if match_all_url:
                         possible_url = match_all_url.group(0)
                         # 简单的逻辑排除非图片页面
@@ -569,7 +718,7 @@ async def extract_image_data(response_data: Dict[str, Any]) -> Optional[str]:
                         else:
                             logger.warning(f"跳过疑似非图片的URL: {possible_url}")
 
-                    match_b64 = re.search(r"data:image/\w+;base64,([a-zA-Z0-9+/=\n]+)", content_text)
+                    match_b64 = _DATA_IMAGE_RE.search(content_text)
                     if match_b64:
                         b64_data = match_b64.group(1)
                         if len(b64_data) > 1000:
@@ -578,7 +727,7 @@ async def extract_image_data(response_data: Dict[str, Any]) -> Optional[str]:
 
                     # 匹配无 data: 前缀的 base64 图片数据
                     # 格式: image/jpeg;base64,... 或 image/png;base64,...
-                    match_b64_noprefix = re.search(r"(?:^|[\s,])image/\w+;base64,([a-zA-Z0-9+/=\n]+)", content_text)
+                    match_b64_noprefix = _BARE_IMAGE_B64_RE.search(content_text)
                     if match_b64_noprefix:
                         b64_data = match_b64_noprefix.group(1)
                         if len(b64_data) > 1000:
@@ -608,7 +757,7 @@ async def extract_image_data(response_data: Dict[str, Any]) -> Optional[str]:
 
             text_content = part.get("text")
             if isinstance(text_content, str):
-                match = re.search(r"data:image/\w+;base64,([a-zA-Z0-9+/=\n]+)", text_content)
+                match = _DATA_IMAGE_RE.search(text_content)
                 if match:
                     return match.group(1)
 
@@ -702,7 +851,7 @@ async def extract_all_image_data(response_data: Dict[str, Any]) -> List[str]:
                                 text_content = item["text"]
                                 if isinstance(text_content, str):
                                     # 匹配所有 markdown 图片格式
-                                    all_matches = re.findall(r"!\[.*?\]\((.*?)\)", text_content)
+                                    all_matches = _MD_IMAGE_RE.findall(text_content)
                                     for url in all_matches:
                                         results.append(url)
                     if results:
@@ -714,7 +863,7 @@ async def extract_all_image_data(response_data: Dict[str, Any]) -> List[str]:
                     content_text = content_data
                     
                     # 匹配所有 markdown 图片格式 ![...](url)
-                    all_md_urls = re.findall(r"!\[.*?\]\((.*?)\)", content_text)
+                    all_md_urls = _MD_IMAGE_RE.findall(content_text)
                     if all_md_urls:
                         for url in all_md_urls:
                             if "base64," in url:
@@ -731,7 +880,7 @@ async def extract_all_image_data(response_data: Dict[str, Any]) -> List[str]:
                             return results
 
                     # 匹配裸露的HTTP/HTTPS URL（带图片后缀）
-                    all_img_urls = re.findall(r"https?://[^\s]+\.(?:png|jpg|jpeg|gif|webp|bmp|ico|tiff?)(?:\?[^\s]*)?", content_text, re.IGNORECASE)
+                    all_img_urls = _IMAGE_URL_RE.findall(content_text)
                     if all_img_urls:
                         for url in all_img_urls:
                             logger.info(f"从响应中提取到裸图片URL: {url[:100]}...")
@@ -739,7 +888,7 @@ async def extract_all_image_data(response_data: Dict[str, Any]) -> List[str]:
                         return results
                     
                     # 匹配所有 URL（排除非图片页面）
-                    all_urls = re.findall(r"https?://[^\s]+", content_text)
+                    all_urls = _PLAIN_URL_RE.findall(content_text)
                     for url in all_urls:
                         if not any(kw in url.lower() for kw in ['dashboard', 'login', 'signin', 'register', 'admin']):
                             results.append(url)
@@ -747,7 +896,7 @@ async def extract_all_image_data(response_data: Dict[str, Any]) -> List[str]:
                         return results
 
                     # 匹配 base64 图片数据
-                    all_b64 = re.findall(r"data:image/\w+;base64,([a-zA-Z0-9+/=\n]+)", content_text)
+                    all_b64 = _DATA_IMAGE_RE.findall(content_text)
                     if all_b64:
                         for b64 in all_b64:
                             if len(b64) > 1000:
@@ -757,7 +906,7 @@ async def extract_all_image_data(response_data: Dict[str, Any]) -> List[str]:
 
                     # 匹配无 data: 前缀的 base64 图片数据
                     # 格式: image/jpeg;base64,... 或 image/png;base64,...
-                    all_b64_noprefix = re.findall(r"(?:^|[\s,])image/\w+;base64,([a-zA-Z0-9+/=\n]+)", content_text)
+                    all_b64_noprefix = _BARE_IMAGE_B64_RE.findall(content_text)
                     if all_b64_noprefix:
                         for b64 in all_b64_noprefix:
                             if len(b64) > 1000:
@@ -783,7 +932,7 @@ async def extract_all_image_data(response_data: Dict[str, Any]) -> List[str]:
                                 results.append(image_b64)
                         text_content = part.get("text")
                         if isinstance(text_content, str):
-                            all_b64 = re.findall(r"data:image/\w+;base64,([a-zA-Z0-9+/=\n]+)", text_content)
+                            all_b64 = _DATA_IMAGE_RE.findall(text_content)
                             for b64 in all_b64:
                                 results.append(b64)
         
@@ -825,26 +974,26 @@ async def extract_video_data(response_data: Dict[str, Any]) -> Optional[str]:
             if content_data is not None and isinstance(content_data, str):
                 # 匹配 markdown 格式的视频 data URL
                 # 格式: ![image](data:video/mp4;base64,...)
-                match_video = re.search(r"!\[.*?\]\(data:video/[^;]+;base64,([a-zA-Z0-9+/=\n]+)\)", content_data)
+                match_video = _MD_VIDEO_B64_RE.search(content_data)
                 if match_video:
                     logger.info("从响应中提取到视频 base64 数据 (markdown 格式)")
                     return match_video.group(1)
                 
                 # 匹配裸露的 data URL 格式
-                match_video_raw = re.search(r"data:video/[^;]+;base64,([a-zA-Z0-9+/=\n]+)", content_data)
+                match_video_raw = _DATA_VIDEO_RE.search(content_data)
                 if match_video_raw:
                     logger.info("从响应中提取到视频 base64 数据 (裸 data URL 格式)")
                     return match_video_raw.group(1)
                 
                 # 匹配视频 URL（纯文本 .mp4 链接）
-                match_video_url = re.search(r"(https?://[^\s<>\"]+\.mp4(?:\?[^\s<>\"]*)?)", content_data)
+                match_video_url = _MP4_URL_RE.search(content_data)
                 if match_video_url:
                     video_url = match_video_url.group(1)
                     logger.info(f"从响应中提取到视频 URL: {video_url}")
                     return f"url:{video_url}"
                 
                 # 匹配 HTML <source> 标签中的视频 URL
-                match_source_tag = re.search(r'<source[^>]+src="([^"]+)"', content_data)
+                match_source_tag = _SOURCE_TAG_RE.search(content_data)
                 if match_source_tag:
                     video_url = match_source_tag.group(1)
                     logger.info(f"从响应中提取到视频 URL (HTML source 标签): {video_url}")
@@ -871,7 +1020,7 @@ async def extract_video_data(response_data: Dict[str, Any]) -> Optional[str]:
                             # 检查文本内容中的视频 data URL
                             text_content = part.get("text")
                             if isinstance(text_content, str):
-                                match = re.search(r"data:video/[^;]+;base64,([a-zA-Z0-9+/=\n]+)", text_content)
+                                match = _DATA_VIDEO_RE.search(text_content)
                                 if match:
                                     logger.info("从 Gemini 文本响应中提取到视频 base64 数据")
                                     return match.group(1)
@@ -880,6 +1029,95 @@ async def extract_video_data(response_data: Dict[str, Any]) -> Optional[str]:
     except Exception:
         return None
 
+# 共享 HTTP 客户端池：按 (代理, 超时) 复用连接，避免每次请求重新建立 TCP/TLS 连接
+_HTTP_CLIENTS: Dict[Tuple[Optional[str], float], httpx.AsyncClient] = {}
+_HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+
+def get_http_client(proxy: Optional[str] = None, timeout: float = 60.0) -> httpx.AsyncClient:
+    """获取共享的 AsyncClient，相同代理与超时配置的请求共用一个连接池"""
+    key = (proxy or None, float(timeout))
+    client = _HTTP_CLIENTS.get(key)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(proxy=proxy or None, timeout=timeout, follow_redirects=True, limits=_HTTP_LIMITS)
+        _HTTP_CLIENTS[key] = client
+    return client
+
+@asynccontextmanager
+async def shared_http_client(proxy: Optional[str] = None, timeout: float = 60.0):
+    """用法与 `async with httpx.AsyncClient(...) as client` 相同，但退出时保留连接供后续请求复用"""
+    yield get_http_client(proxy, timeout)
+
+async def close_http_clients() -> None:
+    """关闭全部共享客户端（插件卸载时调用）"""
+    clients = list(_HTTP_CLIENTS.values())
+    _HTTP_CLIENTS.clear()
+    for client in clients:
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.debug(f"关闭 HTTP 客户端失败: {e}")
+
+# 错误响应体最多保留的字节数，避免对大体积 HTML 错误页整体解码
+_ERROR_BODY_LIMIT = 4096
+
+def error_body_text(response: httpx.Response, limit: int = _ERROR_BODY_LIMIT) -> str:
+    """截取已读取响应体的前 limit 字节并解码，超出部分标注截断"""
+    raw = response.content
+    text = raw[:limit].decode("utf-8", "replace")
+    if len(raw) > limit:
+        text += f"...(已截断，共 {len(raw)} 字节)"
+    return text
+
+async def read_error_body(response: httpx.Response, limit: int = _ERROR_BODY_LIMIT) -> str:
+    """流式响应出错时只读取前 limit 字节，不再把整个响应体读入内存"""
+    buffer = bytearray()
+    async for chunk in response.aiter_bytes():
+        buffer += chunk
+        if len(buffer) > limit:
+            return buffer[:limit].decode("utf-8", "replace") + "...(已截断)"
+    return buffer.decode("utf-8", "replace")
+
+# SSE 结束标记，直接与 data: 字段的原始字节比较，无需先解码为 str。
+# 切片得到的是 bytearray（不可哈希），因此用元组而非 frozenset 做成员判断。
+_SSE_DONE = (b"DONE", b"[DONE]")
+
+async def iter_sse_data(
+    response: httpx.Response,
+    chunk_size: int = 65536,
+    decode: bool = True,
+) -> AsyncIterator[Any]:
+    """逐条产出 SSE 流中 data: 行的内容（已去除首尾空白），遇到 [DONE] 时结束。
+
+    直接在字节缓冲区上按换行切分，只处理 data: 行；注释行、空行和其他字段不会被解码。
+    decode=False 时产出原始字节（bytearray），可直接交给 loads_json 解析，省去 UTF-8 解码。
+    """
+    buffer = bytearray()
+    scan_from = 0
+    async for chunk in response.aiter_bytes(chunk_size):
+        buffer += chunk
+        start = 0
+        while True:
+            newline = buffer.find(b"\n", max(start, scan_from))
+            if newline == -1:
+                break
+            line = buffer[start:newline].strip()
+            start = newline + 1
+            if line.startswith(b"data:"):
+                data = line[5:].lstrip()  # 行已整体 strip，只需去掉前导空格
+                if data in _SSE_DONE:
+                    return
+                yield data.decode("utf-8", "replace") if decode else data
+        if start:
+            del buffer[:start]
+        # 超长的 base64 行会跨越多个 chunk，记录已扫描位置避免重复查找
+        scan_from = len(buffer)
+
+    line = buffer.strip()
+    if line.startswith(b"data:"):
+        data = line[5:].lstrip()
+        if data not in _SSE_DONE:
+            yield data.decode("utf-8", "replace") if decode else data
+
 async def download_image(url: str, proxy: Optional[str]) -> Optional[bytes]:
     """下载图片，支持需要浏览器级别请求头的 CDN"""
     headers = {
@@ -889,10 +1127,10 @@ async def download_image(url: str, proxy: Optional[str]) -> Optional[bytes]:
         "Referer": url.split("?")[0],  # 使用 URL 基础部分作为 Referer
     }
     try:
-        async with httpx.AsyncClient(proxy=proxy, timeout=60.0, follow_redirects=True) as client:
+        async with shared_http_client(proxy, 60.0) as client:
             response = await client.get(url, headers=headers)
             if response.status_code != 200:
-                logger.error(f"下载图片失败: {url}, HTTP 状态码: {response.status_code}, 响应: {response.text[:500]}")
+                logger.error(f"下载图片失败: {url}, HTTP 状态码: {response.status_code}, 响应: {error_body_text(response, 500)}")
                 return None
             if not response.content:
                 logger.error(f"下载图片失败: {url}, 响应内容为空")
@@ -911,6 +1149,52 @@ async def download_image(url: str, proxy: Optional[str]) -> Optional[bytes]:
         logger.error(f"下载图片未知异常: {url}, 错误: {type(e).__name__}: {e}")
         return None
 
+def b64encode_str(data: bytes) -> str:
+    """base64 编码为 str；安装了 pybase64 时使用其 SIMD 实现，否则回退到标准库"""
+    if pybase64 is not None:
+        return pybase64.b64encode_as_string(data)
+    return base64.b64encode(data).decode('ascii')
+
+def b64decode_bytes(data: Any) -> bytes:
+    """base64 解码；安装了 pybase64 时使用其 SIMD 实现，否则回退到标准库"""
+    if pybase64 is not None:
+        return pybase64.b64decode(data)
+    return base64.b64decode(data)
+
+def make_data_url(mime_type: str, data: bytes) -> str:
+    """构建 data:<mime>;base64,<...> 形式的图片 URL"""
+    return ''.join(('data:', mime_type, ';base64,', b64encode_str(data)))
+
+async def b64encode_async(data: bytes) -> str:
+    """在工作线程中 base64 编码，避免数十 MB 的视频编码阻塞事件循环"""
+    return await asyncio.to_thread(b64encode_str, data)
+
+# base64 前缀校验：只看前 64 个字符，普通长文本通常在这里就会被排除
+_BASE64_PREFIX_RE = re.compile(r'[A-Za-z0-9+/=\s]+')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+def decode_base64_image(data: str) -> Optional[bytes]:
+    """
+    解码 base64 形式的图片，不是图片时返回 None。
+
+    先用前 64 个字符判断是否可能为 base64，再只解码前 24 个字符（18 字节）检查 PNG/JPEG/GIF/WEBP 文件头，
+    两项都通过才解码完整数据，避免对长文本消息做无用的大块解码。
+    """
+    prefix = data[:64]
+    if not _BASE64_PREFIX_RE.fullmatch(prefix):
+        return None
+    head = _WHITESPACE_RE.sub('', prefix)[:24]
+    try:
+        header = b64decode_bytes(head)
+    except Exception:
+        return None
+    if get_image_mime_type(header) == 'application/octet-stream':
+        return None
+    try:
+        return b64decode_bytes(data)
+    except Exception:
+        return None
+
 def get_image_mime_type(image_bytes: bytes) -> str:
     if image_bytes.startswith(b'\x89PNG\r\n\x1a\n'):
         return 'image/png'
@@ -930,7 +1214,8 @@ def convert_if_gif(image_bytes: bytes) -> bytes:
             with Image.open(io.BytesIO(image_bytes)) as img:
                 img.seek(0)
                 output = io.BytesIO()
-                img.save(output, format='PNG')
+                # 转换结果只用于本次请求，不落盘：使用最低的 zlib 压缩级别，编码耗时远小于默认级别
+                img.save(output, format='PNG', optimize=False, compress_level=1)
                 return output.getvalue()
         except Exception as e:
             logger.error(f"GIF转PNG失败: {e}")